@@ -1,16 +1,21 @@
+import os
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import JWTManager
-from apscheduler.schedulers.background import BackgroundScheduler
 from app.config import Config
-from flask_migrate import Migrate
 from app.blacklist import blacklist
 
 db = SQLAlchemy()
 bcrypt = Bcrypt()
 jwt = JWTManager()
-migrate = Migrate()
+
+def migrations_enabled(config):
+    # Alembic is a large import that only the `flask db` commands need; the flask CLI sets
+    # FLASK_RUN_FROM_CLI before it creates the app, gunicorn, tests and scripts do not
+    if config['MIGRATE_ENABLED'] is None:
+        return os.environ.get('FLASK_RUN_FROM_CLI') == 'true'
+    return config['MIGRATE_ENABLED']
 
 def create_app(config_class=Config):
     app = Flask(__name__)
@@ -19,20 +24,57 @@ def create_app(config_class=Config):
     db.init_app(app)
     bcrypt.init_app(app)
     jwt.init_app(app)
-    migrate.init_app(app, db)
+
+    if migrations_enabled(app.config):
+        from flask_migrate import Migrate
+        Migrate(app, db)
+
+    from app.catalog import CategoryCatalog
+    CategoryCatalog().init_app(app)
+
+    from app.user_ids import UserIdCache
+    UserIdCache().init_app(app)
+
+    if app.config['RESULT_CACHE_ENABLED']:
+        from app.resultcache import ResultCache
+        ResultCache().init_app(app)
 
     from app.routes import main as main_blueprint
     app.register_blueprint(main_blueprint)
-   
-    from app.utils import create_recurring_expenses  # Now safe to import
 
-    def start_scheduler():
-        scheduler = BackgroundScheduler()
-        scheduler.add_job(func=create_recurring_expenses, trigger="interval", hours=24)
-        scheduler.start()
-        app.logger.info("Scheduler started.")
+    # Registered before compression so its after_request hook sees the encoded body
+    from app import instrumentation
+    instrumentation.init_app(app)
+
+    from app import logs
+    logs.init_app(app)
 
-    start_scheduler()
+    if app.config['METRICS_ENABLED']:
+        from app.metrics import Metrics
+        Metrics().init_app(app)
+
+    if app.config['SQL_STATS_ENABLED']:
+        from app import querystats
+        querystats.init_app(app)
+
+    if app.config['SLOW_QUERY_ENABLED']:
+        from app.slowlog import SlowQueryLog
+        SlowQueryLog().init_app(app)
+
+    if app.config['PROFILER_ENABLED']:
+        from app import profiler
+        profiler.init_app(app)
+
+    if app.config['MEMORY_DIAGNOSTICS_ENABLED']:
+        from app.diagnostics import MemoryDiagnostics
+        MemoryDiagnostics().init_app(app)
+
+    from app import compression
+    compression.init_app(app)
+   
+    if app.config['SCHEDULER_ENABLED']:
+        from app import scheduler
+        scheduler.init_app(app)
 
     @jwt.token_in_blocklist_loader
     def check_if_token_is_revoked(jwt_header, jwt_payload):
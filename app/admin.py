@@ -0,0 +1,22 @@
+import hmac
+from functools import wraps
+from flask import current_app, request
+from app.serializers import respond
+
+ADMIN_TOKEN_HEADER = 'X-Admin-Token'
+
+def is_admin_request():
+    # Operational tooling is gated by a shared token; users have no admin role in the schema
+    token = current_app.config['ADMIN_TOKEN']
+    supplied = request.headers.get(ADMIN_TOKEN_HEADER)
+    if not token or supplied is None:
+        return False
+    return hmac.compare_digest(supplied.encode('utf-8'), token.encode('utf-8'))
+
+def admin_required(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not is_admin_request():
+            return respond({'message': 'Admin token required'}, 403)
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,147 @@
+import logging
+from flask import current_app, g, request
+from flask_jwt_extended import jwt_required
+from flask_sqlalchemy.session import Session as FlaskSession
+from werkzeug.exceptions import HTTPException
+from werkzeug.test import EnvironBuilder
+
+logger = logging.getLogger(__name__)
+
+# Every jwt_required() wrapper shares this code object, which is how an already-verified batch recognises it
+JWT_CHECK = jwt_required()(lambda: None).__code__
+
+# Sub-requests that may not run inside a batch
+EXCLUDED_ENDPOINTS = ('main.batch',)
+
+CARRIED_HEADERS = ('Authorization',)
+
+class BatchSession(FlaskSession):
+    """Session joined to the batch's own connection and transaction.
+
+    Flask-SQLAlchemy picks an engine per table and would ignore bind=, so every
+    lookup returns the batch connection. With join_transaction_mode='rollback_only'
+    the views' commit() calls only flush; the batch commits once at the end.
+    """
+
+    def get_bind(self, *args, **kwargs):
+        return self.bind
+
+class BatchTransaction:
+    """Routes db.session to one connection-level transaction for the duration of a batch."""
+
+    def __init__(self, db):
+        self.db = db
+        self.connection = None
+        self.transaction = None
+        self.session = None
+        self._previous = None
+
+    def __enter__(self):
+        self.connection = self.db.engine.connect()
+        self.transaction = self.connection.begin()
+        # Commit hooks (cache invalidation) are held back until the real commit
+        self.session = BatchSession(self.db, bind=self.connection, join_transaction_mode='rollback_only',
+                                    info={'defer_commit_hooks': True})
+
+        registry = self.db.session.registry
+        self._previous = registry() if registry.has() else None
+        registry.set(self.session)
+        g.in_batch_transaction = True
+        return self
+
+    def commit(self):
+        self.session.flush()
+        self.transaction.commit()
+        self.session.info.pop('defer_commit_hooks')
+        self.session.dispatch.after_commit(self.session)
+
+    def __exit__(self, exc_type, exc, traceback):
+        if self.transaction.is_active:
+            self.transaction.rollback()
+            self.session.info.pop('defer_commit_hooks', None)
+            self.session.dispatch.after_rollback(self.session)
+
+        self.session.close()
+        self.connection.close()
+        g.in_batch_transaction = False
+
+        registry = self.db.session.registry
+        if self._previous is not None:
+            registry.set(self._previous)
+        else:
+            registry.clear()
+
+def sub_request_environ(item, headers):
+    # Only the caller's credentials carry over; sub-responses are always JSON
+    return EnvironBuilder(
+        path=item['path'],
+        method=item.get('method', 'GET').upper(),
+        query_string=item.get('query'),
+        json=item.get('body'),
+        headers={name: headers[name] for name in CARRIED_HEADERS if name in headers},
+    ).get_environ()
+
+def dispatch(app, item, headers):
+    """Run one sub-request through its view function and return a Response.
+
+    No before/after request hooks run: the sub-request shares the batch's request
+    id, logging and metrics, and its JWT was verified when the batch was.
+    """
+    with app.request_context(sub_request_environ(item, headers)):
+        try:
+            if request.routing_exception is not None:
+                raise request.routing_exception
+            if request.url_rule.endpoint in EXCLUDED_ENDPOINTS:
+                return app.make_response(({'message': 'Not allowed in a batch'}, 400))
+
+            view = app.view_functions[request.url_rule.endpoint]
+            if view.__code__ is JWT_CHECK:
+                view = view.__wrapped__
+            response = app.make_response(view(**request.view_args))
+            response.get_data()  # Drain streamed bodies while the sub-request context is still active
+            return response
+        except HTTPException as e:
+            return app.make_response(({'message': e.description}, e.code))
+        except Exception:
+            logger.exception('Batch item %s %s failed', item.get('method', 'GET'), item['path'])
+            return app.make_response(({'message': 'An unexpected error occurred'}, 500))
+
+def result_for(response):
+    return {'status': response.status_code, 'body': response.get_json(silent=True)}
+
+def validate_items(items, limit):
+    if not isinstance(items, list) or not items:
+        raise ValueError('requests must be a non-empty list')
+    if len(items) > limit:
+        raise ValueError(f'A batch holds at most {limit} requests')
+    for item in items:
+        if not isinstance(item, dict) or not isinstance(item.get('path'), str) or not item['path'].startswith('/'):
+            raise ValueError('Every request needs a path starting with /')
+
+def run_batch(items, atomic):
+    """Execute items in order; returns (results, committed)."""
+    from app import db
+
+    app = current_app._get_current_object()
+    headers = request.headers
+
+    if not atomic:
+        results = []
+        for item in items:
+            response = dispatch(app, item, headers)
+            if response.status_code >= 400:
+                db.session.rollback()  # Leave a clean session for the next item
+            results.append(result_for(response))
+        return results, True
+
+    results = []
+    with BatchTransaction(db) as batch:
+        for index, item in enumerate(items):
+            response = dispatch(app, item, headers)
+            results.append(result_for(response))
+            if response.status_code >= 400:
+                skipped = {'status': 424, 'body': {'message': f'Not run: request {index} failed'}}
+                results.extend(dict(skipped) for _ in items[index + 1:])
+                return results, False
+        batch.commit()
+    return results, True
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+from sqlalchemy import DateTime, delete, func, insert, literal, select, update
+from app.changes import allocate
+from app.models import Expenses, Tombstone
+from app.resultcache import note_changes
+
+ACTIONS = ('recategorize', 'shift_dates', 'delete')
+
+def matching(user_id, criteria, ids=None):
+    # Bulk statements only ever reach the caller's own rows
+    conditions = [Expenses.user_id == user_id, *criteria]
+    if ids is not None:
+        conditions.append(Expenses.id.in_(ids))
+    return conditions
+
+def claim_numbers(session, conditions):
+    """Reserve one change feed number for each expense matching conditions.
+
+    Returns a subquery of (id, change_seq) that numbers the matching rows in id
+    order from the start of the block, so one statement can stamp every row with
+    a distinct number; None when nothing matches.
+    """
+    # Take the counter's lock before counting: every writer of expenses allocates numbers, so the set
+    # of matching rows cannot change between the count and the statement that uses the numbers
+    allocate(session, 0)
+    count = session.execute(select(func.count()).select_from(Expenses).where(*conditions)).scalar()
+    if not count:
+        return None
+    first = next(allocate(session, count))
+    return select(Expenses.id, (func.row_number().over(order_by=Expenses.id) + (first - 1)).label('change_seq')) \
+        .where(*conditions).subquery()
+
+def shifted_date(days, dialect_name):
+    if dialect_name == 'sqlite':
+        # Dates are stored as 'YYYY-MM-DD HH:MM:SS.ffffff' text. datetime() drops the fraction, so it is put back
+        # to keep shifted rows comparable with the bounds of the range filters
+        return func.datetime(Expenses.date, f'{days:+d} days').op('||')(func.substr(Expenses.date, 20))
+    return Expenses.date + timedelta(days=days)
+
+def update_expenses(session, user_id, conditions, values):
+    """Apply values to every matching expense in one UPDATE; returns the row count.
+
+    Bulk statements skip the flush events, so the change feed numbers and the
+    result cache tags that app/changes.py and app/resultcache.py would record are
+    set here. The caller commits.
+    """
+    numbered = claim_numbers(session, conditions)
+    if numbered is None:
+        return 0
+
+    result = session.execute(
+        update(Expenses).where(Expenses.id == numbered.c.id)
+        .values(**values, updated_at=datetime.utcnow(), change_seq=numbered.c.change_seq)
+        .execution_options(synchronize_session=False))
+    note_changes(session, {f'expenses:{user_id}'})
+    return result.rowcount
+
+def delete_expenses(session, user_id, conditions):
+    """Delete every matching expense in one DELETE, leaving a tombstone for each; returns the row count."""
+    numbered = claim_numbers(session, conditions)
+    if numbered is None:
+        return 0
+
+    session.execute(insert(Tombstone).from_select(
+        ['entity', 'entity_id', 'user_id', 'change_seq', 'deleted_at'],
+        select(literal('expense'), numbered.c.id, literal(user_id), numbered.c.change_seq,
+               literal(datetime.utcnow(), DateTime))))
+    result = session.execute(
+        delete(Expenses).where(*conditions).execution_options(synchronize_session=False))
+    note_changes(session, {f'expenses:{user_id}'})
+    return result.rowcount
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import threading
+import time
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from app.models import Category
+
+# Bumped whenever a transaction in this process that created, renamed or deleted a category ends
+_version = 0
+
+@event.listens_for(Session, 'after_flush')
+def _note_category_changes(session, flush_context):
+    if any(isinstance(obj, Category) for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info['categories_changed'] = True
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_rollback')
+def _bump_version(session):
+    # Also on rollback: a reload inside that transaction may have seen the flushed, now discarded rows
+    global _version
+    if session.info.get('defer_commit_hooks'):
+        return  # Replayed once the enclosing transaction really commits (see batch.py)
+    if session.info.pop('categories_changed', False):
+        _version += 1
+
+class CategoryCatalog:
+    """Process-wide id <-> name map of the category table.
+
+    Commits that touch a Category in this process bump a version, and the next
+    lookup reloads the map. Other worker processes pick up changes when
+    CATEGORY_CATALOG_TTL runs out.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._lock = threading.Lock()
+        self._loaded = None  # (version, loaded_at)
+        self._state = ({}, {}, None)  # (id -> name, lowercased name -> id, etag), swapped as one
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['category_catalog'] = self
+
+    def after_fork(self):
+        # The lock may have been held by a parent thread at fork time
+        self._lock = threading.Lock()
+
+    def _fresh(self):
+        if self._loaded is None:
+            return False
+        version, loaded_at = self._loaded
+        return version == _version and time.monotonic() - loaded_at < self.app.config['CATEGORY_CATALOG_TTL']
+
+    def _ensure_loaded(self):
+        if self._fresh():
+            return
+        with self._lock:
+            if self._fresh():
+                return
+            from app import db
+
+            version = _version  # Read first: a commit during the load triggers another reload
+            rows = db.session.execute(select(Category.id, Category.name).order_by(Category.id)).all()
+            content = json.dumps([list(row) for row in rows], separators=(',', ':'))
+            self._state = (
+                {category_id: name for category_id, name in rows},
+                {name.lower(): category_id for category_id, name in rows},
+                # Derived from the content, so every worker hands out the same tag for the same catalog
+                hashlib.sha1(content.encode('utf-8')).hexdigest()
+            )
+            self._loaded = (version, time.monotonic())
+
+    def names(self):
+        # id -> name; a reload swaps in a new dict, so callers may keep this one for a whole request
+        self._ensure_loaded()
+        return self._state[0]
+
+    def name_for(self, category_id):
+        return self.names().get(category_id)
+
+    def id_for(self, name):
+        self._ensure_loaded()
+        return self._state[1].get(name.strip().lower())
+
+    def snapshot(self):
+        # (etag, [{'id', 'name'}, ...]) taken from the same load
+        self._ensure_loaded()
+        names, ids, etag = self._state
+        return etag, [{'id': category_id, 'name': name} for category_id, name in names.items()]
+
+    def __len__(self):
+        return len(self._state[0])
+
+    def invalidate(self):
+        self._loaded = None
@@ -0,0 +1,96 @@
+from datetime import datetime
+from sqlalchemy import event, select, text
+from sqlalchemy.orm import Session
+from app.models import Expenses, Notification, Tombstone
+from app.projection import EXPENSE_FIELDS, columns_for, row_serializer
+from app.transactions import read_snapshot
+
+# Entities in the feed, by the name clients see
+TRACKED = {'expense': Expenses, 'notification': Notification}
+ENTITY_NAMES = {model: name for name, model in TRACKED.items()}
+
+EXPENSE_CHANGE_FIELDS = ['id', 'amount', 'description', 'date', 'category_id']
+NOTIFICATION_CHANGE_FIELDS = ['id', 'message', 'type', 'created_at', 'is_read']
+
+# Hands out a block of n sequence numbers and returns the last one. The row lock (the database
+# write lock on SQLite) is held until the transaction ends, so numbers are assigned in commit
+# order and a client that has seen cursor N can never later miss a change numbered N or below
+ALLOCATE = text(
+    'INSERT INTO change_counter (id, value) VALUES (1, :n) '
+    'ON CONFLICT (id) DO UPDATE SET value = change_counter.value + :n '
+    'RETURNING value'
+)
+
+def allocate(session, count):
+    last = session.execute(ALLOCATE, {'n': count}).scalar()
+    return iter(range(last - count + 1, last + 1))
+
+def stamp(obj, seq, now):
+    obj.change_seq = seq
+    obj.updated_at = now
+
+@event.listens_for(Session, 'before_flush')
+def _record_changes(session, flush_context, instances):
+    changed = [obj for obj in session.new if type(obj) in ENTITY_NAMES]
+    changed += [obj for obj in session.dirty if type(obj) in ENTITY_NAMES and session.is_modified(obj)]
+    deleted = [obj for obj in session.deleted if type(obj) in ENTITY_NAMES]
+    if not changed and not deleted:
+        return
+
+    now = datetime.utcnow()
+    numbers = allocate(session, len(changed) + len(deleted))
+    for obj in changed:
+        stamp(obj, next(numbers), now)
+    for obj in deleted:
+        session.add(Tombstone(entity=ENTITY_NAMES[type(obj)], entity_id=obj.id, user_id=obj.user_id,
+                              change_seq=next(numbers), deleted_at=now))
+
+def serialize_notification(row):
+    # Same shape as the /notifications listing
+    notification_id, message, notification_type, created_at, is_read = row
+    return {'id': notification_id, 'message': message, 'type': notification_type,
+            'created_at': created_at.strftime('%Y-%m-%d %H:%M:%S'), 'is_read': is_read}
+
+# (entity, model, selected columns, row -> data) for every source of upserts
+FEEDS = [
+    ('expense', Expenses, columns_for(EXPENSE_CHANGE_FIELDS, EXPENSE_FIELDS), row_serializer(EXPENSE_CHANGE_FIELDS)),
+    ('notification', Notification, [getattr(Notification, name) for name in NOTIFICATION_CHANGE_FIELDS],
+     serialize_notification),
+]
+
+def changes_since(session, user_id, since, limit):
+    """Changes to the user's expenses and notifications numbered above `since`, oldest first.
+
+    Each source is read from its (user_id, change_seq) index and cut at limit + 1
+    rows, all in one snapshot; the merged page is cut again, so has_more is exact. Returns
+    (changes, cursor, has_more) where cursor is the number of the last change.
+    """
+    read_snapshot(session)  # A commit between the three reads could otherwise be half seen
+
+    changes = []
+    for entity, model, columns, serialize in FEEDS:
+        rows = session.execute(
+            select(model.change_seq, *columns)
+            .where(model.user_id == user_id, model.change_seq > since)
+            .order_by(model.change_seq)
+            .limit(limit + 1)).all()
+        changes += [
+            {'cursor': row[0], 'type': entity, 'op': 'upsert', 'id': row[1], 'data': serialize(row[1:])}
+            for row in rows
+        ]
+
+    tombstones = session.execute(
+        select(Tombstone.change_seq, Tombstone.entity, Tombstone.entity_id)
+        .where(Tombstone.user_id == user_id, Tombstone.change_seq > since)
+        .order_by(Tombstone.change_seq)
+        .limit(limit + 1)).all()
+    changes += [
+        {'cursor': seq, 'type': entity, 'op': 'delete', 'id': entity_id}
+        for seq, entity, entity_id in tombstones
+    ]
+
+    changes.sort(key=lambda change: change['cursor'])
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    cursor = changes[-1]['cursor'] if changes else since
+    return changes, cursor, has_more
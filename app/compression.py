@@ -0,0 +1,96 @@
+import zlib
+from flask import request
+from werkzeug.wsgi import ClosingIterator
+
+try:
+    import brotli  # Optional: only offered to clients when the package is installed
+except ImportError:
+    brotli = None
+
+class GzipEncoder:
+    name = 'gzip'
+
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31 writes a gzip header
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        # Sync flush emits everything compressed so far without ending the stream
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+class BrotliEncoder:
+    name = 'br'
+
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+def available_encodings():
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+def make_encoder(encoding, config):
+    if encoding == 'br':
+        return BrotliEncoder(config['COMPRESS_BROTLI_QUALITY'])
+    return GzipEncoder(config['COMPRESS_LEVEL'])
+
+def compress_bytes(data, encoder):
+    return encoder.compress(data) + encoder.finish()
+
+def compress_stream(chunks, encoder):
+    # Compress each chunk as it is produced so streamed responses stay streamed
+    def generate():
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = encoder.compress(chunk) + encoder.flush()
+            if data:
+                yield data
+        yield encoder.finish()
+
+    # Closing the wrapper must still close the original body (and its request context)
+    return ClosingIterator(generate(), [chunks.close] if hasattr(chunks, 'close') else None)
+
+def choose_encoding():
+    return request.accept_encodings.best_match(available_encodings())
+
+def init_app(app):
+    @app.after_request
+    def compress_response(response):
+        config = app.config
+        if not config['COMPRESS_ENABLED'] or request.method == 'HEAD':
+            return response
+        if response.status_code < 200 or response.status_code in (204, 304):
+            return response
+        if response.mimetype not in config['COMPRESS_MIMETYPES'] or 'Content-Encoding' in response.headers:
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding()
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            # The final size is unknown, so streamed bodies are always compressed
+            response.response = compress_stream(response.response, make_encoder(encoding, config))
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < config['COMPRESS_MIN_SIZE']:
+                return response
+            response.set_data(compress_bytes(data, make_encoder(encoding, config)))
+
+        response.headers['Content-Encoding'] = encoding
+        return response
@@ -8,10 +8,138 @@ class Config:
         'sqlite:///' + os.path.join(basedir, 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Background jobs (recurring expenses); off for tests and one-off commands
+    SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    # False when a process manager picks the process that runs jobs (see gunicorn.conf.py)
+    SCHEDULER_AUTOSTART = True
+    # Flask-Migrate for the `flask db` commands; None registers it only when running under the flask CLI
+    MIGRATE_ENABLED = None
+
+    # Streaming listings: rows fetched per database round trip and rows per written chunk
+    STREAM_YIELD_PER = 1000
+    STREAM_CHUNK_ROWS = 500
+
+    # /expenses/search page size
+    SEARCH_DEFAULT_LIMIT = 50
+    SEARCH_MAX_LIMIT = 500
+
+    # /dashboard: number of recent expenses and notifications returned
+    DASHBOARD_DEFAULT_LIMIT = 5
+    DASHBOARD_MAX_LIMIT = 50
+
+    # /changes page size
+    CHANGES_DEFAULT_LIMIT = 500
+    CHANGES_MAX_LIMIT = 5000
+
+    # /batch: most sub-requests accepted in one call
+    BATCH_MAX_REQUESTS = 500
+
+    # /expenses/bulk: most ids accepted in one call
+    BULK_MAX_IDS = 5000
+
+    # Category id <-> name map cached per process; reloaded on local changes or after this many seconds
+    CATEGORY_CATALOG_TTL = 60
+
+    # user_name -> id cache for /add_expense and /expenses; other workers see renames after the TTL
+    USER_ID_CACHE_SIZE = 10000
+    USER_ID_CACHE_TTL = 300
+
+    # Cached responses of read endpoints, invalidated when a commit touches the rows they read.
+    # 'memory' is private to each process; use 'sqlite' (a file shared on the host) with several workers
+    RESULT_CACHE_ENABLED = True
+    RESULT_CACHE_BACKEND = os.environ.get('RESULT_CACHE_BACKEND') or 'memory'
+    RESULT_CACHE_PATH = os.environ.get('RESULT_CACHE_PATH')  # None uses result_cache.db in the instance folder
+    RESULT_CACHE_TTL = 300
+    RESULT_CACHE_MAX_ENTRIES = 10000
+    RESULT_CACHE_ADMIN_PATH = '/admin/cache'
+
+    # Response compression negotiated through Accept-Encoding (brotli is used when installed)
+    COMPRESS_ENABLED = True
+    COMPRESS_MIN_SIZE = 1024  # Buffered bodies smaller than this are sent as-is
+    COMPRESS_LEVEL = 6  # gzip level, 1 (fastest) to 9 (smallest)
+    COMPRESS_BROTLI_QUALITY = 4  # brotli quality, 0 (fastest) to 11 (smallest)
+    COMPRESS_MIMETYPES = ['application/json', 'application/x-ndjson', 'application/msgpack', 'text/csv']
+
+    # Prometheus metrics; set METRICS_MULTIPROC_DIR when running several worker processes
+    METRICS_ENABLED = True
+    METRICS_PATH = '/metrics'
+    METRICS_MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR')
+    METRICS_FLUSH_INTERVAL = 5  # Seconds between per-process dumps in multi-process mode
+
+    # Per-request SQL accounting: log requests over these limits and flag repeated statements as N+1s
+    SQL_STATS_ENABLED = True
+    SQL_STATS_HEADERS = False  # X-SQL-* response headers, enabled outside production
+    SQL_STATS_MAX_STATEMENTS = 20
+    SQL_STATS_MAX_DB_MS = 200
+    SQL_STATS_REPEAT_THRESHOLD = 5
+
+    # Slow query log: statements over the threshold are written, with their query plan, as JSON lines
+    SLOW_QUERY_ENABLED = True
+    SLOW_QUERY_THRESHOLD_MS = 100
+    SLOW_QUERY_EXPLAIN = True
+    SLOW_QUERY_LOG_FILE = os.environ.get('SLOW_QUERY_LOG_FILE')  # None writes slow_queries.log in the instance folder
+    SLOW_QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024
+    SLOW_QUERY_LOG_BACKUP_COUNT = 5
+    SLOW_QUERY_QUEUE_SIZE = 1000  # Records beyond this are dropped rather than blocking requests
+
+    # Shared secret for operational endpoints and headers, sent as X-Admin-Token; unset disables them
+    ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+    # On-demand profiling: requests with X-Profile plus the admin token, or a random sample of traffic
+    PROFILER_ENABLED = True
+    PROFILER_MODE = 'cprofile'  # 'cprofile' writes .pstats, 'sampling' writes collapsed stacks
+    PROFILER_SAMPLE_RATE = 0.0  # Fraction of all requests profiled without the header
+    PROFILER_SAMPLE_INTERVAL = 0.005  # Seconds between stack samples in sampling mode
+    PROFILER_DIR = os.environ.get('PROFILER_DIR') or 'profiles'
+
+    # Admin-only memory report: tracemalloc diffs between calls, live model objects and cache sizes
+    MEMORY_DIAGNOSTICS_ENABLED = True
+    MEMORY_DIAGNOSTICS_PATH = '/admin/memory'
+    MEMORY_TRACE_ON_START = False  # Otherwise tracing starts on the first call to the endpoint
+    MEMORY_TRACE_FRAMES = 1  # Stack depth kept per allocation; more frames cost more memory
+    MEMORY_TOP_LIMIT = 25
+
+    # Logging: records are queued on the calling thread and written by a listener thread
+    # Quiet by default for scripts and local runs; deployments opt in through the environment
+    LOG_LEVEL = os.environ.get('LOG_LEVEL') or 'WARNING'
+    LOG_FILE = os.environ.get('LOG_FILE')  # None logs to stderr
+    LOG_JSON = True  # One JSON object per line with request id, user id and latency
+    LOG_REQUESTS = True  # Access record for every finished request
+    LOG_MAX_BYTES = 10 * 1024 * 1024
+    LOG_BACKUP_COUNT = 5
+    LOG_QUEUE_SIZE = 10000  # Records beyond this are dropped rather than blocking requests
+
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'  # Use an in-memory database for testing
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     WTF_CSRF_ENABLED = False  # Disable CSRF protection in the testing environment if applicable
+    SQL_STATS_HEADERS = True
+    SCHEDULER_ENABLED = False
+    SLOW_QUERY_ENABLED = False
+    LOG_LEVEL = 'WARNING'
+    LOG_FILE = None
+    LOG_REQUESTS = False
+
+class DevelopmentConfig(Config):
+    DEBUG = True
+    SQL_STATS_HEADERS = True
+    LOG_LEVEL = 'DEBUG'
+    LOG_FILE = None
+    LOG_JSON = False  # Readable lines in the terminal
+
+class ProductionConfig(Config):
+    SQL_STATS_HEADERS = False
+    SCHEDULER_AUTOSTART = False  # Started only in the gunicorn master, never in each worker
+    # gunicorn runs several workers, and a per-process 'memory' cache would keep serving responses
+    # that another worker's commit has invalidated
+    RESULT_CACHE_BACKEND = os.environ.get('RESULT_CACHE_BACKEND') or 'sqlite'
+    LOG_LEVEL = os.environ.get('LOG_LEVEL') or 'INFO'
+    # Several worker processes cannot safely rotate one file, so log to stderr for the process manager
+    LOG_FILE = os.environ.get('LOG_FILE')
 
-# Add other environment-specific configs (e.g., DevelopmentConfig, ProductionConfig) as needed
+class CommandConfig(Config):
+    # One-off scripts such as create.py: no background threads or per-request extras
+    SCHEDULER_ENABLED = False
+    SLOW_QUERY_ENABLED = False
+    LOG_REQUESTS = False
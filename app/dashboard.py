@@ -0,0 +1,69 @@
+from sqlalchemy import func, select
+from app.models import Expenses, Notification, User
+from app.money import format_cents
+from app.projection import format_date
+from app.transactions import read_snapshot
+
+def build_dashboard(session, user_id, month_start, month_end, limit, category_names):
+    """Everything the home screen shows, in four queries on the per-user indexes.
+
+    Returns None when the user does not exist.
+    """
+    read_snapshot(session)
+
+    # The unread count rides along with the profile as a scalar subquery (ix_notification_user_created)
+    unread = select(func.count()).where(
+        Notification.user_id == user_id, Notification.is_read.is_not(True)).scalar_subquery()
+    profile = session.execute(
+        select(User.user_name, User.email, User.created_at, unread).where(User.id == user_id)).first()
+    if profile is None:
+        return None
+
+    # Range scan of ix_expenses_user_date; the sums are over integer cents, so they are exact
+    totals = session.execute(
+        select(Expenses.category_id, func.sum(Expenses.amount_cents), func.count())
+        .where(Expenses.user_id == user_id, Expenses.date >= month_start, Expenses.date < month_end)
+        .group_by(Expenses.category_id)
+        .order_by(Expenses.category_id)).all()
+
+    # Both read their index backwards and stop after `limit` rows
+    expenses = session.execute(
+        select(Expenses.id, Expenses.amount_cents, Expenses.description, Expenses.date, Expenses.category_id)
+        .where(Expenses.user_id == user_id)
+        .order_by(Expenses.date.desc(), Expenses.id.desc())
+        .limit(limit)).all()
+    notifications = session.execute(
+        select(Notification.id, Notification.message, Notification.type, Notification.created_at,
+               Notification.is_read)
+        .where(Notification.user_id == user_id)
+        .order_by(Notification.created_at.desc(), Notification.id.desc())
+        .limit(limit)).all()
+
+    user_name, email, created_at, unread_count = profile
+    return {
+        'profile': {
+            'user_name': user_name,
+            'email': email,
+            'created_at': created_at.isoformat(),
+        },
+        'unread_notifications': unread_count,
+        'month': {
+            'period': month_start.strftime('%Y-%m'),
+            'total': format_cents(sum(total for _, total, _ in totals)),
+            'by_category': [
+                {'category_id': category_id, 'category': category_names.get(category_id),
+                 'total': format_cents(total), 'count': count}
+                for category_id, total, count in totals
+            ],
+        },
+        'recent_expenses': [
+            {'id': expense_id, 'amount': format_cents(amount), 'description': description, 'date': format_date(expense_date),
+             'category_id': category_id, 'category': category_names.get(category_id)}
+            for expense_id, amount, description, expense_date, category_id in expenses
+        ],
+        'recent_notifications': [
+            {'id': notification_id, 'message': message, 'type': notification_type,
+             'created_at': notification_created.strftime('%Y-%m-%d %H:%M:%S'), 'is_read': is_read}
+            for notification_id, message, notification_type, notification_created, is_read in notifications
+        ],
+    }
@@ -0,0 +1,137 @@
+import gc
+import os
+import resource
+import sys
+import threading
+import tracemalloc
+from flask import request
+from app.admin import admin_required
+from app.serializers import respond
+
+GROUP_BY = ('lineno', 'filename', 'traceback')
+
+def register_cache(app, name, size):
+    # size() returns the current number of entries; shown by the memory diagnostics endpoint
+    app.extensions.setdefault('memory_caches', {})[name] = size
+
+def current_rss():
+    # Resident set size in bytes from /proc where available, otherwise the peak from getrusage
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+def tracked_types():
+    from app import db
+
+    types = {mapper.class_: mapper.class_.__name__ for mapper in db.Model.registry.mappers}
+    fpdf = sys.modules.get('fpdf')
+    if fpdf is not None:
+        # Only counted once PDF export has been used; importing fpdf here would skew the numbers
+        types[fpdf.FPDF] = 'FPDF'
+    return types
+
+def count_objects(types):
+    counts = dict.fromkeys(types.values(), 0)
+    for obj in gc.get_objects():
+        name = types.get(type(obj))
+        if name is not None:
+            counts[name] += 1
+    return counts
+
+def format_stat(stat, group_by):
+    frames = stat.traceback if group_by == 'traceback' else stat.traceback[:1]
+    return {
+        'location': [f'{frame.filename}:{frame.lineno}' if group_by != 'filename' else frame.filename
+                     for frame in frames],
+        'size_diff': stat.size_diff,
+        'size': stat.size,
+        'count_diff': stat.count_diff,
+        'count': stat.count,
+    }
+
+class MemoryDiagnostics:
+    """Admin-only report of allocation growth, live model objects and in-process cache sizes.
+
+    Each call takes a ``tracemalloc`` snapshot and diffs it against the snapshot
+    of the previous call, so calling it before and after a suspect workload shows
+    what that workload left behind.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._baseline = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['memory_diagnostics'] = self
+        app.add_url_rule(app.config['MEMORY_DIAGNOSTICS_PATH'], 'memory_diagnostics',
+                         admin_required(self.report), methods=['GET', 'DELETE'])
+
+        from app.blacklist import blacklist
+        from app.instrumentation import statement_shape
+        register_cache(app, 'jwt_blacklist', lambda: len(blacklist))
+        register_cache(app, 'category_catalog', lambda: len(app.extensions['category_catalog']))
+        register_cache(app, 'user_ids', lambda: len(app.extensions['user_ids']))
+        register_cache(app, 'statement_shapes', lambda: statement_shape.cache_info().currsize)
+        if app.config['RESULT_CACHE_ENABLED'] and app.config['RESULT_CACHE_BACKEND'] == 'memory':
+            register_cache(app, 'result_cache', lambda: len(app.extensions['result_cache']))
+        if 'slow_query_log' in app.extensions:
+            register_cache(app, 'slow_query_plans', lambda: len(app.extensions['slow_query_log']._plans))
+
+        if app.config['MEMORY_TRACE_ON_START']:
+            tracemalloc.start(app.config['MEMORY_TRACE_FRAMES'])
+
+    def snapshot(self):
+        snapshot = tracemalloc.take_snapshot()
+        # Leave out the bookkeeping of tracemalloc itself and of this module's diffing
+        return snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ))
+
+    def report(self):
+        if request.method == 'DELETE':
+            # Stop tracing and drop the baseline; tracing slows every allocation down
+            with self._lock:
+                self._baseline = None
+                tracemalloc.stop()
+            return respond({'message': 'Memory tracing stopped'}, 200)
+
+        group_by = request.args.get('group_by', 'lineno')
+        if group_by not in GROUP_BY:
+            return respond({'message': f"group_by must be one of: {', '.join(GROUP_BY)}"}, 400)
+        try:
+            limit = int(request.args.get('limit', self.app.config['MEMORY_TOP_LIMIT']))
+        except ValueError:
+            return respond({'message': 'limit must be an integer'}, 400)
+
+        gc.collect()
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.app.config['MEMORY_TRACE_FRAMES'])
+            current = self.snapshot()
+            baseline = self._baseline
+            if request.args.get('keep_baseline') is None or baseline is None:
+                self._baseline = current
+
+        if baseline is None:
+            top = []  # First call only starts the comparison
+        else:
+            top = [format_stat(stat, group_by) for stat in current.compare_to(baseline, group_by)[:limit]]
+
+        traced, peak = tracemalloc.get_traced_memory()
+        caches = self.app.extensions.get('memory_caches', {})
+        return respond({
+            'pid': os.getpid(),
+            'rss_bytes': current_rss(),
+            'traced_bytes': traced,
+            'traced_peak_bytes': peak,
+            'compared_to_previous': baseline is not None,
+            'top_allocations': top,
+            'objects': count_objects(tracked_types()),
+            'caches': {name: size() for name, size in sorted(caches.items())},
+        }, 200)
@@ -0,0 +1,128 @@
+from datetime import datetime
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ColumnElement
+from sqlalchemy.sql.visitors import InternalTraversal
+from app.models import Expenses
+from app.money import to_cents
+
+# Sort keys accepted by `sort_by=`, each with the index on (user_id, key, id) that serves it
+# (see Expenses.__table_args__)
+SORT_KEYS = {
+    'date': (Expenses.date, 'ix_expenses_user_date'),
+    'amount': (Expenses.amount_cents, 'ix_expenses_user_amount'),
+    'description': (Expenses.description, 'ix_expenses_user_description'),
+    'id': (Expenses.id, 'ix_expenses_user_id_id'),
+}
+
+# `period=` granularities: the format of the value decides whether it is a year, month or day
+PERIOD_FORMATS = [('%Y-%m-%d', 'day'), ('%Y-%m', 'month'), ('%Y', 'year')]
+
+class unindexed(ColumnElement):
+    """A column the SQLite planner must not use an index for.
+
+    SQLite's unary + returns the value unchanged but keeps the term off any
+    index, the documented way to steer the planner towards another one. Other
+    dialects get the plain column, since + is a type error there on text and
+    timestamps.
+    """
+    inherit_cache = True
+    _traverse_internals = [('column', InternalTraversal.dp_clauseelement)]
+
+    def __init__(self, column):
+        self.column = column
+        self.type = column.type
+
+@compiles(unindexed)
+def _compile_unindexed(element, compiler, **kw):
+    return compiler.process(element.column, **kw)
+
+@compiles(unindexed, 'sqlite')
+def _compile_unindexed_sqlite(element, compiler, **kw):
+    return '+' + compiler.process(element.column, **kw)
+
+def order_expenses(query, sort_by, order):
+    """Order a query over one user's expenses by a whitelisted key, with id as the tiebreaker."""
+    if sort_by not in SORT_KEYS:
+        raise ValueError(f"sort_by must be one of: {', '.join(SORT_KEYS)}")
+    if order not in ('asc', 'desc'):
+        raise ValueError('order must be asc or desc')
+
+    column = SORT_KEYS[sort_by][0]
+    # id breaks ties in the same direction, so the scan can follow the index forwards or backwards
+    keys = [column] if sort_by == 'id' else [column, Expenses.id]
+    return query.order_by(*[key.asc() if order == 'asc' else key.desc() for key in keys])
+
+def parse_period(value):
+    # '2024' -> [2024-01-01, 2025-01-01), '2024-10' -> one month, '2024-10-05' -> one day
+    for fmt, granularity in PERIOD_FORMATS:
+        try:
+            start = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        if granularity == 'year':
+            return start, start.replace(year=start.year + 1)
+        if granularity == 'month':
+            if start.month == 12:
+                return start, start.replace(year=start.year + 1, month=1)
+            return start, start.replace(month=start.month + 1)
+        return start, datetime.fromordinal(start.toordinal() + 1)
+    raise ValueError('period must be YYYY, YYYY-MM or YYYY-MM-DD')
+
+def parse_category_ids(args):
+    # Both `category_id=1&category_id=2` and `category_id=1,2` are accepted
+    ids = []
+    for raw in args.getlist('category_id'):
+        for part in raw.split(','):
+            if part.strip():
+                try:
+                    ids.append(int(part))
+                except ValueError:
+                    raise ValueError('category_id must be a list of integers')
+    return ids
+
+def escape_like(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def expense_filters(args, sort_by=None):
+    """Criteria shared by /filter_expenses and /expenses/search.
+
+    Conditions are plain ranges or membership tests on columns, never functions
+    of them. When the rows are ordered by ``sort_by``, conditions on other
+    columns are wrapped in unindexed(). That keeps SQLite on the (user_id,
+    sort_by, id) index, so it streams rows in order. Otherwise it would pick the
+    index of a filtered column and sort every match in a temp B-tree. Raises
+    ValueError with a client-facing message for malformed parameters.
+    """
+    def column(name):
+        target = SORT_KEYS[name][0] if name in SORT_KEYS else getattr(Expenses, name)
+        return target if sort_by is None or name == sort_by else unindexed(target)
+
+    criteria = []
+
+    # Bounds are decimal strings compared in cents, so max_amount=19.99 keeps an expense of exactly 19.99
+    if args.get('min_amount'):
+        criteria.append(column('amount') >= to_cents(args['min_amount']))
+    if args.get('max_amount'):
+        criteria.append(column('amount') <= to_cents(args['max_amount']))
+
+    try:
+        if args.get('start_date'):
+            criteria.append(column('date') >= datetime.strptime(args['start_date'], '%Y-%m-%d'))
+        if args.get('end_date'):
+            criteria.append(column('date') <= datetime.strptime(args['end_date'], '%Y-%m-%d'))
+    except ValueError:
+        raise ValueError('Dates must use the YYYY-MM-DD format')
+
+    if args.get('period'):
+        start, end = parse_period(args['period'])
+        criteria.extend([column('date') >= start, column('date') < end])
+
+    category_ids = parse_category_ids(args)
+    if category_ids:
+        criteria.append(column('category_id').in_(category_ids))
+
+    prefix = args.get('description_prefix')
+    if prefix:
+        criteria.append(column('description').like(escape_like(prefix) + '%', escape='\\'))
+
+    return criteria
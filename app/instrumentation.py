@@ -0,0 +1,136 @@
+import re
+import time
+from functools import lru_cache
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from werkzeug.wsgi import ClosingIterator
+
+class RequestStats:
+    """Per-request measurements shared by the metrics, SQL accounting and logging hooks."""
+
+    def __init__(self, endpoint, method):
+        self.endpoint = endpoint
+        self.method = method
+        self.started = time.perf_counter()
+        self.duration = None
+        self.status = None
+        self.response_bytes = 0
+        self.db_seconds = 0.0
+        self.statement_count = 0
+        self.statement_shapes = {}  # normalized SQL -> executions during this request
+        self.finished = False
+        self.request_id = None  # Set by the logging hooks
+        self.user_id = None
+
+def current_stats():
+    if not has_request_context():
+        return None
+    return g.get('request_stats')
+
+def on_request_started(app, callback):
+    app.extensions['instrumentation']['started'].append(callback)
+
+def on_statement(app, callback):
+    # callback(conn, statement, parameters, executemany, elapsed) runs after every SQL statement,
+    # inside or outside a request, on the thread that executed it
+    app.extensions['instrumentation']['statement'].append(callback)
+
+def on_request_finished(app, callback):
+    # Callbacks run once per request, after the body has been fully sent for streamed responses
+    app.extensions['instrumentation']['finished'].append(callback)
+
+def _finish(callbacks, stats):
+    if stats.finished:
+        return
+    stats.finished = True
+    stats.duration = time.perf_counter() - stats.started
+    for callback in callbacks:
+        callback(stats)
+
+def _count_streamed_bytes(chunks, stats, callbacks):
+    def generate():
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            stats.response_bytes += len(chunk)
+            yield chunk
+        _finish(callbacks, stats)
+
+    # ClosingIterator also finishes the request when the client disconnects before the end
+    close_callbacks = [lambda: _finish(callbacks, stats)]
+    if hasattr(chunks, 'close'):
+        close_callbacks.insert(0, chunks.close)
+    return ClosingIterator(generate(), close_callbacks)
+
+@lru_cache(maxsize=1024)
+def statement_shape(statement):
+    # Collapse whitespace and expanded IN lists so the same query with different ids shares a shape
+    shape = re.sub(r'\s+', ' ', statement).strip()
+    return re.sub(r'\?(?:, \?)+', '?, ...', shape)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+def _record_statement(conn, statement, parameters, executemany, callbacks):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    stats = current_stats()
+    if stats is not None:
+        stats.db_seconds += elapsed
+        stats.statement_count += 1
+        shape = statement_shape(statement)
+        stats.statement_shapes[shape] = stats.statement_shapes.get(shape, 0) + 1
+    for callback in callbacks:
+        callback(conn, statement, parameters, executemany, elapsed)
+
+def _handle_error(exception_context):
+    # after_cursor_execute never fires for a failed statement, so drop its start time here
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('query_started'):
+        connection.info['query_started'].pop()
+
+def init_app(app):
+    from app import db
+
+    hooks = {'started': [], 'finished': [], 'statement': []}
+    app.extensions['instrumentation'] = hooks
+
+    @app.before_request
+    def start_request_stats():
+        stats = RequestStats(request.endpoint or 'unmatched', request.method)
+        g.request_stats = stats
+        request.environ['app.request_stats'] = stats
+        for callback in hooks['started']:
+            callback(stats)
+
+    @app.after_request
+    def measure_response(response):
+        stats = g.get('request_stats')
+        if stats is None:
+            return response
+
+        stats.status = response.status_code
+        if response.is_streamed:
+            # Finish once the last chunk has been written rather than when the view returns
+            response.response = _count_streamed_bytes(response.response, stats, hooks['finished'])
+        else:
+            stats.response_bytes = response.content_length or 0
+            _finish(hooks['finished'], stats)
+        return response
+
+    @app.teardown_request
+    def finish_failed_request(error):
+        # after_request is skipped when a request fails outright; count it as a server error.
+        # Read from the environ so in-process sub-requests (see batch.py) never finish their parent
+        stats = request.environ.get('app.request_stats')
+        if stats is not None and stats.status is None:
+            stats.status = 500
+            _finish(hooks['finished'], stats)
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        _record_statement(conn, statement, parameters, executemany, hooks['statement'])
+
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+            event.listen(engine, 'handle_error', _handle_error)
@@ -0,0 +1,53 @@
+from app import scheduler
+
+# Extensions in app.extensions that keep threads, queues or locks and know how to reset them
+FORK_AWARE_EXTENSIONS = ('logging', 'metrics', 'slow_query_log', 'category_catalog', 'user_ids', 'result_cache')
+
+def after_fork(app):
+    """Make an app created before fork (gunicorn --preload) safe to use in the child."""
+    from app import db
+
+    with app.app_context():
+        for engine in db.engines.values():
+            # close=False leaves the parent's connections open for the parent; the child opens its own
+            engine.dispose(close=False)
+
+    # Jobs belong to the designated process; the scheduler copied into this one has no thread behind it
+    app.extensions.pop('scheduler', None)
+
+    for name in FORK_AWARE_EXTENSIONS:
+        extension = app.extensions.get(name)
+        if extension is not None:
+            extension.after_fork()
+
+def start_background(app):
+    # Only the designated process calls this, so jobs run once however many workers there are
+    scheduler.start(app)
+
+def shutdown(app):
+    """Stop background work and write out anything still queued; safe to call more than once."""
+    scheduler.shutdown(app)
+
+    slow_query_log = app.extensions.get('slow_query_log')
+    if slow_query_log is not None:
+        slow_query_log.flush()
+
+    metrics = app.extensions.get('metrics')
+    if metrics is not None and app.config['METRICS_MULTIPROC_DIR']:
+        metrics.flush(app.config['METRICS_MULTIPROC_DIR'])
+
+    logging_pipeline = app.extensions.get('logging')
+    if logging_pipeline is not None:
+        logging_pipeline.stop()
+
+def reset_metrics(app):
+    # Before the first worker starts: drop the per-process files of an earlier run
+    metrics = app.extensions.get('metrics')
+    if metrics is not None and app.config['METRICS_MULTIPROC_DIR']:
+        metrics.reset(app.config['METRICS_MULTIPROC_DIR'])
+
+def retire_worker(app, pid):
+    # After a worker has exited, for whatever reason; its last flush is folded into the shared total
+    metrics = app.extensions.get('metrics')
+    if metrics is not None and app.config['METRICS_MULTIPROC_DIR']:
+        metrics.retire(app.config['METRICS_MULTIPROC_DIR'], pid)
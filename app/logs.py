@@ -0,0 +1,169 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import time
+import uuid
+from datetime import datetime, timezone
+from flask import g, request
+from flask_jwt_extended import get_jwt_identity
+from app.instrumentation import current_stats, on_request_finished, on_request_started
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s [%(request_id)s]: %(message)s [in %(pathname)s:%(lineno)d]'
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+# Attributes every LogRecord has; anything else was passed through `extra=` and is kept in the JSON
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+access_logger = logging.getLogger('app.access')
+
+class RequestContextFilter(logging.Filter):
+    # Runs on the logging thread's caller, where the request context is still available
+    def filter(self, record):
+        stats = current_stats()
+        if not hasattr(record, 'request_id'):
+            record.request_id = stats.request_id if stats is not None else None
+        if not hasattr(record, 'user_id'):
+            record.user_id = stats.user_id if stats is not None else None
+        if not hasattr(record, 'latency_ms') and stats is not None:
+            record.latency_ms = round((time.perf_counter() - stats.started) * 1000, 3)
+        return True
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the listener thread; drops them instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        # Resolve the message and traceback now: args and exc_info may not survive the thread hop
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for name, value in vars(record).items():
+            if name not in _RECORD_ATTRIBUTES:
+                entry[name] = value
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        elif record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class LogPipeline:
+    """Root logging for the process: callers enqueue, a QueueListener thread formats and writes.
+
+    Logging is process-wide, so configuring a second app replaces the previous pipeline.
+    """
+
+    active = None
+
+    def __init__(self, config):
+        self.queue = queue.Queue(maxsize=config['LOG_QUEUE_SIZE'])
+        self.queue_handler = NonBlockingQueueHandler(self.queue)
+        self.queue_handler.addFilter(RequestContextFilter())
+
+        if config['LOG_FILE']:
+            target = logging.handlers.RotatingFileHandler(
+                config['LOG_FILE'],
+                maxBytes=config['LOG_MAX_BYTES'],
+                backupCount=config['LOG_BACKUP_COUNT'],
+                delay=True
+            )
+        else:
+            target = logging.StreamHandler()
+        target.setFormatter(JsonFormatter() if config['LOG_JSON'] else logging.Formatter(TEXT_FORMAT))
+        self.target = target
+        self.listener = logging.handlers.QueueListener(self.queue, target, respect_handler_level=True)
+
+    def start(self, level):
+        if LogPipeline.active is not None:
+            LogPipeline.active.stop()
+        root = logging.getLogger()
+        root.addHandler(self.queue_handler)
+        root.setLevel(level)
+        self.listener.start()
+        LogPipeline.active = self
+
+    def after_fork(self):
+        # The listener thread stayed in the parent and the queue's lock may have been held at fork time
+        self.queue = queue.Queue(maxsize=self.queue.maxsize)
+        self.queue_handler.queue = self.queue
+        self.listener = logging.handlers.QueueListener(self.queue, self.target, respect_handler_level=True)
+        self.listener.start()
+
+    def stop(self):
+        # Writes out everything already queued before returning; safe to call more than once
+        logging.getLogger().removeHandler(self.queue_handler)
+        if self.listener._thread is not None:
+            self.listener.stop()
+        self.target.close()
+        if LogPipeline.active is self:
+            LogPipeline.active = None
+
+@atexit.register
+def _stop_active_pipeline():
+    # The listener thread is a daemon, so flush whatever is still queued at interpreter exit
+    if LogPipeline.active is not None:
+        LogPipeline.active.stop()
+
+def init_app(app):
+    config = app.config
+    pipeline = LogPipeline(config)
+    pipeline.start(config['LOG_LEVEL'])
+    app.extensions['logging'] = pipeline
+
+    def assign_request_id(stats):
+        # Reuse the caller's id so a request can be followed across services
+        stats.request_id = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+
+    @app.after_request
+    def add_request_id(response):
+        stats = g.get('request_stats')
+        if stats is None:
+            return response
+        try:
+            stats.user_id = get_jwt_identity()
+        except RuntimeError:
+            pass  # The view did not verify a token
+        response.headers[REQUEST_ID_HEADER] = stats.request_id
+        return response
+
+    def log_request(stats):
+        if not config['LOG_REQUESTS']:
+            return
+        access_logger.info('%s %s %s', stats.method, stats.endpoint, stats.status, extra={
+            'request_id': stats.request_id,
+            'user_id': stats.user_id,
+            'latency_ms': round(stats.duration * 1000, 3),
+            'method': stats.method,
+            'endpoint': stats.endpoint,
+            'status': stats.status,
+            'response_bytes': stats.response_bytes,
+            'db_ms': round(stats.db_seconds * 1000, 3),
+        })
+
+    on_request_started(app, assign_request_id)
+    on_request_finished(app, log_request)
@@ -0,0 +1,251 @@
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from flask import Response
+from app.instrumentation import on_request_finished, on_request_started
+
+# Upper bounds (seconds) of the latency and DB time histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROMETHEUS_MIMETYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Running total of every worker that has exited, so their counts survive without a file per PID
+DEAD_WORKERS_FILE = 'metrics-dead.json'
+
+class _Shard:
+    # Owned by a single thread, so updates need no locking; scrapes only read it
+    def __init__(self):
+        self.started = 0
+        self.finished = 0
+        self.requests = {}  # (endpoint, method, status) -> count
+        self.latency = {}  # endpoint -> [count per bucket..., +Inf count, sum]
+        self.db_time = {}
+        self.response_bytes = {}  # endpoint -> total bytes
+
+def _new_histogram():
+    return [0] * (len(BUCKETS) + 1) + [0.0]
+
+def _observe(histograms, key, value):
+    histogram = histograms.get(key)
+    if histogram is None:
+        histogram = histograms[key] = _new_histogram()
+    histogram[bisect_left(BUCKETS, value)] += 1
+    histogram[-1] += value
+
+def _empty_snapshot():
+    return {'in_flight': 0, 'requests': {}, 'latency': {}, 'db_time': {}, 'response_bytes': {}}
+
+def _merge(total, snapshot, include_in_flight=True):
+    if include_in_flight:
+        total['in_flight'] += snapshot['in_flight']
+    for key, count in snapshot['requests'].items():
+        total['requests'][key] = total['requests'].get(key, 0) + count
+    for name in ('latency', 'db_time'):
+        for key, histogram in snapshot[name].items():
+            merged = total[name].setdefault(key, _new_histogram())
+            for index, value in enumerate(histogram):
+                merged[index] += value
+    for key, size in snapshot['response_bytes'].items():
+        total['response_bytes'][key] = total['response_bytes'].get(key, 0) + size
+    return total
+
+def _load(path):
+    with open(path) as f:
+        snapshot = json.load(f)
+    snapshot['requests'] = {tuple(item[:3]): item[3] for item in snapshot['requests']}
+    return snapshot
+
+def _dump(snapshot, path):
+    snapshot = dict(snapshot, requests=[list(key) + [count] for key, count in snapshot['requests'].items()])
+    temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(temporary, path)  # Readers never see a half-written file
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+class Metrics:
+    """Request metrics aggregated per thread and merged when /metrics is scraped.
+
+    With ``METRICS_MULTIPROC_DIR`` set, every worker process periodically dumps
+    its totals to ``metrics-<pid>.json`` in that directory and a scrape served
+    by any worker reports the sum over all of them.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()  # Only taken the first time a thread records a request
+        self._flush_lock = threading.Lock()
+        self._pid = os.getpid()
+        self._last_flush = 0.0
+        self.app = None
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['metrics'] = self
+        on_request_started(app, self._request_started)
+        on_request_finished(app, self._request_finished)
+        app.add_url_rule(app.config['METRICS_PATH'], 'metrics', self.scrape)
+
+    def after_fork(self):
+        # Locks copied from the parent may be held by a thread that does not exist in this process
+        self._shards_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._shard()
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None or self._pid != os.getpid():
+            with self._shards_lock:
+                if self._pid != os.getpid():
+                    # Forked worker: start from zero rather than repeating the parent's counts
+                    self._pid = os.getpid()
+                    self._shards = []
+                    self._local = threading.local()
+                shard = self._local.shard = _Shard()
+                self._shards.append(shard)
+        return shard
+
+    def _request_started(self, stats):
+        self._shard().started += 1
+
+    def _request_finished(self, stats):
+        shard = self._shard()
+        shard.finished += 1
+        key = (stats.endpoint, stats.method, stats.status)
+        shard.requests[key] = shard.requests.get(key, 0) + 1
+        _observe(shard.latency, stats.endpoint, stats.duration)
+        _observe(shard.db_time, stats.endpoint, stats.db_seconds)
+        shard.response_bytes[stats.endpoint] = shard.response_bytes.get(stats.endpoint, 0) + stats.response_bytes
+
+        directory = self.app.config['METRICS_MULTIPROC_DIR']
+        if directory and time.monotonic() - self._last_flush >= self.app.config['METRICS_FLUSH_INTERVAL']:
+            self.flush(directory)
+
+    def snapshot(self):
+        total = _empty_snapshot()
+        for shard in list(self._shards):
+            _merge(total, {
+                'in_flight': shard.started - shard.finished,
+                'requests': dict(shard.requests),
+                'latency': {key: list(value) for key, value in list(shard.latency.items())},
+                'db_time': {key: list(value) for key, value in list(shard.db_time.items())},
+                'response_bytes': dict(shard.response_bytes),
+            })
+        return total
+
+    def flush(self, directory):
+        if not self._flush_lock.acquire(blocking=False):
+            return  # Another thread is already writing this process's file
+        try:
+            self._last_flush = time.monotonic()
+            _dump(self.snapshot(), os.path.join(directory, f'metrics-{os.getpid()}.json'))
+        finally:
+            self._flush_lock.release()
+
+    def reset(self, directory):
+        # Called by the process manager before any worker starts, so totals from an earlier run are not carried over
+        for path in glob.glob(os.path.join(directory, 'metrics-*')):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def retire(self, directory, pid):
+        """Fold the file of an exited worker into DEAD_WORKERS_FILE and remove it.
+
+        Only the process manager calls this, one worker at a time, so the
+        aggregate needs no lock. A PID the OS later reuses then starts from a
+        fresh file instead of overwriting, and shrinking, the old counts.
+        """
+        path = os.path.join(directory, f'metrics-{pid}.json')
+        dead_path = os.path.join(directory, DEAD_WORKERS_FILE)
+        try:
+            snapshot = _load(path)
+        except (OSError, ValueError):
+            return
+        try:
+            total = _load(dead_path)
+        except (OSError, ValueError):
+            total = _empty_snapshot()
+
+        _dump(_merge(total, snapshot, include_in_flight=False), dead_path)
+        os.remove(path)
+
+    def collect(self):
+        total = self.snapshot()
+        directory = self.app.config['METRICS_MULTIPROC_DIR']
+        if not directory:
+            return total
+
+        self.flush(directory)
+        own_file = f'metrics-{os.getpid()}.json'
+        for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+            name = os.path.basename(path)
+            if name == own_file:
+                continue
+            try:
+                snapshot = _load(path)
+                alive = name != DEAD_WORKERS_FILE and _pid_alive(int(name[len('metrics-'):-len('.json')]))
+            except (OSError, ValueError):
+                continue
+            # Counters from exited workers still count; their in-flight requests do not
+            _merge(total, snapshot, include_in_flight=alive)
+        return total
+
+    def render(self):
+        total = self.collect()
+        lines = [
+            '# HELP http_requests_total Completed HTTP requests.',
+            '# TYPE http_requests_total counter',
+        ]
+        for (endpoint, method, status), count in sorted(total['requests'].items()):
+            lines.append(f'http_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}')
+
+        lines += [
+            '# HELP http_requests_in_flight Requests currently being served.',
+            '# TYPE http_requests_in_flight gauge',
+            f"http_requests_in_flight {total['in_flight']}",
+        ]
+
+        for name, description, histograms in (
+            ('http_request_duration_seconds', 'Request latency including streamed bodies.', total['latency']),
+            ('http_request_db_seconds', 'Time spent executing SQL per request.', total['db_time']),
+        ):
+            lines += [f'# HELP {name} {description}', f'# TYPE {name} histogram']
+            for endpoint, histogram in sorted(histograms.items()):
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), histogram[:-1]):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_labels(endpoint=endpoint, le=bound)} {cumulative}')
+                lines.append(f'{name}_sum{_labels(endpoint=endpoint)} {histogram[-1]}')
+                lines.append(f'{name}_count{_labels(endpoint=endpoint)} {cumulative}')
+
+        lines += [
+            '# HELP http_response_bytes_total Response body bytes sent.',
+            '# TYPE http_response_bytes_total counter',
+        ]
+        for endpoint, size in sorted(total['response_bytes'].items()):
+            lines.append(f'http_response_bytes_total{_labels(endpoint=endpoint)} {size}')
+
+        return '\n'.join(lines) + '\n'
+
+    def scrape(self):
+        return Response(self.render(), mimetype=PROMETHEUS_MIMETYPE)
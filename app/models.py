@@ -1,7 +1,8 @@
 from app import db, bcrypt
-from sqlalchemy import Column, Integer, Float, String, DateTime, ForeignKey, Boolean
+from sqlalchemy import DDL, BigInteger, Column, Index, Integer, Float, String, DateTime, ForeignKey, Boolean, event
 from sqlalchemy.orm import relationship, validates
 from datetime import datetime
+from app.money import from_cents, to_cents
 import re
 
 # Validation functions
@@ -22,6 +23,13 @@ def validate_amount(amount):
     if amount <= 0:
         raise ValueError("Amount must be greater than zero")
 
+def set_amount(obj, value):
+    # Amounts are set as decimal strings, ints or floats and read back as Decimal
+    cents = to_cents(value)
+    validate_amount(cents)
+    obj.amount_cents = cents
+    obj.amount_float = cents / 100
+
 def validate_date(date):
     if not isinstance(date, datetime):
         raise ValueError("Date must be a datetime object")
@@ -59,28 +67,70 @@ class User(db.Model):
 # Expenses model
 class Expenses(db.Model):
     __tablename__ = 'expenses'
+    # One index per /filter_expenses sort key (see app/filters.py); id keeps the order total
+    __table_args__ = (
+        Index('ix_expenses_user_id_id', 'user_id', 'id'),
+        Index('ix_expenses_user_date', 'user_id', 'date', 'id'),
+        Index('ix_expenses_user_amount', 'user_id', 'amount_cents', 'id'),
+        Index('ix_expenses_user_description', 'user_id', 'description', 'id'),
+        Index('ix_expenses_user_change', 'user_id', 'change_seq'),  # /changes feed
+    )
     
     id = Column(Integer, primary_key=True)
-    amount = Column(Float, nullable=False)
+    # Exact amount in cents; every query, filter and total uses this column
+    amount_cents = Column(BigInteger, nullable=False)
+    # The old float column, still written so workers running the previous release read correct amounts
+    # during a rollout. Nothing reads it any more.
+    amount_float = Column('amount', Float, nullable=False)
     description = Column(String(255), nullable=False)
     date = Column(DateTime, nullable=False)
     user_id = Column(Integer, ForeignKey('user.id'), nullable=False)
     category_id = Column(Integer, ForeignKey('category.id'), nullable=False)
+    # Set on every insert and update by app/changes.py
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    change_seq = Column(Integer)
     
     # Relationships
     user = relationship('User', back_populates='expenses')
     category = relationship('Category', back_populates='expenses_list')
 
-    @validates('amount')
-    def validate_amount(self, key, amount):
-        validate_amount(amount)
-        return amount
+    @property
+    def amount(self):
+        return from_cents(self.amount_cents) if self.amount_cents is not None else None
+
+    @amount.setter
+    def amount(self, value):
+        set_amount(self, value)
 
     @validates('date')
     def validate_date(self, key, date):
         validate_date(date)
         return date
 
+# Full-text index over expense descriptions (SQLite FTS5). It is an external-content table that
+# stores only the index and reads the text from `expenses`. Triggers keep it in step with every
+# write path, including bulk Core inserts, and are dropped together with the expenses table.
+EXPENSES_FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS expenses_fts USING fts5(
+        description, content='expenses', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS expenses_fts_insert AFTER INSERT ON expenses BEGIN
+        INSERT INTO expenses_fts(rowid, description) VALUES (new.id, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS expenses_fts_delete AFTER DELETE ON expenses BEGIN
+        INSERT INTO expenses_fts(expenses_fts, rowid, description) VALUES ('delete', old.id, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS expenses_fts_update AFTER UPDATE OF description ON expenses BEGIN
+        INSERT INTO expenses_fts(expenses_fts, rowid, description) VALUES ('delete', old.id, old.description);
+        INSERT INTO expenses_fts(rowid, description) VALUES (new.id, new.description);
+    END""",
+]
+
+for statement in EXPENSES_FTS_DDL:
+    event.listen(Expenses.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(Expenses.__table__, 'before_drop', DDL('DROP TABLE IF EXISTS expenses_fts').execute_if(dialect='sqlite'))
+
 # Category model
 class Category(db.Model):
     __tablename__ = 'category'
@@ -102,7 +152,8 @@ class RecurringExpense(db.Model):
     __tablename__ = 'recurring_expense'
     
     id = Column(Integer, primary_key=True)
-    amount = Column(Float, nullable=False)
+    amount_cents = Column(BigInteger, nullable=False)
+    amount_float = Column('amount', Float, nullable=False)  # As on Expenses
     type_expense = Column(String(255), nullable=False)
     description_expense = Column(String(255), nullable=False)
     recurrence = Column(String(255), nullable=False)
@@ -115,6 +166,14 @@ class RecurringExpense(db.Model):
     user = relationship('User', back_populates='recurring_expenses')
     category = relationship('Category', back_populates='recurring_expenses_list')
 
+    @property
+    def amount(self):
+        return from_cents(self.amount_cents) if self.amount_cents is not None else None
+
+    @amount.setter
+    def amount(self, value):
+        set_amount(self, value)
+
     @validates('recurrence')
     def validate_recurrence(self, key, recurrence):
         validate_recurrence(recurrence)
@@ -129,14 +188,66 @@ class RecurringExpense(db.Model):
 
 # Notification model
 class Notification(db.Model):
+    # Serves a user's newest-first listing and the unread count without scanning other users' rows
+    __table_args__ = (
+        Index('ix_notification_user_created', 'user_id', 'created_at', 'id'),
+        Index('ix_notification_user_change', 'user_id', 'change_seq'),  # /changes feed
+    )
+
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('user.id'), nullable=False)
     message = Column(String(255), nullable=False)
     type = Column(String(50), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     is_read = Column(Boolean, default=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    change_seq = Column(Integer)
 
     user = relationship("User", back_populates="notifications")  # Assuming User has a notifications relationship
 
     def __repr__(self):
         return f'<Notification {self.message}>'
+
+# Left behind by deleted expenses and notifications so /changes can report the deletion
+class Tombstone(db.Model):
+    __tablename__ = 'tombstone'
+    __table_args__ = (
+        Index('ix_tombstone_user_change', 'user_id', 'change_seq'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    entity = Column(String(20), nullable=False)  # 'expense' or 'notification'
+    entity_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=False)
+    change_seq = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, default=datetime.utcnow)
+
+# Single row holding the last change_seq handed out (see app/changes.py)
+class ChangeCounter(db.Model):
+    __tablename__ = 'change_counter'
+    id = Column(Integer, primary_key=True)
+    value = Column(Integer, nullable=False)
+
+# Writes that skip the before_flush listener in app/changes.py (raw SQL, Core inserts, a worker still on
+# an older release) would leave change_seq NULL or stale, and /changes would never return the row. On
+# SQLite these triggers number such rows from the same counter; the application's own writes leave them idle.
+CHANGE_SEQ_NUMBER_ROW = """INSERT OR IGNORE INTO change_counter (id, value) VALUES (1, 0);
+        UPDATE change_counter SET value = value + 1 WHERE id = 1;
+        UPDATE {table} SET change_seq = (SELECT value FROM change_counter WHERE id = 1),
+            updated_at = COALESCE({updated_at}, CURRENT_TIMESTAMP) WHERE id = new.id;"""
+
+def change_seq_ddl(table):
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_change_seq_insert AFTER INSERT ON {table}
+        WHEN new.change_seq IS NULL BEGIN
+        {CHANGE_SEQ_NUMBER_ROW.format(table=table, updated_at='new.updated_at')}
+    END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_change_seq_update AFTER UPDATE ON {table}
+        WHEN new.change_seq IS old.change_seq BEGIN
+        {CHANGE_SEQ_NUMBER_ROW.format(table=table, updated_at='NULL')}
+    END""",
+    ]
+
+for model in (Expenses, Notification):
+    for statement in change_seq_ddl(model.__table__.name):
+        event.listen(model.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
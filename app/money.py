@@ -0,0 +1,29 @@
+from decimal import Decimal, InvalidOperation
+
+def to_cents(value):
+    """Exact integer cents for an amount given as a decimal string, int or float.
+
+    Floats go through their shortest repr, so 19.99 becomes 1999 rather than the
+    1998 that int(19.99 * 100) gives. Raises ValueError with a client-facing
+    message for anything else or for fractions of a cent.
+    """
+    if isinstance(value, float):
+        value = repr(value)
+    if not isinstance(value, (str, int, Decimal)) or isinstance(value, bool):
+        raise ValueError('Amounts must be decimal strings such as "12.34"')
+    try:
+        cents = Decimal(value) * 100
+    except InvalidOperation:
+        cents = None
+    if cents is None or not cents.is_finite():
+        raise ValueError('Amounts must be decimal strings such as "12.34"')
+    if cents != cents.to_integral_value():
+        raise ValueError('Amounts have at most two decimal places')
+    return int(cents)
+
+def from_cents(cents):
+    # 1999 -> Decimal('19.99'); always two places, so str() gives the API form
+    return Decimal(cents).scaleb(-2)
+
+def format_cents(cents):
+    return str(from_cents(cents)) if cents is not None else None
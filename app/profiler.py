@@ -0,0 +1,123 @@
+import cProfile
+import logging
+import os
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+from flask import g, request
+from app.admin import is_admin_request
+from app.instrumentation import on_request_finished, on_request_started
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+
+class CProfileSession:
+    # Deterministic profile of every call made while the request is served
+    extension = 'pstats'
+
+    def __init__(self):
+        self._profile = cProfile.Profile()
+
+    def start(self):
+        self._profile.enable()
+
+    def stop(self):
+        self._profile.disable()
+
+    def dump(self, path):
+        self._profile.dump_stats(path)
+
+class StackSampler:
+    # Statistical profile: a side thread records the request thread's stack every interval seconds.
+    # Much cheaper than cProfile, so it is the mode to use with a sampling rate on production traffic.
+    extension = 'collapsed'
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.counts = {}  # 'outer;...;inner' -> samples
+        self._thread_id = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread_id = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                key = ';'.join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def dump(self, path):
+        # One "frame;frame;frame count" line per stack, the input format of flamegraph.pl and speedscope
+        with open(path, 'w') as f:
+            for stack, count in sorted(self.counts.items()):
+                f.write(f'{stack} {count}\n')
+
+def should_profile(config):
+    if request.headers.get(PROFILE_HEADER) and is_admin_request():
+        return True
+    rate = config['PROFILER_SAMPLE_RATE']
+    return rate > 0 and random.random() < rate
+
+def profile_path(directory, endpoint, extension):
+    # Files are grouped per endpoint so a route's profiles can be compared or merged together
+    folder = os.path.join(directory, endpoint)
+    os.makedirs(folder, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')
+    return os.path.join(folder, f'{stamp}-{os.getpid()}-{threading.get_ident()}.{extension}')
+
+def init_app(app):
+    sessions = {}  # id(RequestStats) -> (session, path) for requests being profiled
+
+    def start_profile(stats):
+        config = app.config
+        if not should_profile(config):
+            return
+        if config['PROFILER_MODE'] == 'sampling':
+            session = StackSampler(config['PROFILER_SAMPLE_INTERVAL'])
+        else:
+            session = CProfileSession()
+        try:
+            session.start()
+        except ValueError:
+            return  # Python 3.12+ allows one cProfile per thread; a debugger or outer profiler owns it
+        path = profile_path(config['PROFILER_DIR'], stats.endpoint, session.extension)
+        sessions[id(stats)] = (session, path)
+        g.profile_path = path
+
+    @app.after_request
+    def add_profile_header(response):
+        path = g.get('profile_path')
+        if path is not None:
+            response.headers['X-Profile-File'] = os.path.relpath(path, app.config['PROFILER_DIR'])
+        return response
+
+    def stop_profile(stats):
+        # Runs after the last chunk for streamed responses, so generator work is included
+        entry = sessions.pop(id(stats), None)
+        if entry is None:
+            return
+        session, path = entry
+        session.stop()
+        try:
+            session.dump(path)
+        except OSError:
+            logger.exception('Could not write profile for %s', stats.endpoint)
+
+    on_request_started(app, start_profile)
+    on_request_finished(app, stop_profile)
@@ -0,0 +1,79 @@
+from array import array
+from app.models import Expenses
+from app.money import format_cents
+
+# Columns that listing endpoints can select, keyed by the name used in `fields=`
+EXPENSE_FIELDS = {
+    'id': Expenses.id,
+    'amount': Expenses.amount_cents,
+    'description': Expenses.description,
+    'date': Expenses.date,
+    'user_id': Expenses.user_id,
+    'category_id': Expenses.category_id,
+}
+
+EXPORT_FIELDS = {
+    'description': Expenses.description,
+    'date': Expenses.date,
+    'amount': Expenses.amount_cents,
+    'category': Expenses.category_id,  # Exports map the id to a name through the category catalog
+}
+
+def format_date(value):
+    return value.strftime('%Y-%m-%d')
+
+FORMATTERS = {
+    'date': format_date,
+    'amount': format_cents,  # Integer cents go out as decimal strings, e.g. '12.50'
+}
+
+# Numeric columns are collected into typed arrays for the columnar format (8 bytes per value, no boxing)
+COLUMN_TYPECODES = {
+    'id': 'q',
+    'user_id': 'q',
+    'category_id': 'q',
+}
+
+def parse_fields(raw, allowed, default):
+    # `fields=id,amount` -> ['id', 'amount']; an absent or empty parameter means the default set
+    if not raw:
+        return list(default)
+
+    names = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    if not names:
+        return list(default)
+
+    return list(dict.fromkeys(names))  # Drop duplicates, keep the requested order
+
+def columns_for(names, allowed):
+    return [allowed[name] for name in names]
+
+def row_serializer(names):
+    # Build the per-row function once so the hot loop is just a zip over plain tuples
+    formatters = [FORMATTERS.get(name) for name in names]
+
+    def serialize(row):
+        return {
+            name: (formatter(value) if formatter and value is not None else value)
+            for name, formatter, value in zip(names, formatters, row)
+        }
+
+    return serialize
+
+def columnar(rows, names):
+    # {'id': [...], 'amount': [...]} instead of one dict per row, so key names are sent once
+    buffers = [array(COLUMN_TYPECODES[name]) if name in COLUMN_TYPECODES else [] for name in names]
+    appends = [buffer.append for buffer in buffers]
+    formatters = [FORMATTERS.get(name) for name in names]
+
+    for row in rows:
+        for append, formatter, value in zip(appends, formatters, row):
+            append(formatter(value) if formatter else value)
+
+    return {
+        name: buffer.tolist() if isinstance(buffer, array) else buffer
+        for name, buffer in zip(names, buffers)
+    }
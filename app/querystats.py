@@ -0,0 +1,41 @@
+import logging
+from flask import g
+from app.instrumentation import on_request_finished
+
+logger = logging.getLogger(__name__)
+
+def repeated_shapes(stats, threshold):
+    # The same statement shape run many times in one request is almost always a lazy load in a loop
+    return sorted(
+        ((shape, count) for shape, count in stats.statement_shapes.items() if count >= threshold),
+        key=lambda item: item[1],
+        reverse=True
+    )
+
+def init_app(app):
+    @app.after_request
+    def add_sql_headers(response):
+        stats = g.get('request_stats')
+        if stats is None or not app.config['SQL_STATS_HEADERS']:
+            return response
+
+        # Streamed bodies keep querying after this point, so their headers only cover the view itself
+        response.headers['X-SQL-Statements'] = str(stats.statement_count)
+        response.headers['X-SQL-Time-Ms'] = f'{stats.db_seconds * 1000:.2f}'
+        repeated = repeated_shapes(stats, app.config['SQL_STATS_REPEAT_THRESHOLD'])
+        if repeated:
+            response.headers['X-SQL-Probable-N-Plus-One'] = str(len(repeated))
+        return response
+
+    def check_thresholds(stats):
+        config = app.config
+        if stats.statement_count > config['SQL_STATS_MAX_STATEMENTS'] or \
+                stats.db_seconds * 1000 > config['SQL_STATS_MAX_DB_MS']:
+            logger.warning('%s %s ran %d SQL statements in %.1f ms',
+                           stats.method, stats.endpoint, stats.statement_count, stats.db_seconds * 1000)
+
+        for shape, count in repeated_shapes(stats, config['SQL_STATS_REPEAT_THRESHOLD']):
+            logger.warning('Probable N+1 in %s %s: statement ran %d times: %s',
+                           stats.method, stats.endpoint, count, shape)
+
+    on_request_finished(app, check_thresholds)
@@ -0,0 +1,358 @@
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import Response, current_app, g, has_app_context, request
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from app.models import Category, Expenses, Notification, User
+from app.serializers import negotiate
+
+# Changes to these tables invalidate every cached response that read them; the others are per user
+SHARED_TABLES = ('category',)
+
+def change_tags(obj):
+    # Tags of the cached responses a flushed object can affect
+    table = obj.__table__.name
+    if isinstance(obj, Category):
+        return {table}
+    if isinstance(obj, User):
+        return {f'{table}:{obj.id}'}
+
+    # A row that moved to another user changes the old owner's responses as well
+    owners = {obj.user_id, *inspect(obj).attrs.user_id.history.deleted}
+    return {f'{table}:{user_id}' for user_id in owners}
+
+def note_changes(session, tags):
+    # Also called directly by bulk statements, which never reach the flush events
+    session.info.setdefault('result_cache_tags', set()).update(tags)
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (Expenses, Notification, User, Category)):
+            note_changes(session, change_tags(obj))
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate(session):
+    # Bumped only once the rows are committed: a reader that fetched the old rows before this point
+    # computed its key from the old generations, so what it stores is never served again
+    if session.info.get('defer_commit_hooks'):
+        return  # Replayed once the enclosing transaction really commits (see batch.py)
+    tags = session.info.pop('result_cache_tags', None)
+    if tags and has_app_context():
+        cache = current_app.extensions.get('result_cache')
+        if cache is not None:
+            cache.invalidate(tags)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('result_cache_tags', None)
+
+class MemoryBackend:
+    """LRU of entries with a TTL, private to one process."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, expires), least recently used first
+        self._generations = {}
+
+    def after_fork(self):
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._entries[key]
+                self.evictions += 1
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def generations(self, tags):
+        return [self._generations.get(tag, 0) for tag in tags]
+
+    def bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+class SQLiteBackend:
+    """Entries and generations in a SQLite file shared by every worker process on the host.
+
+    The file outlives the process, so it records the database it was filled
+    from; opened for another database, it starts over rather than keep
+    generations and entries that describe different rows.
+    """
+
+    PRUNE_EVERY = 100  # Writes between sweeps for expired and excess entries
+
+    def __init__(self, path, max_entries, database=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._local = threading.local()
+        self._writes = 0
+        if database is not None:
+            self._bind(database)
+
+    def after_fork(self):
+        # A sqlite3 connection must not be used across a fork
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS entries '
+                               '(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_entries_expires ON entries (expires)')
+            connection.execute('CREATE TABLE IF NOT EXISTS generations '
+                               '(tag TEXT PRIMARY KEY, generation INTEGER NOT NULL)')
+            connection.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)')
+            self._local.connection = connection
+        return connection
+
+    def _bind(self, database):
+        # Hashed, since the URI can hold a password
+        database = hashlib.sha256(database.encode()).hexdigest()
+        connection = self._connection()
+        # IMMEDIATE so that workers starting together agree on one reset
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute("SELECT value FROM meta WHERE name = 'database'").fetchone()
+            if row is None or row[0] != database:
+                connection.execute('DELETE FROM entries')
+                connection.execute('DELETE FROM generations')
+                connection.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('database', ?)", (database,))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def get(self, key):
+        row = self._connection().execute(
+            'SELECT value, expires FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] <= time.time():  # Wall clock, since entries outlive the process that wrote them
+            self._connection().execute('DELETE FROM entries WHERE key = ?', (key,))
+            self.evictions += 1
+            return None
+        return pickle.loads(row[0])
+
+    def set(self, key, value, ttl):
+        connection = self._connection()
+        connection.execute('INSERT OR REPLACE INTO entries (key, value, expires) VALUES (?, ?, ?)',
+                           (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), time.time() + ttl))
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self.prune()
+
+    def prune(self):
+        connection = self._connection()
+        evicted = connection.execute('DELETE FROM entries WHERE expires <= ?', (time.time(),)).rowcount
+        # Over the limit: drop the entries closest to expiry, which are also the oldest
+        evicted += connection.execute(
+            'DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY expires DESC LIMIT -1 OFFSET ?)',
+            (self.max_entries,)).rowcount
+        self.evictions += evicted
+
+    def generations(self, tags):
+        placeholders = ', '.join('?' * len(tags))
+        rows = dict(self._connection().execute(
+            f'SELECT tag, generation FROM generations WHERE tag IN ({placeholders})', tags).fetchall())
+        return [rows.get(tag, 0) for tag in tags]
+
+    def bump(self, tags):
+        self._connection().executemany(
+            'INSERT INTO generations (tag, generation) VALUES (?, 1) '
+            'ON CONFLICT (tag) DO UPDATE SET generation = generation + 1',
+            [(tag,) for tag in tags])
+
+    def clear(self):
+        self._connection().execute('DELETE FROM entries')
+
+    def reset(self):
+        # Entries and generations; for when the rows behind them were replaced wholesale
+        connection = self._connection()
+        connection.execute('DELETE FROM entries')
+        connection.execute('DELETE FROM generations')
+
+    def __len__(self):
+        return self._connection().execute('SELECT count(*) FROM entries').fetchone()[0]
+
+def cache_path(app):
+    # In the instance folder by default, not in whatever directory the process started in
+    return app.config['RESULT_CACHE_PATH'] or os.path.join(app.instance_path, 'result_cache.db')
+
+def reset_shared_cache(app):
+    """Empty the shared cache file, whichever backend app itself uses.
+
+    Run after migrations: the cached responses and generations describe rows and
+    a schema that may no longer exist, even though the database URI is the same.
+    """
+    path = cache_path(app)
+    if os.path.exists(path):
+        SQLiteBackend(path, app.config['RESULT_CACHE_MAX_ENTRIES']).reset()
+
+def make_backend(app):
+    config = app.config
+    if config['RESULT_CACHE_BACKEND'] == 'sqlite':
+        path = cache_path(app)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        return SQLiteBackend(path, config['RESULT_CACHE_MAX_ENTRIES'], database=config['SQLALCHEMY_DATABASE_URI'])
+    if config['RESULT_CACHE_BACKEND'] == 'memory':
+        return MemoryBackend(config['RESULT_CACHE_MAX_ENTRIES'])
+    raise ValueError(f"Unknown RESULT_CACHE_BACKEND: {config['RESULT_CACHE_BACKEND']}")
+
+class ResultCache:
+    """Buffered responses of read endpoints, reused until the rows they were built from change.
+
+    A key holds the endpoint, the user, the normalized query string, any inputs
+    the view resolves itself (see cached), the response format and the current
+    generation of every table tag the view reads. Commits bump the generations
+    of the tags they touched, so stale entries are simply never looked up again
+    and age out of the backend.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.backend = None
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def init_app(self, app):
+        self.app = app
+        self.backend = make_backend(app)
+        app.extensions['result_cache'] = self
+        app.add_url_rule(app.config['RESULT_CACHE_ADMIN_PATH'], 'result_cache',
+                         self._admin_view(), methods=['GET', 'DELETE'])
+
+    def after_fork(self):
+        self.backend.after_fork()
+
+    def _admin_view(self):
+        from app.admin import admin_required
+        from app.serializers import respond
+
+        @admin_required
+        def stats():
+            if request.method == 'DELETE':
+                self.backend.clear()
+                return respond({'message': 'Result cache cleared'}, 200)
+            return respond(self.stats(), 200)
+
+        return stats
+
+    def stats(self):
+        return {
+            'backend': self.app.config['RESULT_CACHE_BACKEND'],
+            'entries': len(self.backend),
+            'hits': self.hits,
+            'misses': self.misses,
+            'stores': self.stores,
+            'evictions': self.backend.evictions,
+        }
+
+    def key(self, endpoint, user_id, tags, vary=''):
+        arguments = '&'.join(f'{name}={value}' for name, value in sorted(request.args.items(multi=True)))
+        generations = ','.join(map(str, self.backend.generations(tags)))
+        return f'{endpoint}|{user_id}|{arguments}|{vary}|{negotiate()}|{generations}'
+
+    def get(self, key):
+        # Misses are counted by cached(), which only knows once the view has run whether it could be stored
+        value = self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.backend.set(key, value, self.app.config['RESULT_CACHE_TTL'])
+        self.stores += 1
+
+    def invalidate(self, tags):
+        self.backend.bump(sorted(tags))
+
+    def __len__(self):
+        return len(self.backend)
+
+def cached(*tables, user=None, vary=None, when=None):
+    """Serve the view's 200 responses from the result cache.
+
+    tables are the table names the view reads; user returns the id of the user the
+    response belongs to (the JWT identity by default), or None to skip the cache.
+    vary returns a string for any input the view takes from outside the request,
+    such as the current month, so the key changes with it. when returns False for
+    requests the view answers with a streamed response; those skip the cache
+    entirely. Streamed responses are never stored, counted or marked X-Cache.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = current_app.extensions.get('result_cache')
+            if cache is None or g.get('in_batch_transaction'):
+                # Inside an atomic batch the view may read rows that are later rolled back
+                return view(*args, **kwargs)
+            if when is not None and not when():
+                return view(*args, **kwargs)
+
+            if user is None:
+                from flask_jwt_extended import get_jwt_identity
+                user_id = get_jwt_identity()
+            else:
+                user_id = user()
+            if user_id is None:
+                return view(*args, **kwargs)
+
+            tags = [table if table in SHARED_TABLES else f'{table}:{user_id}' for table in tables]
+            key = cache.key(request.endpoint, user_id, tags, vary() if vary is not None else '')
+            entry = cache.get(key)
+            if entry is not None:
+                body, status, mimetype = entry
+                response = Response(body, status=status, mimetype=mimetype)
+                response.headers['X-Cache'] = 'hit'
+                return response
+
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.is_streamed:
+                return response
+            cache.misses += 1
+            if response.status_code == 200:
+                cache.set(key, (response.get_data(), response.status_code, response.mimetype))
+            response.headers['X-Cache'] = 'miss'
+            return response
+        return wrapper
+    return decorator
@@ -1,25 +1,35 @@
-import csv
-from fpdf import FPDF
-from io import StringIO
 import bcrypt
-from flask import Flask, make_response, render_template, request, url_for, redirect, jsonify, Blueprint
+from flask import Flask, current_app, make_response, render_template, request, url_for, redirect, Blueprint
 from sqlalchemy import func
 from sqlalchemy.exc import IntegrityError
 from app.models import Category, Notification, User, Expenses  # Correct model names
 from datetime import date, datetime
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt, create_access_token
 from app.utils import verify_user_credentials
+from app.serializers import get_payload, respond
+from app.streaming import csv_response, stream_rows
+from app.projection import EXPENSE_FIELDS, EXPORT_FIELDS, columnar, columns_for, parse_fields, row_serializer
+from app.search import match_expenses, search_terms
+from app.filters import expense_filters, order_expenses, parse_period
+from app.dashboard import build_dashboard
+from app.batch import run_batch, validate_items
+from app.bulk import ACTIONS as BULK_ACTIONS, delete_expenses, matching, shifted_date, update_expenses
+from app.changes import changes_since
+from app.resultcache import cached
+from app.money import format_cents
 from app import blacklist, db, jwt
 import re
 import logging
 
-# Configure logging to log to a file
-logging.basicConfig(filename='app.log', 
-                    level=logging.ERROR, 
-                    format='%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
+logger = logging.getLogger(__name__)  # Handlers are configured by create_app (see app/logs.py)
 
 main = Blueprint('main', __name__)
 
+# Fields returned by listing endpoints when no `fields=` parameter is given
+SHOW_EXPENSES_DEFAULT_FIELDS = ['id', 'amount', 'description']
+FILTER_EXPENSES_DEFAULT_FIELDS = ['id', 'amount', 'description', 'date', 'user_id', 'category_id']
+EXPORT_DEFAULT_FIELDS = ['description', 'date', 'amount', 'category']
+
 @main.route('/')
 def home(): 
     count_users = User.query.count()
@@ -31,10 +41,10 @@ def home():
     
 @main.route('/register', methods=['POST'])
 def register():
-    data = request.get_json()
+    data = get_payload()
 
     if not data or not data.get('user_name') or not data.get('email') or not data.get('password'):
-        return jsonify({'message': 'Missing required fields'}), 400
+        return respond({'message': 'Missing required fields'}, 400)
 
     user_name = data['user_name']
     email = data['email']
@@ -42,14 +52,14 @@ def register():
 
     email_regex = r'^[a-z0-9]+[\._]?[a-z0-9]+[@]\w+[.]\w+$'
     if not re.match(email_regex, email):
-        return jsonify({'message': 'Invalid email format'}), 400
+        return respond({'message': 'Invalid email format'}, 400)
 
     if len(password) < 6:
-        return jsonify({'message': 'Password too short, must be at least 6 characters'}), 400
+        return respond({'message': 'Password too short, must be at least 6 characters'}, 400)
 
     existing_user = User.query.filter((User.user_name == user_name) | (User.email == email)).first()
     if existing_user:
-        return jsonify({'message': 'User already exists'}), 400
+        return respond({'message': 'User already exists'}, 400)
 
     # Correct bcrypt usage
     password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
@@ -62,16 +72,16 @@ def register():
     db.session.add(user)
     db.session.commit()
 
-    return jsonify({'message': 'User registered successfully'}), 201
+    return respond({'message': 'User registered successfully'}, 201)
 
 # login route
 @main.route('/login', methods=['POST'])
 def login():
-    data = request.get_json()
+    data = get_payload()
 
     # Validate input data
     if not data or not data.get('email') or not data.get('password'):
-        return jsonify({'message': 'Missing required fields'}), 400
+        return respond({'message': 'Missing required fields'}, 400)
 
     email = data['email']
     password = data['password']
@@ -79,13 +89,13 @@ def login():
     # Verify user credentials
     user = verify_user_credentials(email, password)
     if user is None:
-        return jsonify({'message': 'Invalid credentials'}), 401
+        return respond({'message': 'Invalid credentials'}, 401)
 
     # Create access token
     access_token = create_access_token(identity=user.id)
 
     # Return the access token
-    return jsonify({'access_token': access_token}), 200
+    return respond({'access_token': access_token}, 200)
 
 # logout route 
 @main.route('/logout', methods=['POST'])
@@ -98,27 +108,27 @@ def logout():
     blacklist.add(jti)
     
     # Return a success message indicating logout
-    return jsonify({'message': 'Successfully logged out'}), 200
+    return respond({'message': 'Successfully logged out'}, 200)
 
 # protected
 @main.route('/protected', methods=['GET'])
 @jwt_required()  # Ensures that only users with a valid JWT can access this route
 def protected():
     current_user = get_jwt_identity()  # Retrieves the identity of the logged-in user from the JWT
-    return jsonify({'message': f'Welcome, user {current_user}'}), 200
+    return respond({'message': f'Welcome, user {current_user}'}, 200)
 
 # Add user
 @main.route('/add_user', methods=['POST'])
 def adding_new_users():
-    data = request.get_json()
+    data = get_payload()
 
     if not data or not data.get('Name') or not data.get('Email_address'):
-        return jsonify({'message': 'Missing required fields'}), 400
+        return respond({'message': 'Missing required fields'}, 400)
 
     # Basic email validation
     email_regex = r'^[a-z0-9]+[\._]?[a-z0-9]+[@]\w+[.]\w+$'
     if not re.match(email_regex, data.get('Email_address')):
-        return jsonify({'message': 'Invalid email format'}), 400
+        return respond({'message': 'Invalid email format'}, 400)
 
     try:
         # Create a new user with the provided data
@@ -129,7 +139,7 @@ def adding_new_users():
         db.session.add(new_user)
         db.session.commit()
 
-        return jsonify({'message': 'User added successfully'}), 201
+        return respond({'message': 'User added successfully'}, 201)
 
     except IntegrityError as e:
         db.session.rollback()  # Rollback the transaction to avoid inconsistent state
@@ -139,21 +149,21 @@ def adding_new_users():
 
         # Check for unique constraint violations
         if "UNIQUE constraint failed: user.email" in str(e.orig):
-            return jsonify({'message': 'This email is already in use, please use a different email'}), 400
+            return respond({'message': 'This email is already in use, please use a different email'}, 400)
         elif "UNIQUE constraint failed: user.user_name" in str(e.orig):
-            return jsonify({'message': 'This name is already in use, please use a different name'}), 400
+            return respond({'message': 'This name is already in use, please use a different name'}, 400)
 
     except Exception as e:
         # General exception handling if something else goes wrong
-        return jsonify({'message': 'An unexpected error occurred'}), 500
+        return respond({'message': 'An unexpected error occurred'}, 500)
 
 # adding expense 
 @main.route('/add_expense', methods=['POST'])
 def adding_new_expenses():
-    data = request.get_json()  # Expect JSON payload in the request body
+    data = get_payload()  # Expect JSON or MessagePack payload in the request body
 
     if not data or 'user_name' not in data:
-        return jsonify({'message': 'User not specified'}), 400
+        return respond({'message': 'User not specified'}, 400)
 
     # Extracting required fields from the JSON payload
     user_name = data.get('user_name')
@@ -164,7 +174,17 @@ def adding_new_expenses():
 
     # Validate the incoming data (basic validation)
     if amount is None or description is None or date is None or category_id is None:
-        return jsonify({'message': 'Missing required fields'}), 400
+        return respond({'message': 'Missing required fields'}, 400)
+
+    if isinstance(category_id, str) and not category_id.isdigit():
+        # Imports may name the category; resolve it from the cached catalog instead of a query per row
+        category_id = current_app.extensions['category_catalog'].id_for(category_id)
+        if category_id is None:
+            return respond({'message': 'Unknown category'}, 400)
+
+    user_id = current_app.extensions['user_ids'].resolve(user_name)
+    if user_id is None:
+        return respond({'message': f'User {user_name} not found'}, 404)
 
     try:
         # Convert the date to the appropriate format if needed
@@ -175,62 +195,72 @@ def adding_new_expenses():
             amount=amount,
             description=description,
             date=date_purchase,
-            user_id=User.query.filter_by(user_name=user_name).first().id,
+            user_id=user_id,
             category_id=category_id
         )
         db.session.add(new_expense)
         db.session.commit()
 
-        return jsonify({'message': 'Expense added successfully'}), 201
+        return respond({'message': 'Expense added successfully'}, 201)
     except Exception as e:
-        return jsonify({'message': str(e)}), 400
+        return respond({'message': str(e)}, 400)
 
 # show expenses
 @main.route('/expenses', methods=['GET'])
+@cached('expenses', user=lambda: current_app.extensions['user_ids'].resolve(request.args.get('user', '')))
 def show_expenses():
     user_name = request.args.get("user")  # Using query parameters to get the username
     if user_name is None:
-        return jsonify({'message': 'User not specified'}), 400
+        return respond({'message': 'User not specified'}, 400)
 
-    # Query the user's expenses
-    expenses_user = db.session.query(Expenses).join(User).filter(User.user_name == user_name).all()
-    
-    if not expenses_user:
-        return jsonify({'message': f'No expenses found for user {user_name}'}), 404
+    try:
+        fields = parse_fields(request.args.get('fields'), EXPENSE_FIELDS, SHOW_EXPENSES_DEFAULT_FIELDS)
+    except ValueError as e:
+        return respond({'message': str(e)}, 400)
 
-    # Calculate the total amount of expenses
-    total_amount = sum(expense.amount for expense in expenses_user)
+    # Select only the requested columns instead of full ORM objects; the total rides along on every row
+    # as a window sum over the integer cents, so it is computed in SQL within the same statement
+    columns = columns_for(fields, EXPENSE_FIELDS) + [func.sum(Expenses.amount_cents).over()]
+    # The id comes from the user_name cache, so the listing reads expenses alone without joining user
+    user_id = current_app.extensions['user_ids'].resolve(user_name)
+    rows = db.session.query(*columns).filter(Expenses.user_id == user_id).all() if user_id is not None else []
+
+    if not rows:
+        return respond({'message': f'No expenses found for user {user_name}'}, 404)
+
+    total_cents = rows[0][-1]
 
     # Prepare the response
-    expenses_data = [{'id': expense.id, 'amount': expense.amount, 'description': expense.description} for expense in expenses_user]
+    serialize = row_serializer(fields)
+    expenses_data = [serialize(row) for row in rows]
 
-    return jsonify({
+    return respond({
         'user': user_name,
-        'total': round(total_amount, 2),
+        'total': format_cents(total_cents),
         'expenses': expenses_data
-    }), 200
+    }, 200)
 
 #modifiying expense
 @main.route('/mod_expense', methods=['POST'])
 def modifying_expenses():
-    data = request.get_json()  # Expect JSON payload in the request body
+    data = get_payload()  # Expect JSON or MessagePack payload in the request body
 
     name_user = data.get("user")
     expense_id = data.get("id")
 
     if name_user is None or expense_id is None:
-        return jsonify({'message': 'User or expense ID not specified'}), 400
+        return respond({'message': 'User or expense ID not specified'}, 400)
 
     # Fetch the expense by ID
     query = db.session.query(Expenses).filter(Expenses.id == expense_id).first()
     if not query:
-        return jsonify({'message': 'Expense not found'}), 404
+        return respond({'message': 'Expense not found'}, 404)
 
     if 'Delete' in data:
         # Handle deletion of the expense
         db.session.delete(query)
         db.session.commit()
-        return jsonify({'message': 'Expense deleted successfully'}), 200
+        return respond({'message': 'Expense deleted successfully'}, 200)
 
     # Updating expense details based on the existing fields
     try:
@@ -240,68 +270,203 @@ def modifying_expenses():
         query.category_id = data.get('Category', query.category_id)  # Update category if provided
 
         db.session.commit()
-        return jsonify({'message': 'Expense updated successfully'}), 200
+        return respond({'message': 'Expense updated successfully'}, 200)
     except Exception as e:
-        return jsonify({'message': str(e)}), 400
+        return respond({'message': str(e)}, 400)
 
 # Filtering expenses
 @main.route('/filter_expenses', methods=['GET'])
 @jwt_required()
+@cached('expenses', when=lambda: request.args.get('format') == 'columnar')  # Rows are streamed, never cached
 def filter_expenses():
     user_id = get_jwt_identity()  # Assuming JWT contains the user ID
 
     # Retrieve query parameters
-    min_amount = request.args.get('min_amount', type=float)
-    max_amount = request.args.get('max_amount', type=float)
-    start_date_str = request.args.get('start_date')
-    end_date_str = request.args.get('end_date')
     sort_by = request.args.get('sort_by', 'date')  # Default sort field
     order = request.args.get('order', 'asc')
+    output_format = request.args.get('format', 'rows')
+
+    if output_format not in ('rows', 'columnar'):
+        return respond({'message': 'Format must be rows or columnar'}, 400)
+
+    try:
+        fields = parse_fields(request.args.get('fields'), EXPENSE_FIELDS, FILTER_EXPENSES_DEFAULT_FIELDS)
+    except ValueError as e:
+        return respond({'message': str(e)}, 400)
 
-    # Convert date strings to datetime objects
-    start_date = datetime.strptime(start_date_str, '%Y-%m-%d') if start_date_str else None
-    end_date = datetime.strptime(end_date_str, '%Y-%m-%d') if end_date_str else None
+    try:
+        # Build a column-only query so rows come back as plain tuples rather than ORM instances
+        query = db.session.query(*columns_for(fields, EXPENSE_FIELDS)) \
+            .filter(Expenses.user_id == user_id, *expense_filters(request.args, sort_by))
+        query = order_expenses(query, sort_by, order)
+    except ValueError as e:
+        return respond({'message': str(e)}, 400)
 
-    # Build the query
-    query = Expenses.query.filter_by(user_id=user_id)
+    # Stream rows as they are fetched instead of building the whole result in memory
+    query = query.yield_per(current_app.config['STREAM_YIELD_PER'])
 
-    if min_amount is not None:
-        query = query.filter(Expenses.amount >= min_amount)
+    if output_format == 'columnar':
+        return respond(columnar(query, fields), 200)
 
-    if max_amount is not None:
-        query = query.filter(Expenses.amount <= max_amount)
+    serialize = row_serializer(fields)
+    return stream_rows(serialize(row) for row in query)
 
-    if start_date:
-        query = query.filter(Expenses.date >= start_date)
+# Searching expense descriptions
+@main.route('/expenses/search', methods=['GET'])
+@jwt_required()
+def search_expenses():
+    user_id = get_jwt_identity()
+    text = request.args.get('q', '')
+    terms = search_terms(text)
+    if not terms:
+        return respond({'message': 'Search text (q) is required'}, 400)
+
+    config = current_app.config
+    limit = request.args.get('limit', config['SEARCH_DEFAULT_LIMIT'], type=int)
+    offset = request.args.get('offset', 0, type=int)
+    if limit < 1 or offset < 0:
+        return respond({'message': 'limit must be positive and offset not negative'}, 400)
+    limit = min(limit, config['SEARCH_MAX_LIMIT'])
 
-    if end_date:
-        query = query.filter(Expenses.date <= end_date)
+    try:
+        fields = parse_fields(request.args.get('fields'), EXPENSE_FIELDS, FILTER_EXPENSES_DEFAULT_FIELDS)
+    except ValueError as e:
+        return respond({'message': str(e)}, 400)
 
-    if order == 'asc':
-        query = query.order_by(getattr(Expenses, sort_by).asc())
+    try:
+        criteria = expense_filters(request.args)
+    except ValueError as e:
+        return respond({'message': str(e)}, 400)
+
+    query = db.session.query(*columns_for(fields, EXPENSE_FIELDS)).select_from(Expenses) \
+        .filter(Expenses.user_id == user_id, *criteria)
+    query = match_expenses(query, terms, db.engine.dialect.name)
+    rows = query.limit(limit).offset(offset).all()
+
+    serialize = row_serializer(fields)
+    return respond({
+        'query': text,
+        'limit': limit,
+        'offset': offset,
+        'expenses': [serialize(row) for row in rows]
+    }, 200)
+
+# Recategorizing, moving or deleting many of the caller's expenses at once
+@main.route('/expenses/bulk', methods=['POST'])
+@jwt_required()
+def bulk_expenses():
+    user_id = get_jwt_identity()
+    data = get_payload()
+    if not isinstance(data, dict) or data.get('action') not in BULK_ACTIONS:
+        return respond({'message': f"action must be one of: {', '.join(BULK_ACTIONS)}"}, 400)
+    action = data['action']
+
+    ids = data.get('ids')
+    if ids is not None:
+        if not isinstance(ids, list) or not all(type(expense_id) is int for expense_id in ids):
+            return respond({'message': 'ids must be a list of integers'}, 400)
+        if len(ids) > current_app.config['BULK_MAX_IDS']:
+            return respond({'message': f"At most {current_app.config['BULK_MAX_IDS']} ids are accepted"}, 400)
+
+    # The rows are chosen with the /filter_expenses query parameters, the ids, or both
+    try:
+        criteria = expense_filters(request.args)
+    except ValueError as e:
+        return respond({'message': str(e)}, 400)
+    if not criteria and ids is None:
+        return respond({'message': 'Select expenses with filters or ids'}, 400)
+    conditions = matching(user_id, criteria, ids)
+
+    if action == 'delete':
+        affected = delete_expenses(db.session, user_id, conditions)
+    elif action == 'recategorize':
+        # An id or a name, as /add_expense takes it
+        category = data.get('Category')
+        catalog = current_app.extensions['category_catalog']
+        if isinstance(category, str):
+            category_id = int(category) if category.isdigit() else catalog.id_for(category)
+        else:
+            category_id = category if type(category) is int else None
+        if category_id is None or catalog.name_for(category_id) is None:
+            return respond({'message': 'Unknown category'}, 400)
+        affected = update_expenses(db.session, user_id, conditions, {'category_id': category_id})
     else:
-        query = query.order_by(getattr(Expenses, sort_by).desc())
+        days = data.get('days')
+        if type(days) is not int or days == 0:
+            return respond({'message': 'days must be a non-zero integer'}, 400)
+        affected = update_expenses(db.session, user_id, conditions,
+                                   {'date': shifted_date(days, db.engine.dialect.name)})
+
+    db.session.commit()
+    return respond({'action': action, 'affected': affected}, 200)
 
-    expenses = query.all()
+# Incremental sync
+@main.route('/changes', methods=['GET'])
+@jwt_required()
+def list_changes():
+    user_id = get_jwt_identity()
+
+    config = current_app.config
+    since = request.args.get('since', 0, type=int)
+    limit = request.args.get('limit', config['CHANGES_DEFAULT_LIMIT'], type=int)
+    if since < 0 or limit < 1:
+        return respond({'message': 'since must not be negative and limit must be positive'}, 400)
+    limit = min(limit, config['CHANGES_MAX_LIMIT'])
+
+    changes, cursor, has_more = changes_since(db.session, user_id, since, limit)
+    return respond({'changes': changes, 'cursor': cursor, 'has_more': has_more}, 200)
+
+# Several requests in one round trip
+@main.route('/batch', methods=['POST'])
+@jwt_required()
+def batch():
+    data = get_payload()
+    if not isinstance(data, dict):
+        return respond({'message': 'Missing required fields'}, 400)
+
+    items = data.get('requests')
+    try:
+        validate_items(items, current_app.config['BATCH_MAX_REQUESTS'])
+    except ValueError as e:
+        return respond({'message': str(e)}, 400)
+
+    results, committed = run_batch(items, atomic=bool(data.get('atomic')))
+    return respond({'committed': committed, 'responses': results}, 200)
+
+def dashboard_month():
+    # Defaults to the current month, which the result cache key has to include as well
+    return request.args.get('month') or datetime.utcnow().strftime('%Y-%m')
 
-    # Serialize the data
-    result = []
-    for expense in expenses:
-        expense_data = {
-            'id': expense.id,  # Using the primary key
-            'amount': expense.amount,
-            'description': expense.description,  # Match the model
-            'date': expense.date.strftime('%Y-%m-%d'),  # Correctly formatting date
-            'user_id': expense.user_id,  # Use user_id from the model
-            'category_id': expense.category_id  # Use category_id from the model
-        }
-        result.append(expense_data)
+# Home screen in one request
+@main.route('/dashboard', methods=['GET'])
+@jwt_required()
+@cached('user', 'notification', 'expenses', 'category', vary=dashboard_month)
+def dashboard():
+    user_id = get_jwt_identity()
+
+    config = current_app.config
+    limit = request.args.get('limit', config['DASHBOARD_DEFAULT_LIMIT'], type=int)
+    if limit < 1:
+        return respond({'message': 'limit must be positive'}, 400)
+    limit = min(limit, config['DASHBOARD_MAX_LIMIT'])
+
+    month = dashboard_month()
+    try:
+        datetime.strptime(month, '%Y-%m')
+        month_start, month_end = parse_period(month)
+    except ValueError:
+        return respond({'message': 'month must use the YYYY-MM format'}, 400)
 
-    return jsonify(result), 200
+    payload = build_dashboard(db.session, user_id, month_start, month_end, limit,
+                              current_app.extensions['category_catalog'].names())
+    if payload is None:
+        return respond({'error': 'User not found'}, 404)
+    return respond(payload, 200)
 
 # Viewing profile
 @main.route('/profile', methods=['GET'])
 @jwt_required()
+@cached('user')
 def view_profile():
     try:
         # Get the current user's ID from the JWT token
@@ -312,20 +477,20 @@ def view_profile():
 
         # Check if the user exists
         if not user:
-            logging.error(f"User with ID {user_id} not found")
-            return jsonify({'error': 'User not found'}), 404
+            logger.error(f"User with ID {user_id} not found")
+            return respond({'error': 'User not found'}, 404)
 
         # Return the user profile details
-        return jsonify({
+        return respond({
             'user_name': user.user_name,
             'email': user.email,
             'created_at': user.created_at.isoformat()
-        }), 200
+        }, 200)
 
     except Exception as e:
         # Log the error for debugging with the exception details
-        logging.error(f"Error in view_profile: {e}", exc_info=True)
-        return jsonify({'error': 'An unexpected error occurred'}), 500
+        logger.error(f"Error in view_profile: {e}", exc_info=True)
+        return respond({'error': 'An unexpected error occurred'}, 500)
 
 # Editing profile 
 @main.route('/profile', methods=['PUT'])
@@ -338,66 +503,69 @@ def edit_profile():
         # Retrieve the user from the database
         user = User.query.get(user_id)
         if not user:
-            return jsonify({'error': 'User not found'}), 404
+            return respond({'error': 'User not found'}, 404)
 
         # Get the data from the request
-        data = request.get_json()
+        data = get_payload()
         user_name = data.get('user_name')
         email = data.get('email')
 
         # Validate the input data
         if not user_name or not email:
-            return jsonify({'error': 'Username and email are required'}), 400
+            return respond({'error': 'Username and email are required'}, 400)
 
         # Validate the email format
         email_regex = r'^[a-z0-9]+[\._]?[a-z0-9]+[@]\w+[.]\w+$'
         if not re.match(email_regex, email):
-            return jsonify({'error': 'Invalid email format'}), 400
+            return respond({'error': 'Invalid email format'}, 400)
 
         # Check if the new username or email already exists
         existing_user = User.query.filter(
             (User.user_name == user_name) | (User.email == email)).first()
         if existing_user and existing_user.id != user_id:
-            return jsonify({'error': 'Username or email already in use'}), 400
+            return respond({'error': 'Username or email already in use'}, 400)
 
         # Update the user profile
+        old_user_name = user.user_name
         user.user_name = user_name
         user.email = email
 
         # Commit the changes to the database
         db.session.commit()
+        current_app.extensions['user_ids'].forget(old_user_name)
 
-        return jsonify({'message': 'Profile updated successfully'}), 200
+        return respond({'message': 'Profile updated successfully'}, 200)
 
     except Exception as e:
         # Rollback only if it's a database-related error
         db.session.rollback()
         
         # Log the error for production debugging
-        logging.error(f"Error in edit_profile: {e}")
+        logger.error(f"Error in edit_profile: {e}")
 
-        return jsonify({'error': 'An unexpected error occurred'}), 500
+        return respond({'error': 'An unexpected error occurred'}, 500)
 
 # getting notification 
 @main.route('/notifications', methods=['GET'])
 @jwt_required()
+@cached('notification')
 def get_notifications():
     try:
         # Get the current user's ID from the JWT token
         user_id = get_jwt_identity()
         if not user_id:
-            logging.warning('JWT token did not provide a valid user ID.')
-            return jsonify({'error': 'Invalid token'}), 401
+            logger.warning('JWT token did not provide a valid user ID.')
+            return respond({'error': 'Invalid token'}, 401)
 
         # Query for the user's notifications
         notifications = Notification.query.filter_by(user_id=user_id).order_by(Notification.created_at.desc()).all()
 
         # Log if no notifications found
         if not notifications:
-            logging.info(f'No notifications found for user ID {user_id}')
+            logger.info(f'No notifications found for user ID {user_id}')
 
         # Prepare the response
-        return jsonify([
+        return respond([
             {
                 'id': notification.id,
                 'message': notification.message,
@@ -405,12 +573,12 @@ def get_notifications():
                 'created_at': notification.created_at.strftime('%Y-%m-%d %H:%M:%S'),
                 'is_read': notification.is_read
             } for notification in notifications
-        ]), 200
+        ], 200)
 
     except Exception as e:
         # Log the exception for debugging
-        logging.error(f"Error fetching notifications for user ID {user_id}: {e}", exc_info=True)
-        return jsonify({'error': 'An unexpected error occurred'}), 500
+        logger.error(f"Error fetching notifications for user ID {user_id}: {e}", exc_info=True)
+        return respond({'error': 'An unexpected error occurred'}, 500)
 
 # mark read for notification 
 @main.route('/notifications/<int:id>/read', methods=['PATCH'])
@@ -424,26 +592,26 @@ def mark_notification_as_read(id):
         notification = Notification.query.filter_by(id=id, user_id=user_id).first()
 
         if not notification:
-            return jsonify({'error': 'Notification not found'}), 404
+            return respond({'error': 'Notification not found'}, 404)
 
         # Check if the notification is already marked as read
         if notification.is_read:
-            return jsonify({'message': 'Notification is already marked as read'}), 200
+            return respond({'message': 'Notification is already marked as read'}, 200)
 
         # Mark the notification as read
         notification.is_read = True
         db.session.commit()  # Ensure the session is active when committing changes
 
-        return jsonify({'message': 'Notification marked as read'}), 200
+        return respond({'message': 'Notification marked as read'}, 200)
 
     except Exception as e:
         # Rollback in case of an exception during the database commit
         db.session.rollback()
 
         # Log the error for further investigation
-        logging.error(f"Error marking notification as read: {e}", exc_info=True)
+        logger.error(f"Error marking notification as read: {e}", exc_info=True)
 
-        return jsonify({'error': 'An unexpected error occurred'}), 500
+        return respond({'error': 'An unexpected error occurred'}, 500)
 
 
 @main.route('/notifications/<int:id>', methods=['DELETE'])
@@ -453,7 +621,7 @@ def delete_notification(id):
     notification = Notification.query.filter_by(id=id, user_id=user_id).first()
 
     if not notification:
-        return jsonify({'error': 'Notification not found'}), 404
+        return respond({'error': 'Notification not found'}, 404)
 
     # Explicitly merge the object into the current session if it's detached
     notification = db.session.merge(notification)
@@ -461,42 +629,80 @@ def delete_notification(id):
     db.session.delete(notification)
     db.session.commit()
 
-    return jsonify({'message': 'Notification deleted successfully'}), 200
+    return respond({'message': 'Notification deleted successfully'}, 200)
+
+@main.route('/categories', methods=['GET'])
+def list_categories():
+    etag, categories = current_app.extensions['category_catalog'].snapshot()
+    response = make_response(respond({'categories': categories}))
+
+    # The tag only changes with the catalog, so clients revalidate and usually get a bodiless 304;
+    # it is weak because JSON, MessagePack and compressed bodies all carry the same content
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept')
+    return response.make_conditional(request)
 
 @main.route('/export/csv', methods=['GET'])
 @jwt_required()
 def export_expenses_csv():
     try:
         user_id = get_jwt_identity()
-        expenses = Expenses.query.filter_by(user_id=user_id).all()
-
-        si = StringIO()
-        csv_writer = csv.writer(si)
-        csv_writer.writerow(['Description', 'Date', 'Amount', 'Category'])
 
-        for expense in expenses:
-            csv_writer.writerow([
-                expense.description,
-                expense.date.strftime('%Y-%m-%d'),
-                expense.amount,
-                expense.category.name  # Assuming Category has a name field
-            ])
-
-        output = make_response(si.getvalue())
+        try:
+            fields = parse_fields(request.args.get('fields'), EXPORT_FIELDS, EXPORT_DEFAULT_FIELDS)
+        except ValueError as e:
+            return respond({'message': str(e)}, 400)
+
+        # Category names come from the cached catalog, so the select needs no join
+        query = db.session.query(*columns_for(fields, EXPORT_FIELDS)) \
+            .filter(Expenses.user_id == user_id) \
+            .yield_per(current_app.config['STREAM_YIELD_PER'])
+
+        date_index = fields.index('date') if 'date' in fields else None
+        amount_index = fields.index('amount') if 'amount' in fields else None
+        category_index = fields.index('category') if 'category' in fields else None
+        category_names = current_app.extensions['category_catalog'].names()
+
+        # Run the query before the response starts, so a database error still gets the JSON 500 below
+        rows = iter(query)
+
+        def csv_rows():
+            try:
+                for row in rows:
+                    if date_index is not None or amount_index is not None or category_index is not None:
+                        row = list(row)
+                    if date_index is not None:
+                        row[date_index] = row[date_index].strftime('%Y-%m-%d')
+                    if amount_index is not None:
+                        row[amount_index] = format_cents(row[amount_index])
+                    if category_index is not None:
+                        row[category_index] = category_names.get(row[category_index])
+                    yield row
+            except Exception:
+                # The 200 status and headers are already sent, so log the failure and end the file here
+                logger.exception('CSV export for user %s stopped early', user_id)
+
+        # Stream the file in chunks so large exports are never held in memory
+        output = csv_response([name.capitalize() for name in fields], csv_rows())
         output.headers["Content-Disposition"] = "attachment; filename=expenses.csv"
         output.headers["Content-type"] = "text/csv"
         return output
 
     except Exception as e:
         print(f"Error in export_expenses_csv: {e}")
-        return jsonify({'error': 'An unexpected error occurred'}), 500
+        return respond({'error': 'An unexpected error occurred'}, 500)
 
 @main.route('/export/pdf', methods=['GET'])
 @jwt_required()
 def export_expenses_pdf():
     try:
         user_id = get_jwt_identity()
-        expenses = Expenses.query.filter_by(user_id=user_id).all()
+        rows = db.session.query(*columns_for(EXPORT_DEFAULT_FIELDS, EXPORT_FIELDS)) \
+            .filter(Expenses.user_id == user_id).all()
+        category_names = current_app.extensions['category_catalog'].names()
+
+        from fpdf import FPDF  # Loaded on first export rather than by every worker at startup
 
         pdf = FPDF()
         pdf.add_page()
@@ -512,11 +718,12 @@ def export_expenses_pdf():
         pdf.ln()
 
         # Iterate over expenses and add them to the PDF
-        for expense in expenses:
-            pdf.cell(70, 10, txt=expense.description, border=1)
-            pdf.cell(30, 10, txt=expense.date.strftime('%Y-%m-%d'), border=1)
-            pdf.cell(30, 10, txt=f"{expense.amount:.2f}", border=1)
-            pdf.cell(70, 10, txt=expense.category.name if expense.category else "", border=1)  # Assuming category relationship
+        for description, expense_date, amount, category_id in rows:
+            category_name = category_names.get(category_id)
+            pdf.cell(70, 10, txt=description, border=1)
+            pdf.cell(30, 10, txt=expense_date.strftime('%Y-%m-%d'), border=1)
+            pdf.cell(30, 10, txt=format_cents(amount), border=1)
+            pdf.cell(70, 10, txt=category_name or "", border=1)
             pdf.ln()
 
         # Create a response object for PDF
@@ -527,5 +734,5 @@ def export_expenses_pdf():
 
     except Exception as e:
         print(f"Error in export_expenses_pdf: {e}")
-        return jsonify({'error': 'An unexpected error occurred'}), 500
+        return respond({'error': 'An unexpected error occurred'}, 500)
 
@@ -0,0 +1,29 @@
+def init_app(app):
+    # apscheduler is imported here so apps that never run jobs (tests, one-off commands) skip it
+    from apscheduler.schedulers.background import BackgroundScheduler
+    from app.utils import create_recurring_expenses
+
+    def run_recurring_expenses():
+        # Jobs run on the scheduler's thread, outside any request or app context
+        with app.app_context():
+            create_recurring_expenses()
+
+    scheduler = BackgroundScheduler()
+    scheduler.add_job(func=run_recurring_expenses, trigger="interval", hours=24, id='recurring_expenses')
+    app.extensions['scheduler'] = scheduler
+    if app.config['SCHEDULER_AUTOSTART']:
+        start(app)
+    return scheduler
+
+def start(app):
+    scheduler = app.extensions.get('scheduler')
+    if scheduler is None or scheduler.running:
+        return
+    scheduler.start()
+    app.logger.info("Scheduler started.")
+
+def shutdown(app, wait=True):
+    # wait=True lets a job that is already running finish before the process exits
+    scheduler = app.extensions.get('scheduler')
+    if scheduler is not None and scheduler.running:
+        scheduler.shutdown(wait=wait)
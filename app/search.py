@@ -0,0 +1,30 @@
+import re
+from sqlalchemy import column, literal_column, table
+from app.filters import escape_like
+from app.models import Expenses
+
+# The FTS5 index created alongside the expenses table (see EXPENSES_FTS_DDL in models.py)
+expenses_fts = table('expenses_fts', column('rowid'), column('rank'))
+
+TERM = re.compile(r'\w+')
+
+def search_terms(text):
+    return TERM.findall(text or '')
+
+def match_expression(terms):
+    # Every term is quoted so user input is never parsed as FTS5 syntax (AND, NEAR, column filters),
+    # and ends in * so "lun caf" finds "lunch at the cafe"
+    return ' '.join(f'"{term}"*' for term in terms)
+
+def match_expenses(query, terms, dialect_name):
+    """Restrict a query over Expenses columns to matching descriptions, best matches first."""
+    if dialect_name == 'sqlite':
+        return query.join(expenses_fts, expenses_fts.c.rowid == Expenses.id) \
+            .filter(literal_column('expenses_fts').op('MATCH')(match_expression(terms))) \
+            .order_by(expenses_fts.c.rank, Expenses.id)
+
+    # Without FTS5, fall back to a substring match on every term, newest first. Terms can hold _, which
+    # LIKE would otherwise read as a wildcard
+    for term in terms:
+        query = query.filter(Expenses.description.ilike(f'%{escape_like(term)}%', escape='\\'))
+    return query.order_by(Expenses.date.desc(), Expenses.id)
@@ -0,0 +1,40 @@
+from datetime import date, datetime
+import msgpack
+from flask import Response, jsonify, request
+from werkzeug.exceptions import BadRequest
+
+JSON_MIMETYPE = 'application/json'
+NDJSON_MIMETYPE = 'application/x-ndjson'
+MSGPACK_MIMETYPE = 'application/msgpack'
+MSGPACK_MIMETYPES = (MSGPACK_MIMETYPE, 'application/x-msgpack')
+
+def negotiate(offered=(JSON_MIMETYPE, MSGPACK_MIMETYPE)):
+    # JSON comes first so '*/*' and missing Accept headers keep getting JSON
+    candidates = list(offered)
+    if MSGPACK_MIMETYPE in candidates:
+        candidates.append('application/x-msgpack')
+    best = request.accept_mimetypes.best_match(candidates) or JSON_MIMETYPE
+    return MSGPACK_MIMETYPE if best in MSGPACK_MIMETYPES else best
+
+def _msgpack_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not MessagePack serializable')
+
+def packb(payload):
+    return msgpack.packb(payload, default=_msgpack_default, use_bin_type=True)
+
+def respond(payload, status=200):
+    # Shared by every route so the wire format is chosen from the Accept header in one place
+    if negotiate() == MSGPACK_MIMETYPE:
+        return Response(packb(payload), status=status, mimetype=MSGPACK_MIMETYPE)
+    return jsonify(payload), status
+
+def get_payload():
+    # Drop-in replacement for request.get_json() that also understands MessagePack bodies
+    if request.mimetype in MSGPACK_MIMETYPES:
+        try:
+            return msgpack.unpackb(request.get_data(), raw=False)
+        except (ValueError, msgpack.UnpackException) as e:
+            raise BadRequest(f'Failed to decode MessagePack object: {e}')
+    return request.get_json()
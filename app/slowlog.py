@@ -0,0 +1,144 @@
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import threading
+from datetime import datetime, timezone
+from sqlalchemy.pool import StaticPool
+from app.instrumentation import current_stats, on_statement, statement_shape
+
+logger = logging.getLogger(__name__)
+
+# Tables large enough that a full scan in a request path is worth flagging
+WATCHED_TABLES = ('expenses', 'notification')
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)\b(?! USING)')
+EXPLAINABLE = ('SELECT', 'UPDATE', 'DELETE', 'WITH')
+
+def parameter_shape(parameters, executemany):
+    # Record types rather than values so the log never contains user data
+    if executemany:
+        rows = list(parameters)
+        return {'rows': len(rows), 'types': parameter_shape(rows[0], False) if rows else []}
+    if isinstance(parameters, dict):
+        return {name: type(value).__name__ for name, value in parameters.items()}
+    return [type(value).__name__ for value in parameters or ()]
+
+def full_scans(plan):
+    scanned = []
+    for detail in plan:
+        match = FULL_SCAN.match(detail)
+        if match and match.group(1) in WATCHED_TABLES:
+            scanned.append(match.group(1))
+    return scanned
+
+class SlowQueryLog:
+    """Statements slower than SLOW_QUERY_THRESHOLD_MS, with their SQLite query plan.
+
+    The request thread only enqueues a record; EXPLAIN QUERY PLAN and the file
+    write happen on a background thread. Plans are cached per statement shape.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.dropped = 0
+        self._queue = None
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._handler = None
+        self._plans = {}
+        self.path = None
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['slow_query_log'] = self
+        # Anchored to the instance folder rather than whatever directory the process started in
+        self.path = app.config['SLOW_QUERY_LOG_FILE'] or os.path.join(app.instance_path, 'slow_queries.log')
+        self._queue = queue.Queue(maxsize=app.config['SLOW_QUERY_QUEUE_SIZE'])
+        on_statement(app, self._statement_executed)
+
+    def after_fork(self):
+        # Start with a fresh queue and lock in a forked worker; its thread is started on first use
+        self._queue = queue.Queue(maxsize=self.app.config['SLOW_QUERY_QUEUE_SIZE'])
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._handler = None
+
+    def _statement_executed(self, conn, statement, parameters, executemany, elapsed):
+        if elapsed * 1000 < self.app.config['SLOW_QUERY_THRESHOLD_MS'] or statement.startswith('EXPLAIN'):
+            return  # Also skips the EXPLAIN statements this log issues itself
+
+        stats = current_stats()
+        record = {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'duration_ms': round(elapsed * 1000, 3),
+            'endpoint': stats.endpoint if stats is not None else None,
+            'statement': statement_shape(statement),
+            'parameters': parameter_shape(parameters, executemany),
+        }
+        try:
+            # Parameters are kept only to run EXPLAIN and are never written out
+            self._queue.put_nowait((record, statement, None if executemany else parameters, conn.engine))
+        except queue.Full:
+            self.dropped += 1
+            return
+        self._ensure_worker()
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            # Threads do not survive a fork, so a forked worker starts its own on first use
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='slow-query-log', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            record, statement, parameters, engine = self._queue.get()
+            try:
+                self._write(self._explain(record, statement, parameters, engine))
+            except Exception:
+                logger.exception('Could not write slow query record')
+            finally:
+                self._queue.task_done()
+
+    def _explain(self, record, statement, parameters, engine):
+        if not self.app.config['SLOW_QUERY_EXPLAIN'] or engine.dialect.name != 'sqlite':
+            return record
+        if not statement.lstrip().upper().startswith(EXPLAINABLE):
+            return record
+        if isinstance(engine.pool, StaticPool):
+            # A single shared connection (in-memory database) must not be used from this thread
+            return record
+
+        shape = record['statement']
+        plan = self._plans.get(shape)
+        if plan is None and parameters is not None:
+            with engine.connect() as connection:
+                rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+            plan = self._plans[shape] = [row[-1] for row in rows]
+
+        if plan is not None:
+            record['plan'] = plan
+            record['full_scan'] = full_scans(plan)
+        return record
+
+    def _write(self, record):
+        if self._handler is None:
+            config = self.app.config
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._handler = logging.handlers.RotatingFileHandler(
+                self.path,
+                maxBytes=config['SLOW_QUERY_LOG_MAX_BYTES'],
+                backupCount=config['SLOW_QUERY_LOG_BACKUP_COUNT'],
+                delay=True
+            )
+        self._handler.emit(logging.makeLogRecord({'msg': json.dumps(record), 'levelno': logging.WARNING}))
+
+    def flush(self):
+        # Block until every queued record has been written; used by tests and on shutdown
+        self._queue.join()
+        if self._handler is not None:
+            self._handler.flush()
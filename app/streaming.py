@@ -0,0 +1,76 @@
+import csv
+from io import StringIO
+from flask import Response, current_app, stream_with_context
+from app.serializers import JSON_MIMETYPE, MSGPACK_MIMETYPE, NDJSON_MIMETYPE, negotiate, packb
+
+def _encoded_chunks(rows, encode, chunk_rows):
+    # Group encoded rows so each write to the socket carries a batch instead of a single row
+    chunk = []
+    for row in rows:
+        chunk.append(encode(row))
+        if len(chunk) >= chunk_rows:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def ndjson_response(rows, status=200):
+    dumps = current_app.json.dumps
+    chunk_rows = current_app.config['STREAM_CHUNK_ROWS']
+
+    def generate():
+        for chunk in _encoded_chunks(rows, dumps, chunk_rows):
+            yield '\n'.join(chunk) + '\n'
+
+    return Response(stream_with_context(generate()), status=status, mimetype=NDJSON_MIMETYPE)
+
+def json_array_response(rows, status=200):
+    dumps = current_app.json.dumps
+    chunk_rows = current_app.config['STREAM_CHUNK_ROWS']
+
+    def generate():
+        yield '['
+        separator = ''
+        for chunk in _encoded_chunks(rows, dumps, chunk_rows):
+            yield separator + ','.join(chunk)
+            separator = ','
+        yield ']'
+
+    return Response(stream_with_context(generate()), status=status, mimetype=JSON_MIMETYPE)
+
+def msgpack_stream_response(rows, status=200):
+    # A MessagePack array header needs the length up front, so rows are sent as a
+    # sequence of concatenated objects (read them with msgpack.Unpacker)
+    chunk_rows = current_app.config['STREAM_CHUNK_ROWS']
+
+    def generate():
+        for chunk in _encoded_chunks(rows, packb, chunk_rows):
+            yield b''.join(chunk)
+
+    return Response(stream_with_context(generate()), status=status, mimetype=MSGPACK_MIMETYPE)
+
+def csv_response(header, rows, status=200):
+    chunk_rows = current_app.config['STREAM_CHUNK_ROWS']
+
+    def generate():
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(header)
+        for count, row in enumerate(rows, 1):
+            writer.writerow(row)
+            if count % chunk_rows == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    return Response(stream_with_context(generate()), status=status, mimetype='text/csv')
+
+def stream_rows(rows, status=200):
+    # Rows must be a lazy iterable (e.g. a query using yield_per) for memory to stay flat
+    mimetype = negotiate((JSON_MIMETYPE, NDJSON_MIMETYPE, MSGPACK_MIMETYPE))
+    if mimetype == NDJSON_MIMETYPE:
+        return ndjson_response(rows, status)
+    if mimetype == MSGPACK_MIMETYPE:
+        return msgpack_stream_response(rows, status)
+    return json_array_response(rows, status)
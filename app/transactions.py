@@ -0,0 +1,12 @@
+def read_snapshot(session):
+    """Make the session's following reads see one snapshot of the database.
+
+    pysqlite only opens a transaction before a write, so consecutive SELECTs would
+    each see the latest commit. The transaction started here ends when the session
+    commits, rolls back or is removed at the end of the request. Other databases
+    read inside the session's transaction at their configured isolation level.
+    """
+    connection = session.connection()
+    if connection.dialect.name == 'sqlite' and not connection.connection.driver_connection.in_transaction:
+        connection.exec_driver_sql('BEGIN')
+    return connection
@@ -0,0 +1,56 @@
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import select
+from app.models import User
+
+class UserIdCache:
+    """Bounded LRU map from user_name to user id for the endpoints that identify users by name.
+
+    Only existing users are cached. Renames in this process call forget(); other
+    processes drop the old name after USER_ID_CACHE_TTL seconds.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # user_name -> (user id, loaded_at), least recently used first
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['user_ids'] = self
+
+    def after_fork(self):
+        self._lock = threading.Lock()
+
+    def resolve(self, user_name):
+        # The user's id, or None when no user has this name
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_name)
+            if entry is not None and now - entry[1] < self.app.config['USER_ID_CACHE_TTL']:
+                self._entries.move_to_end(user_name)
+                self.hits += 1
+                return entry[0]
+        self.misses += 1
+
+        from app import db
+        user_id = db.session.execute(select(User.id).where(User.user_name == user_name)).scalar()
+        if user_id is None:
+            return None
+
+        with self._lock:
+            self._entries[user_name] = (user_id, now)
+            self._entries.move_to_end(user_name)
+            while len(self._entries) > self.app.config['USER_ID_CACHE_SIZE']:
+                self._entries.popitem(last=False)
+        return user_id
+
+    def forget(self, user_name):
+        with self._lock:
+            self._entries.pop(user_name, None)
+
+    def __len__(self):
+        return len(self._entries)
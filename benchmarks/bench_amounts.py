@@ -0,0 +1,90 @@
+"""Compare SUM over the float amount column with SUM over integer cents.
+
+Seeds (or reuses) a SQLite database and times the per-category monthly totals
+behind /dashboard and the grand total over every expense, once on the legacy
+float column and once on amount_cents. Also reports how far each float total
+is from the exact one:
+
+    python -m benchmarks.bench_amounts --expenses 1000000 --db amounts.db
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import func, literal, select
+
+from app import create_app, db
+from app.config import CommandConfig
+from app.models import Expenses
+from app.money import from_cents
+from benchmarks.bench_endpoints import summarize
+from benchmarks.seed import seed_database
+
+def monthly_totals(column, month_start, month_end):
+    # The /dashboard totals query, for the heavy user
+    return select(Expenses.category_id, func.sum(column)) \
+        .where(Expenses.user_id == 1, Expenses.date >= month_start, Expenses.date < month_end) \
+        .group_by(Expenses.category_id)
+
+def grand_total(column):
+    return select(literal('all'), func.sum(column))
+
+def time_query(statement, repeat):
+    rows = db.session.execute(statement).all()  # Warm the page cache
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        db.session.execute(statement).all()
+        timings.append((time.perf_counter() - started) * 1000)
+    return rows, summarize(timings)
+
+def drift(float_rows, cents_rows):
+    # Largest difference between a float total and the exact total, in cents
+    exact = {key: from_cents(cents) for key, cents in cents_rows}
+    return float(max((abs(Decimal(repr(total)) - exact[key]) * 100 for key, total in float_rows), default=0))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--expenses', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--db', help='SQLite file to seed once and reuse')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.abspath(args.db or os.path.join(tmp, 'amounts.db'))
+        needs_seed = not os.path.exists(db_path)
+
+        class BenchmarkConfig(CommandConfig):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+            SLOW_QUERY_ENABLED = False
+
+        app = create_app(BenchmarkConfig)
+        with app.app_context():
+            if needs_seed:
+                db.create_all()
+                with db.engine.begin() as connection:
+                    seed_database(connection, users=args.users, expenses=args.expenses, notifications=0)
+            total = db.session.scalar(select(func.count()).select_from(Expenses))
+
+            print(f'{total} expenses, {args.repeat} runs')
+            print(f"{'query':>16} {'float p50':>10} {'cents p50':>10} {'speedup':>8} {'float drift':>12}")
+            queries = [
+                ('monthly totals', lambda column: monthly_totals(column, datetime(2023, 6, 1), datetime(2023, 7, 1))),
+                ('yearly totals', lambda column: monthly_totals(column, datetime(2023, 1, 1), datetime(2024, 1, 1))),
+                ('grand total', grand_total),
+            ]
+            for name, build in queries:
+                float_rows, floats = time_query(build(Expenses.amount_float), args.repeat)
+                cents_rows, cents = time_query(build(Expenses.amount_cents), args.repeat)
+                print(f"{name:>16} {floats['p50']:10.2f} {cents['p50']:10.2f} "
+                      f"{floats['p50'] / max(cents['p50'], 1e-6):7.2f}x {drift(float_rows, cents_rows):9.2e} ct")
+
+            db.session.remove()
+            db.engine.dispose()
+
+if __name__ == '__main__':
+    main()
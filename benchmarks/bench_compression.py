@@ -0,0 +1,83 @@
+"""Measure bytes-on-wire and CPU cost per MB of streamed response compression.
+
+Run from the project root:
+
+    python -m benchmarks.bench_compression --megabytes 20
+"""
+import argparse
+import csv
+import json
+import random
+import time
+from io import StringIO
+
+from app.compression import GzipEncoder, brotli, compress_stream
+
+CHUNK_ROWS = 500
+
+def synthetic_rows(count):
+    rng = random.Random(42)
+    words = ['Groceries', 'Rent', 'Coffee', 'Fuel', 'Cinema', 'Pharmacy', 'Books', 'Taxi']
+    for i in range(count):
+        yield {
+            'id': i + 1,
+            'amount': round(rng.uniform(1, 500), 2),
+            'description': f'{rng.choice(words)} {rng.randint(1, 999)}',
+            'date': f'2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+            'user_id': 1,
+            'category_id': rng.randint(1, 12)
+        }
+
+def json_chunks(rows):
+    # Same shape as the streamed /filter_expenses JSON array
+    encoded = [json.dumps(row, separators=(',', ':'), sort_keys=True) for row in rows]
+    yield '['
+    for start in range(0, len(encoded), CHUNK_ROWS):
+        yield (',' if start else '') + ','.join(encoded[start:start + CHUNK_ROWS])
+    yield ']'
+
+def csv_chunks(rows):
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['Description', 'Date', 'Amount', 'Category'])
+    for count, row in enumerate(rows, 1):
+        writer.writerow([row['description'], row['date'], row['amount'], row['category_id']])
+        if count % CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def encoders():
+    for level in (1, 6, 9):
+        yield f'gzip-{level}', lambda level=level: GzipEncoder(level)
+    if brotli is not None:
+        from app.compression import BrotliEncoder
+        for quality in (1, 4, 6):
+            yield f'br-{quality}', lambda quality=quality: BrotliEncoder(quality)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--megabytes', type=float, default=10)
+    args = parser.parse_args()
+
+    # Roughly 110 bytes per JSON row
+    rows = list(synthetic_rows(int(args.megabytes * 1024 * 1024 / 110)))
+    bodies = {
+        'json': [chunk.encode('utf-8') for chunk in json_chunks(rows)],
+        'csv': [chunk.encode('utf-8') for chunk in csv_chunks(rows)],
+    }
+
+    print(f"{'body':>6} {'encoder':>8} {'raw MB':>8} {'wire MB':>8} {'ratio':>6} {'CPU ms/MB':>10}")
+    for body_name, chunks in bodies.items():
+        raw_bytes = sum(len(chunk) for chunk in chunks)
+        raw_mb = raw_bytes / 1024 / 1024
+        for encoder_name, make_encoder in encoders():
+            started = time.process_time()
+            wire_bytes = sum(len(data) for data in compress_stream(iter(chunks), make_encoder()))
+            cpu = time.process_time() - started
+            print(f'{body_name:>6} {encoder_name:>8} {raw_mb:8.2f} {wire_bytes / 1024 / 1024:8.2f} '
+                  f'{raw_bytes / wire_bytes:6.1f} {cpu * 1000 / raw_mb:10.1f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""Endpoint benchmarks against a seeded database.
+
+Seeds a reproducible SQLite database (see benchmarks/seed.py), calls each
+listing endpoint through the Flask test client as the heaviest user and
+writes latency percentiles and peak traced memory to a JSON file:
+
+    python -m benchmarks.bench_endpoints --scale small --output bench-results.json
+    python -m benchmarks.bench_endpoints --expenses 200000 --compare bench-results.json
+
+Pass --db to keep the seeded database between runs; it is only seeded when
+the file does not exist yet.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import sqlalchemy
+from flask_jwt_extended import create_access_token
+
+from app import create_app, db
+from app.config import Config
+from benchmarks.seed import SCALES, seed_database
+
+# name -> (path, query string, extra headers)
+ENDPOINTS = {
+    'filter_expenses': ('/filter_expenses', {}, {}),
+    'filter_expenses_ndjson': ('/filter_expenses', {}, {'Accept': 'application/x-ndjson'}),
+    'filter_expenses_columnar': ('/filter_expenses', {'format': 'columnar'}, {}),
+    'filter_expenses_fields': ('/filter_expenses', {'fields': 'id,amount,date'}, {}),
+    'expenses': ('/expenses', {'user': 'bench1'}, {}),
+    'notifications': ('/notifications', {}, {}),
+    'export_csv': ('/export/csv', {}, {}),
+    'export_pdf': ('/export/pdf', {}, {}),
+    'search': ('/expenses/search', {'q': 'coffee'}, {}),
+}
+
+# FPDF builds the whole document in memory; past this many rows it dominates the run
+PDF_ROW_LIMIT = 100_000
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank percentile, good enough for a handful of samples
+    index = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+def summarize(timings):
+    ordered = sorted(timings)
+    return {
+        'min': ordered[0],
+        'p50': percentile(ordered, 0.50),
+        'p90': percentile(ordered, 0.90),
+        'p99': percentile(ordered, 0.99),
+        'max': ordered[-1],
+        'mean': sum(ordered) / len(ordered),
+    }
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_endpoint(client, path, query, headers, repeat):
+    # One warm-up call so caches and the connection pool are primed
+    response = client.get(path, query_string=query, headers=headers)
+    status = response.status_code
+    size = len(response.get_data())
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(path, query_string=query, headers=headers)
+        response.get_data()  # Drain streamed bodies so the full cost is measured
+        timings.append((time.perf_counter() - started) * 1000)
+
+    # Trace allocations in a separate call since tracemalloc slows everything down
+    tracemalloc.start()
+    client.get(path, query_string=query, headers=headers).get_data()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        'status': status,
+        'response_bytes': size,
+        'runs': repeat,
+        'latency_ms': summarize(timings),
+        'peak_memory_bytes': peak,
+    }
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    print(f"\nagainst {baseline_path} ({(baseline['meta'].get('commit') or '?')[:10]})")
+    print(f"{'endpoint':>26} {'p50 ms':>10} {'change':>8} {'peak MiB':>10} {'change':>8}")
+    for name, current in results['endpoints'].items():
+        previous = baseline['endpoints'].get(name)
+        if previous is None:
+            continue
+        p50, old_p50 = current['latency_ms']['p50'], previous['latency_ms']['p50']
+        peak, old_peak = current['peak_memory_bytes'], previous['peak_memory_bytes']
+        print(f'{name:>26} {p50:10.1f} {(p50 - old_p50) / old_p50:+8.1%} '
+              f'{peak / 1048576:10.1f} {(peak - old_peak) / max(old_peak, 1):+8.1%}')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--expenses', type=int, help='overrides --scale')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--notifications', type=int, default=10_000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--endpoints', nargs='+', choices=sorted(ENDPOINTS), help='default: all')
+    parser.add_argument('--db', help='SQLite file to seed once and reuse')
+    parser.add_argument('--output', default='bench-results.json')
+    parser.add_argument('--compare', metavar='RESULTS_JSON', help='print changes against an earlier run')
+    args = parser.parse_args()
+
+    expenses = args.expenses if args.expenses is not None else SCALES[args.scale]
+    endpoints = args.endpoints or [
+        name for name in ENDPOINTS if name != 'export_pdf' or expenses // 2 <= PDF_ROW_LIMIT
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.abspath(args.db or os.path.join(tmp, 'bench.db'))
+        needs_seed = not os.path.exists(db_path)
+
+        class BenchmarkConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+            # Every repetition must run the view; a cached response or a scheduler job would skew the timings
+            RESULT_CACHE_ENABLED = False
+            SCHEDULER_ENABLED = False
+            SLOW_QUERY_ENABLED = False
+
+        app = create_app(BenchmarkConfig)
+        with app.app_context():
+            dataset = None
+            if needs_seed:
+                db.create_all()
+                started = time.perf_counter()
+                with db.engine.begin() as connection:
+                    dataset = seed_database(connection, users=args.users, expenses=expenses,
+                                            notifications=args.notifications, seed=args.seed)
+                print(f'seeded {expenses} expenses in {time.perf_counter() - started:.1f}s')
+
+            headers = {'Authorization': f'Bearer {create_access_token(identity=1)}'}
+
+        results = {
+            'meta': {
+                'commit': git_commit(),
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'sqlalchemy': sqlalchemy.__version__,
+                'database': db_path if args.db else 'temporary',
+                'dataset': dataset or {'expenses': expenses, 'reused': True},
+                'repeat': args.repeat,
+            },
+            'endpoints': {},
+        }
+
+        client = app.test_client()
+        for name in endpoints:
+            path, query, extra_headers = ENDPOINTS[name]
+            result = run_endpoint(client, path, query, {**headers, **extra_headers}, args.repeat)
+            results['endpoints'][name] = result
+            latency = result['latency_ms']
+            print(f"{name:>26}: p50 {latency['p50']:9.1f} ms  p99 {latency['p99']:9.1f} ms  "
+                  f"peak {result['peak_memory_bytes'] / 1048576:7.1f} MiB  status {result['status']}")
+
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'results written to {args.output}')
+
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == '__main__':
+    main()
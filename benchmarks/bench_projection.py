@@ -0,0 +1,83 @@
+"""Compare ORM hydration with projected column rows for expense listings.
+
+Run from the project root:
+
+    python -m benchmarks.bench_projection --rows 100000
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from app import create_app, db
+from app.config import Config
+from app.models import Expenses
+from app.projection import EXPENSE_FIELDS, columns_for, row_serializer
+from benchmarks.seed import seed_database
+
+FIELDS = ['id', 'amount', 'description', 'date', 'user_id', 'category_id']
+
+def hydrated(user_id):
+    return [
+        {
+            'id': expense.id,
+            'amount': str(expense.amount),
+            'description': expense.description,
+            'date': expense.date.strftime('%Y-%m-%d'),
+            'user_id': expense.user_id,
+            'category_id': expense.category_id
+        } for expense in Expenses.query.filter_by(user_id=user_id).all()
+    ]
+
+def projected(user_id):
+    serialize = row_serializer(FIELDS)
+    query = db.session.query(*columns_for(FIELDS, EXPENSE_FIELDS)).filter(Expenses.user_id == user_id)
+    return [serialize(row) for row in query.all()]
+
+def measure(func, user_id, repeat):
+    timings = []
+    for _ in range(repeat):
+        db.session.expunge_all()  # Start every run from an empty identity map
+        started = time.perf_counter()
+        func(user_id)
+        timings.append(time.perf_counter() - started)
+
+    # Trace allocations in a separate run since tracemalloc slows everything down
+    db.session.expunge_all()
+    tracemalloc.start()
+    func(user_id)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(timings), peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        class BenchmarkConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+            # Every repetition must run the view; a cached response or a scheduler job would skew the timings
+            RESULT_CACHE_ENABLED = False
+            SCHEDULER_ENABLED = False
+            SLOW_QUERY_ENABLED = False
+
+        app = create_app(BenchmarkConfig)
+        with app.app_context():
+            db.create_all()
+            with db.engine.begin() as connection:
+                seed_database(connection, users=1, expenses=args.rows, notifications=0)
+            user_id = 1
+
+            print(f'{args.rows} expenses, best of {args.repeat}')
+            for name, func in [('orm hydration', hydrated), ('projected rows', projected)]:
+                seconds, peak = measure(func, user_id, args.repeat)
+                print(f'{name:>16}: {seconds * 1000:8.1f} ms  peak {peak / 1024 / 1024:7.1f} MiB')
+
+            db.session.remove()
+
+if __name__ == '__main__':
+    main()
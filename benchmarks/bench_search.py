@@ -0,0 +1,101 @@
+"""Compare FTS5 search against LIKE '%term%' on expense descriptions.
+
+Seeds (or reuses) a SQLite database, then times the query behind
+/expenses/search next to the substring scan it replaces, for the heaviest
+user and across all users:
+
+    python -m benchmarks.bench_search --expenses 1000000 --db search.db
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from sqlalchemy import func, select, text
+
+from app import create_app, db
+from app.config import CommandConfig
+from app.models import EXPENSES_FTS_DDL, Expenses
+from app.search import match_expenses
+from benchmarks.bench_endpoints import summarize
+from benchmarks.seed import seed_database
+
+# Single words, a prefix, two words and a rare token from the seeded vocabulary
+SEARCHES = ['coffee', 'cof', 'taxi fuel', '4242']
+
+def ensure_index(connection):
+    # Databases seeded before the index existed get it built once
+    exists = connection.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'expenses_fts'")).first()
+    if exists is None:
+        for statement in EXPENSES_FTS_DDL:
+            connection.execute(text(statement))
+        connection.execute(text("INSERT INTO expenses_fts(expenses_fts) VALUES ('rebuild')"))
+
+def fts_query(terms, user_id, limit):
+    query = db.session.query(Expenses.id, Expenses.description).select_from(Expenses)
+    if user_id is not None:
+        query = query.filter(Expenses.user_id == user_id)
+    return match_expenses(query, terms, 'sqlite').limit(limit)
+
+def like_query(terms, user_id, limit):
+    query = db.session.query(Expenses.id, Expenses.description)
+    if user_id is not None:
+        query = query.filter(Expenses.user_id == user_id)
+    for term in terms:
+        query = query.filter(Expenses.description.like(f'%{term}%'))
+    return query.order_by(Expenses.date.desc(), Expenses.id).limit(limit)
+
+def time_query(build, repeat):
+    rows = build().all()  # Warm the page cache
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        build().all()
+        timings.append((time.perf_counter() - started) * 1000)
+    return len(rows), summarize(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--expenses', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--limit', type=int, default=50, help='page size, as in /expenses/search')
+    parser.add_argument('--db', help='SQLite file to seed once and reuse')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.abspath(args.db or os.path.join(tmp, 'search.db'))
+        needs_seed = not os.path.exists(db_path)
+
+        class BenchmarkConfig(CommandConfig):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+            SLOW_QUERY_ENABLED = False
+
+        app = create_app(BenchmarkConfig)
+        with app.app_context():
+            if needs_seed:
+                db.create_all()
+                started = time.perf_counter()
+                with db.engine.begin() as connection:
+                    seed_database(connection, users=args.users, expenses=args.expenses, notifications=0)
+                print(f'seeded {args.expenses} expenses (index kept by triggers) in '
+                      f'{time.perf_counter() - started:.1f}s')
+            with db.engine.begin() as connection:
+                ensure_index(connection)
+            total = db.session.scalar(select(func.count()).select_from(Expenses))
+
+            print(f'{total} expenses, {args.repeat} runs, limit {args.limit}')
+            print(f"{'search':>12} {'scope':>6} {'FTS p50':>9} {'LIKE p50':>9} {'speedup':>8} {'rows':>11}")
+            for search in SEARCHES:
+                terms = search.split()
+                for scope, user_id in (('user', 1), ('all', None)):
+                    fts_rows, fts = time_query(lambda: fts_query(terms, user_id, args.limit), args.repeat)
+                    like_rows, like = time_query(lambda: like_query(terms, user_id, args.limit), args.repeat)
+                    print(f"{search:>12} {scope:>6} {fts['p50']:9.2f} {like['p50']:9.2f} "
+                          f"{like['p50'] / max(fts['p50'], 1e-6):7.1f}x {fts_rows:>5}/{like_rows:<5}")
+
+            db.session.remove()
+            db.engine.dispose()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Measure cold-start time of the app factory with ``python -X importtime``.
+
+Each run is a fresh interpreter that imports the package and calls
+``create_app``, which is what a gunicorn worker or a one-off command such as
+``create.py`` pays before doing any work. Run from the project root:
+
+    python -m benchmarks.bench_startup --runs 10 --output before.json
+    python -m benchmarks.bench_startup --runs 10 --compare before.json
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.bench_endpoints import percentile
+
+CONFIGS = {
+    # ProductionConfig, which wsgi.py builds for the gunicorn workers
+    'worker': 'from app import create_app; from app.config import ProductionConfig; create_app(ProductionConfig)',
+    # What create.py and other scripts pay; no scheduler, no request machinery warm-up
+    'command': 'from app import create_app; from app.config import CommandConfig; create_app(CommandConfig)',
+    'testing': 'from app import create_app; from app.config import TestingConfig; create_app(TestingConfig)',
+}
+
+def parse_importtime(stderr):
+    # Lines look like "import time:  self [us] | cumulative | package"; indentation marks nesting
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(self_us), int(cumulative_us), len(name) - len(name.lstrip()))
+    return modules
+
+def top_level(modules):
+    # Modules imported directly by the script or create_app (one space after the bar)
+    return {name: cumulative for name, (_, cumulative, depth) in modules.items() if depth == 1}
+
+def run_once(code):
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    return elapsed, parse_importtime(result.stderr)
+
+def measure(code, runs):
+    run_once(code)  # Warm the bytecode cache so every measured run is comparable
+    wall, imports, slowest = [], [], {}
+    for _ in range(runs):
+        elapsed, modules = run_once(code)
+        wall.append(elapsed * 1000)
+        roots = top_level(modules)
+        imports.append(sum(roots.values()) / 1000)
+        for name, cumulative in roots.items():
+            slowest.setdefault(name, []).append(cumulative / 1000)
+    return {
+        'wall_ms': {'p50': round(statistics.median(wall), 1), 'p95': round(percentile(sorted(wall), 0.95), 1)},
+        'import_ms': round(statistics.median(imports), 1),
+        'top_imports_ms': dict(sorted(
+            ((name, round(statistics.median(values), 1)) for name, values in slowest.items()),
+            key=lambda item: item[1], reverse=True
+        )[:10]),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--configs', nargs='+', choices=sorted(CONFIGS), default=sorted(CONFIGS))
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--compare', help='JSON file from an earlier run to diff against')
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.configs:
+        results[name] = measure(CONFIGS[name], args.runs)
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    print(f"{'config':>8} {'wall p50':>9} {'wall p95':>9} {'imports':>8} {'vs base':>8}")
+    for name, result in results.items():
+        change = ''
+        if name in baseline:
+            before = baseline[name]['wall_ms']['p50']
+            change = f"{(result['wall_ms']['p50'] - before) / before * 100:+.0f}%"
+        print(f"{name:>8} {result['wall_ms']['p50']:9.1f} {result['wall_ms']['p95']:9.1f} "
+              f"{result['import_ms']:8.1f} {change:>8}")
+        for module, cumulative in result['top_imports_ms'].items():
+            print(f'{"":>10}{cumulative:8.1f} ms  {module}')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
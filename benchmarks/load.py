@@ -0,0 +1,264 @@
+"""Multi-process load driver.
+
+Starts the app under gunicorn with several workers against a seeded SQLite
+database, then replays a weighted mix of traffic from many concurrent
+client processes and reports throughput, error rate (counting SQLite
+"database is locked" failures separately) and p50/p95/p99 latency per
+endpoint:
+
+    python -m benchmarks.load --expenses 200000 --workers 4 --clients 32 --duration 30
+    python -m benchmarks.load --mix filter=5,notifications=10,add_expense=3 --output load.json
+
+Each client logs in once as one of the synthetic users and keeps its HTTP
+connection alive, so latency reflects server work rather than TCP setup.
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+from benchmarks.bench_endpoints import percentile
+from benchmarks.seed import BENCH_PASSWORD, SCALES
+
+DEFAULT_MIX = 'login=1,add_expense=3,filter=5,notifications=10,export_csv=1'
+
+def parse_mix(raw):
+    mix = {}
+    for item in raw.split(','):
+        name, _, weight = item.partition('=')
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"unknown scenario '{name}', choose from {', '.join(SCENARIOS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+# Each scenario returns (method, path, body, needs_auth)
+def login_request(client):
+    return 'POST', '/login', {'email': client['email'], 'password': BENCH_PASSWORD}, False
+
+def add_expense_request(client):
+    rng = client['rng']
+    when = datetime(2024, 1, 1) + timedelta(minutes=rng.randrange(365 * 24 * 60))
+    return 'POST', '/add_expense', {
+        'user_name': client['user_name'],
+        'amount': f'{rng.randint(100, 30_000) / 100:.2f}',
+        'description': f'load test {rng.randint(1, 99999)}',
+        'date': when.strftime('%Y-%m-%dT%H:%M:%S'),
+        'Category': rng.randint(1, 12),
+    }, False
+
+def filter_request(client):
+    rng = client['rng']
+    start = datetime(2020, 1, 1) + timedelta(days=rng.randrange(5 * 365 - 30))
+    query = urlencode({
+        'start_date': start.strftime('%Y-%m-%d'),
+        'end_date': (start + timedelta(days=30)).strftime('%Y-%m-%d'),
+    })
+    return 'GET', f'/filter_expenses?{query}', None, True
+
+def notifications_request(client):
+    return 'GET', '/notifications', None, True
+
+def export_csv_request(client):
+    return 'GET', '/export/csv', None, True
+
+SCENARIOS = {
+    'login': login_request,
+    'add_expense': add_expense_request,
+    'filter': filter_request,
+    'notifications': notifications_request,
+    'export_csv': export_csv_request,
+}
+
+def run_client(client_id, host, port, users, mix, duration, seed):
+    rng = random.Random(seed + client_id)
+    user_id = client_id % users + 1
+    client = {
+        'rng': rng,
+        'user_name': f'bench{user_id}',
+        'email': f'bench{user_id}@example.com',
+    }
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    samples = {name: [] for name in names}
+    errors = {name: {'http': 0, 'locked': 0, 'connection': 0} for name in names}
+
+    connection = http.client.HTTPConnection(host, port, timeout=60)
+    token = None
+    deadline = time.monotonic() + duration
+
+    while time.monotonic() < deadline:
+        name = 'login' if token is None else rng.choices(names, weights)[0]
+        method, path, body, needs_auth = SCENARIOS[name](client)
+        headers = {'Content-Type': 'application/json'}
+        if needs_auth:
+            headers['Authorization'] = f'Bearer {token}'
+
+        started = time.perf_counter()
+        try:
+            connection.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+            response = connection.getresponse()
+            payload = response.read()
+        except (OSError, http.client.HTTPException):
+            errors.setdefault(name, {'http': 0, 'locked': 0, 'connection': 0})['connection'] += 1
+            connection.close()
+            connection = http.client.HTTPConnection(host, port, timeout=60)
+            continue
+        elapsed = (time.perf_counter() - started) * 1000
+
+        samples.setdefault(name, []).append(elapsed)
+        errors.setdefault(name, {'http': 0, 'locked': 0, 'connection': 0})
+        if response.status >= 400:
+            errors[name]['http'] += 1
+            if b'database is locked' in payload:
+                errors[name]['locked'] += 1
+        elif name == 'login':
+            token = json.loads(payload)['access_token']
+
+    connection.close()
+    return samples, errors
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def wait_for_server(host, port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('server exited during startup')
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'server did not start listening on {host}:{port}')
+
+def seed_file(db_path, args):
+    # Seed in a child interpreter so the app never starts in this process; CommandConfig runs no scheduler
+    subprocess.run([
+        sys.executable, '-c',
+        'import sys\n'
+        'from app import create_app, db\n'
+        'from app.config import CommandConfig\n'
+        'from benchmarks.seed import seed_database\n'
+        'class SeedConfig(CommandConfig):\n'
+        '    SQLALCHEMY_DATABASE_URI = "sqlite:///" + sys.argv[1]\n'
+        'app = create_app(SeedConfig)\n'
+        'with app.app_context():\n'
+        '    db.create_all()\n'
+        '    with db.engine.begin() as connection:\n'
+        '        seed_database(connection, users=int(sys.argv[2]), expenses=int(sys.argv[3]),\n'
+        '                      notifications=int(sys.argv[4]), seed=int(sys.argv[5]))\n',
+        db_path, str(args.users), str(args.expenses), str(args.notifications), str(args.seed),
+    ], check=True)
+
+def report(samples, errors, duration):
+    results = {}
+    print(f"{'endpoint':>14} {'requests':>9} {'req/s':>8} {'errors':>7} {'locked':>7} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name in sorted(set(samples) | set(errors)):
+        latencies = sorted(samples.get(name, []))
+        failed = errors.get(name, {'http': 0, 'locked': 0, 'connection': 0})
+        attempts = len(latencies) + failed['connection']
+        row = {
+            'requests': attempts,
+            'throughput_rps': attempts / duration,
+            'error_rate': (failed['http'] + failed['connection']) / attempts if attempts else 0.0,
+            'errors': failed,
+            'latency_ms': {
+                'p50': percentile(latencies, 0.50),
+                'p95': percentile(latencies, 0.95),
+                'p99': percentile(latencies, 0.99),
+            } if latencies else None,
+        }
+        results[name] = row
+        latency = row['latency_ms'] or {'p50': 0, 'p95': 0, 'p99': 0}
+        print(f"{name:>14} {attempts:9d} {row['throughput_rps']:8.1f} {row['error_rate']:7.1%} "
+              f"{failed['locked']:7d} {latency['p50']:8.1f} {latency['p95']:8.1f} {latency['p99']:8.1f}")
+
+    total = sum(row['requests'] for row in results.values())
+    print(f'{"total":>14} {total:9d} {total / duration:8.1f}')
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--expenses', type=int, help='overrides --scale')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--notifications', type=int, default=10_000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db', help='SQLite file to seed once and reuse (default: a temporary copy per run)')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=1, help='threads per gunicorn worker')
+    parser.add_argument('--clients', type=int, default=16, help='concurrent client processes')
+    parser.add_argument('--duration', type=float, default=20, help='seconds of traffic')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f'weighted scenarios (default: {DEFAULT_MIX})')
+    parser.add_argument('--output', help='write the report as JSON')
+    args = parser.parse_args()
+
+    if shutil.which('gunicorn') is None:
+        parser.error('gunicorn is not installed (pip install gunicorn)')
+    args.expenses = args.expenses if args.expenses is not None else SCALES[args.scale]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.abspath(args.db or os.path.join(tmp, 'load.db'))
+        if not os.path.exists(db_path):
+            print(f'seeding {args.expenses} expenses into {db_path}')
+            seed_file(db_path, args)
+
+        host, port = '127.0.0.1', free_port()
+        env = dict(os.environ, DATABASE_URL='sqlite:///' + db_path, LOG_LEVEL='WARNING')
+        # Same entry point and gunicorn.conf.py hooks as production; the flags override the sizing
+        server = subprocess.Popen([
+            'gunicorn', '--workers', str(args.workers), '--threads', str(args.threads),
+            '--bind', f'{host}:{port}', '--log-level', 'warning', 'wsgi:app',
+        ], env=env)
+
+        try:
+            wait_for_server(host, port, server)
+            print(f'{args.clients} clients, {args.workers} workers x {args.threads} threads, {args.duration:.0f}s')
+
+            with multiprocessing.Pool(args.clients) as pool:
+                started = time.monotonic()
+                outcomes = pool.starmap(run_client, [
+                    (client_id, host, port, args.users, args.mix, args.duration, args.seed)
+                    for client_id in range(args.clients)
+                ])
+                elapsed = time.monotonic() - started
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    samples, errors = {}, {}
+    for client_samples, client_errors in outcomes:
+        for name, values in client_samples.items():
+            samples.setdefault(name, []).extend(values)
+        for name, counts in client_errors.items():
+            merged = errors.setdefault(name, {'http': 0, 'locked': 0, 'connection': 0})
+            for kind, count in counts.items():
+                merged[kind] += count
+
+    results = report(samples, errors, elapsed)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'config': {key: value for key, value in vars(args).items() if key != 'mix'} | {'mix': args.mix},
+                'duration_s': elapsed,
+                'endpoints': results,
+            }, f, indent=2)
+        print(f'report written to {args.output}')
+
+if __name__ == '__main__':
+    main()
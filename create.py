@@ -1,7 +1,8 @@
 from app import create_app, db
+from app.config import CommandConfig
 from app.models import User
 
-app = create_app()
+app = create_app(CommandConfig)
 
 with app.app_context():
     db.create_all()
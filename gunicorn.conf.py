@@ -0,0 +1,63 @@
+"""Gunicorn settings for ``gunicorn wsgi:app``.
+
+The app is created once in the master (preload) and forked into the workers.
+Each worker resets the state it must not share with the master, such as
+database connections and logging queues. Background jobs run only in the
+master, so there is one scheduler no matter how many workers are running or
+restarted. Every setting can be overridden on the command line.
+"""
+import os
+
+def _cpu_count():
+    # CPUs this process may actually run on, which is what matters inside containers
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+bind = os.environ.get('GUNICORN_BIND') or f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY') or _cpu_count() * 2 + 1)
+# Requests mostly wait on SQLite and the network, so a few threads per worker add cheap concurrency
+threads = int(os.environ.get('GUNICORN_THREADS') or 4)
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+preload_app = True
+timeout = int(os.environ.get('GUNICORN_TIMEOUT') or 60)
+graceful_timeout = 30  # Time given to in-flight requests after SIGTERM before workers are killed
+keepalive = 5
+
+# Recycle workers now and then to bound slow memory growth; jitter avoids restarting all at once
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS') or 5000)
+max_requests_jitter = max_requests // 10
+
+accesslog = None  # The app writes its own JSON access records
+errorlog = '-'
+
+def _flask_app(server):
+    # With preload_app this returns the app the master already created
+    return server.app.wsgi()
+
+def on_starting(server):
+    from app import lifecycle
+    lifecycle.reset_metrics(_flask_app(server))
+
+def when_ready(server):
+    from app import lifecycle
+    lifecycle.start_background(_flask_app(server))
+
+def post_fork(server, worker):
+    from app import lifecycle
+    lifecycle.after_fork(_flask_app(server))
+
+def worker_exit(server, worker):
+    # Runs in the worker after a graceful stop (SIGTERM, max_requests or reload)
+    from app import lifecycle
+    lifecycle.shutdown(_flask_app(server))
+
+def child_exit(server, worker):
+    # Runs in the master once a worker is gone, including workers that crashed or were killed
+    from app import lifecycle
+    lifecycle.retire_worker(_flask_app(server), worker.pid)
+
+def on_exit(server):
+    from app import lifecycle
+    lifecycle.shutdown(_flask_app(server))
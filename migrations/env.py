@@ -106,6 +106,10 @@ def run_migrations_online():
         with context.begin_transaction():
             context.run_migrations()
 
+    # Cached responses were built from the rows and schema as they were before the migration
+    from app.resultcache import reset_shared_cache
+    reset_shared_cache(current_app)
+
 
 if context.is_offline_mode():
     run_migrations_offline()
@@ -0,0 +1,59 @@
+"""number rows written around the change feed listener
+
+Revision ID: 1c6e8f2a9b57
+Revises: 5e7a1c9b3d20
+Create Date: 2026-10-19 14:00:00.000000
+
+The feed's cursor is change_seq, not updated_at: timestamps are not unique and
+do not follow commit order, so 9d2f6b3e8a41 indexed (user_id, change_seq) and
+keeps updated_at as information only. change_seq is filled in by the
+application's before_flush listener; on SQLite these triggers also number rows
+that raw SQL or a worker still on an older release inserts or updates, which
+would otherwise keep a NULL or stale number that /changes never returns.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '1c6e8f2a9b57'
+down_revision = '5e7a1c9b3d20'
+branch_labels = None
+depends_on = None
+
+TABLES = ('expenses', 'notification')
+
+# Takes the next number from the counter, as app/changes.py does, and stamps the row with it
+NUMBER_ROW = """INSERT OR IGNORE INTO change_counter (id, value) VALUES (1, 0);
+        UPDATE change_counter SET value = value + 1 WHERE id = 1;
+        UPDATE {table} SET change_seq = (SELECT value FROM change_counter WHERE id = 1),
+            updated_at = COALESCE({updated_at}, CURRENT_TIMESTAMP) WHERE id = new.id;"""
+
+
+def create_triggers(table):
+    op.execute(f"""CREATE TRIGGER IF NOT EXISTS {table}_change_seq_insert AFTER INSERT ON {table}
+        WHEN new.change_seq IS NULL BEGIN
+        {NUMBER_ROW.format(table=table, updated_at='new.updated_at')}
+    END""")
+    op.execute(f"""CREATE TRIGGER IF NOT EXISTS {table}_change_seq_update AFTER UPDATE ON {table}
+        WHEN new.change_seq IS old.change_seq BEGIN
+        {NUMBER_ROW.format(table=table, updated_at='NULL')}
+    END""")
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    for table in TABLES:
+        create_triggers(table)
+        # Rows an older release wrote since the change feed migration: the no-op update fires the trigger
+        op.execute(f'UPDATE {table} SET change_seq = change_seq WHERE change_seq IS NULL')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    for table in reversed(TABLES):
+        op.execute(f'DROP TRIGGER IF EXISTS {table}_change_seq_update')
+        op.execute(f'DROP TRIGGER IF EXISTS {table}_change_seq_insert')
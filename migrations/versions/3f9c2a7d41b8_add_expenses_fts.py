@@ -0,0 +1,47 @@
+"""full-text index on expense descriptions
+
+Revision ID: 3f9c2a7d41b8
+Revises: e2e9f1bf3d35
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9c2a7d41b8'
+down_revision = 'e2e9f1bf3d35'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return  # FTS5 is SQLite-only; /expenses/search falls back to LIKE elsewhere
+
+    op.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS expenses_fts USING fts5(
+        description, content='expenses', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""")
+    op.execute("""CREATE TRIGGER IF NOT EXISTS expenses_fts_insert AFTER INSERT ON expenses BEGIN
+        INSERT INTO expenses_fts(rowid, description) VALUES (new.id, new.description);
+    END""")
+    op.execute("""CREATE TRIGGER IF NOT EXISTS expenses_fts_delete AFTER DELETE ON expenses BEGIN
+        INSERT INTO expenses_fts(expenses_fts, rowid, description) VALUES ('delete', old.id, old.description);
+    END""")
+    op.execute("""CREATE TRIGGER IF NOT EXISTS expenses_fts_update AFTER UPDATE OF description ON expenses BEGIN
+        INSERT INTO expenses_fts(expenses_fts, rowid, description) VALUES ('delete', old.id, old.description);
+        INSERT INTO expenses_fts(rowid, description) VALUES (new.id, new.description);
+    END""")
+    # Index the rows that already exist
+    op.execute("INSERT INTO expenses_fts(expenses_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    op.execute('DROP TRIGGER IF EXISTS expenses_fts_update')
+    op.execute('DROP TRIGGER IF EXISTS expenses_fts_delete')
+    op.execute('DROP TRIGGER IF EXISTS expenses_fts_insert')
+    op.execute('DROP TABLE IF EXISTS expenses_fts')
@@ -0,0 +1,78 @@
+"""integer cents next to the float amounts
+
+Revision ID: 5e7a1c9b3d20
+Revises: 9d2f6b3e8a41
+Create Date: 2026-10-19 13:00:00.000000
+
+Runs online: the backfill walks the primary key in batches that commit one at a
+time, so writers wait for at most one batch. On SQLite, triggers keep
+amount_cents in step with rows that workers still on the previous release insert
+or update through the float column alone. The float column and the triggers are
+left for a later migration to drop, together with making amount_cents NOT NULL
+(which SQLite can only do by rebuilding the table).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e7a1c9b3d20'
+down_revision = '9d2f6b3e8a41'
+branch_labels = None
+depends_on = None
+
+TABLES = ('expenses', 'recurring_expense')
+
+BATCH_SIZE = 5000
+
+TO_CENTS = 'CAST(ROUND({} * 100) AS INTEGER)'
+
+
+def create_triggers(table):
+    cents = TO_CENTS.format('new.amount')
+    op.execute(f"""CREATE TRIGGER IF NOT EXISTS {table}_amount_cents_insert AFTER INSERT ON {table}
+        WHEN new.amount_cents IS NULL BEGIN
+        UPDATE {table} SET amount_cents = {cents} WHERE id = new.id;
+    END""")
+    # Current code writes both columns, so amount_cents changes with amount and the trigger stays idle
+    op.execute(f"""CREATE TRIGGER IF NOT EXISTS {table}_amount_cents_update AFTER UPDATE OF amount ON {table}
+        WHEN new.amount_cents IS old.amount_cents BEGIN
+        UPDATE {table} SET amount_cents = {cents} WHERE id = new.id;
+    END""")
+
+
+def backfill(table):
+    connection = op.get_bind()
+    high = connection.execute(sa.text(f'SELECT MAX(id) FROM {table}')).scalar() or 0
+    statement = sa.text(f'UPDATE {table} SET amount_cents = {TO_CENTS.format("amount")} '
+                        'WHERE id > :start AND id <= :end AND amount_cents IS NULL')
+    # Rows inserted after MAX(id) was read are filled in by the insert trigger (or by the application)
+    for start in range(0, high, BATCH_SIZE):
+        connection.execute(statement, {'start': start, 'end': start + BATCH_SIZE})
+
+
+def upgrade():
+    sqlite = op.get_bind().dialect.name == 'sqlite'
+    for table in TABLES:
+        op.add_column(table, sa.Column('amount_cents', sa.BigInteger(), nullable=True))
+        if sqlite:
+            create_triggers(table)
+
+    # Commit the new column first; every batch below is then a transaction of its own
+    with op.get_context().autocommit_block():
+        for table in TABLES:
+            backfill(table)
+
+    # The amount sort key now reads the integer column
+    op.drop_index('ix_expenses_user_amount', table_name='expenses')
+    op.create_index('ix_expenses_user_amount', 'expenses', ['user_id', 'amount_cents', 'id'], unique=False)
+
+
+def downgrade():
+    # The application kept the float column up to date, so nothing is lost
+    op.drop_index('ix_expenses_user_amount', table_name='expenses')
+    op.create_index('ix_expenses_user_amount', 'expenses', ['user_id', 'amount', 'id'], unique=False)
+    for table in reversed(TABLES):
+        op.execute(f'DROP TRIGGER IF EXISTS {table}_amount_cents_update')
+        op.execute(f'DROP TRIGGER IF EXISTS {table}_amount_cents_insert')
+        op.drop_column(table, 'amount_cents')  # Not batch mode, which would rebuild the table without its triggers
@@ -0,0 +1,29 @@
+"""composite indexes for /filter_expenses sort keys
+
+Revision ID: 7b1d4e9a2c63
+Revises: 3f9c2a7d41b8
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '7b1d4e9a2c63'
+down_revision = '3f9c2a7d41b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_expenses_user_id_id', 'expenses', ['user_id', 'id'], unique=False)
+    op.create_index('ix_expenses_user_date', 'expenses', ['user_id', 'date', 'id'], unique=False)
+    op.create_index('ix_expenses_user_amount', 'expenses', ['user_id', 'amount', 'id'], unique=False)
+    op.create_index('ix_expenses_user_description', 'expenses', ['user_id', 'description', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_expenses_user_description', table_name='expenses')
+    op.drop_index('ix_expenses_user_amount', table_name='expenses')
+    op.drop_index('ix_expenses_user_date', table_name='expenses')
+    op.drop_index('ix_expenses_user_id_id', table_name='expenses')
@@ -0,0 +1,60 @@
+"""change sequence numbers and tombstones for /changes
+
+Revision ID: 9d2f6b3e8a41
+Revises: c4a8e2f07d19
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d2f6b3e8a41'
+down_revision = 'c4a8e2f07d19'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('expenses', 'notification'):
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=True))
+        op.add_column(table, sa.Column('change_seq', sa.Integer(), nullable=True))
+
+    op.create_table('tombstone',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('entity', sa.String(length=20), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('change_seq', sa.Integer(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('change_counter',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('value', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+    # Number the existing rows so a first sync from cursor 0 returns them: expenses first, then notifications
+    op.execute("UPDATE expenses SET change_seq = id, updated_at = CURRENT_TIMESTAMP")
+    op.execute("UPDATE notification SET change_seq = id + (SELECT COALESCE(MAX(id), 0) FROM expenses), "
+               "updated_at = COALESCE(created_at, CURRENT_TIMESTAMP)")
+    op.execute("INSERT INTO change_counter (id, value) VALUES "
+               "(1, (SELECT COALESCE(MAX(id), 0) FROM expenses) + (SELECT COALESCE(MAX(id), 0) FROM notification))")
+
+    op.create_index('ix_expenses_user_change', 'expenses', ['user_id', 'change_seq'], unique=False)
+    op.create_index('ix_notification_user_change', 'notification', ['user_id', 'change_seq'], unique=False)
+    op.create_index('ix_tombstone_user_change', 'tombstone', ['user_id', 'change_seq'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_tombstone_user_change', table_name='tombstone')
+    op.drop_index('ix_notification_user_change', table_name='notification')
+    op.drop_index('ix_expenses_user_change', table_name='expenses')
+    op.drop_table('change_counter')
+    op.drop_table('tombstone')
+    # Native DROP COLUMN (SQLite 3.35+), since a batch table rebuild would drop the FTS triggers on expenses
+    for table in ('notification', 'expenses'):
+        op.drop_column(table, 'change_seq')
+        op.drop_column(table, 'updated_at')
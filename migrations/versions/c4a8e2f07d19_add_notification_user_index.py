@@ -0,0 +1,23 @@
+"""index notifications by user and creation time
+
+Revision ID: c4a8e2f07d19
+Revises: 7b1d4e9a2c63
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a8e2f07d19'
+down_revision = '7b1d4e9a2c63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_notification_user_created', 'notification', ['user_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_notification_user_created', table_name='notification')
@@ -1,9 +1,13 @@
+import random
 import unittest
 from app import db, bcrypt, create_app
 from app.models import User, Category, Expenses, RecurringExpense, Notification
 from sqlalchemy.exc import IntegrityError
 from app.config import TestingConfig
 from datetime import datetime, timedelta
+from decimal import Decimal
+from itertools import product
+from werkzeug.datastructures import MultiDict
 
 class UserModelTestCase(unittest.TestCase):
 
@@ -324,5 +328,160 @@ class NotificationModelTestCase(unittest.TestCase):
         fetched_notification_unread = Notification.query.filter_by(message="New expense added").first()
         self.assertFalse(fetched_notification_unread.is_read)
 
+class ExpenseQueryPlanTestCase(unittest.TestCase):
+    """/filter_expenses orderings must be served by an index, never by a temporary sort."""
+
+    FILTERS = [
+        {},
+        {'min_amount': '5', 'max_amount': '50'},
+        {'start_date': '2024-01-01', 'end_date': '2024-06-30'},
+        {'period': '2024-10'},
+        {'category_id': ['1', '2,3']},
+        {'description_prefix': 'lun'},
+        {'min_amount': '5', 'period': '2024', 'category_id': ['2'], 'description_prefix': 'co'},
+    ]
+
+    def setUp(self):
+        self.app = create_app(TestingConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def query_plan(self, query):
+        statement = query.statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})
+        with db.engine.connect() as connection:
+            return [row[-1] for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}')]
+
+    def test_supported_orderings_use_an_index(self):
+        """Test every sort key, direction and filter combination avoids a temp B-tree sort."""
+        from app.filters import SORT_KEYS, expense_filters, order_expenses
+
+        for sort_by, order, filters in product(SORT_KEYS, ('asc', 'desc'), self.FILTERS):
+            with self.subTest(sort_by=sort_by, order=order, filters=filters):
+                args = MultiDict([(name, value) for name, values in filters.items()
+                                  for value in (values if isinstance(values, list) else [values])])
+                query = db.session.query(Expenses.id, Expenses.amount_cents, Expenses.date) \
+                    .filter(Expenses.user_id == 1, *expense_filters(args, sort_by))
+                query = order_expenses(query, sort_by, order)
+
+                plan = self.query_plan(query)
+                self.assertFalse(any('TEMP B-TREE' in detail for detail in plan), plan)
+                self.assertTrue(any('USING' in detail and 'INDEX' in detail for detail in plan), plan)
+
+    def test_unindexed_is_sqlite_only(self):
+        """Test the unary + is only emitted for SQLite."""
+        from sqlalchemy.dialects import postgresql, sqlite
+        from app.filters import unindexed
+
+        condition = unindexed(Expenses.date) >= datetime(2024, 1, 1)
+        self.assertEqual(str(condition.compile(dialect=sqlite.dialect())), '+expenses.date >= ?')
+        self.assertEqual(str(condition.compile(dialect=postgresql.dialect())), 'expenses.date >= %(param_1)s')
+
+    def test_unsupported_sort_key_is_rejected(self):
+        """Test relationships and unindexed columns cannot be used as sort keys."""
+        from app.filters import order_expenses
+
+        for sort_by in ('category', 'user', 'category_id', '__class__'):
+            with self.assertRaises(ValueError):
+                order_expenses(db.session.query(Expenses.id), sort_by, 'asc')
+
+class AmountArithmeticTestCase(unittest.TestCase):
+    """Amounts are stored as integer cents, so totals are exact at any size."""
+
+    SEEDS = (7, 42, 2024)
+    ROWS = 20000
+
+    def setUp(self):
+        self.app = create_app(TestingConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        db.session.add_all([User(id=user_id, user_name=f'user{user_id}', email=f'user{user_id}@example.com')
+                            for user_id in (1, 2, 3)])
+        db.session.add_all([Category(id=category_id, name=f'Category {category_id}') for category_id in range(1, 6)])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def random_amounts(self, rng, count):
+        # Decimal strings as clients send them, from a cent up to a large purchase
+        return [f'{rng.randint(1, 500_000) / 100:.2f}' for _ in range(count)]
+
+    def test_decimal_strings_round_trip(self):
+        """Test every random amount survives parsing and formatting unchanged."""
+        from app.money import format_cents, to_cents
+
+        for seed in self.SEEDS:
+            rng = random.Random(seed)
+            for text in self.random_amounts(rng, self.ROWS):
+                self.assertEqual(format_cents(to_cents(text)), text)
+                self.assertEqual(to_cents(float(text)), to_cents(text))
+
+    def test_invalid_amounts(self):
+        """Test fractions of a cent and non-numbers are rejected."""
+        from app.money import to_cents
+
+        for value in ('1.001', 0.1 + 0.2, 'abc', 'NaN', 'Infinity', None, True, [1]):
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    to_cents(value)
+
+    def test_orm_amounts_are_exact(self):
+        """Test amounts set through the model keep the float column in step with the cents."""
+        rng = random.Random(1)
+        amounts = self.random_amounts(rng, 500)
+        db.session.add_all([
+            Expenses(amount=text if index % 2 else float(text), description='Random', date=datetime(2024, 1, 1),
+                     user_id=1, category_id=1)
+            for index, text in enumerate(amounts)
+        ])
+        db.session.commit()
+
+        rows = db.session.query(Expenses.amount_cents, Expenses.amount_float).order_by(Expenses.id).all()
+        self.assertEqual([cents for cents, _ in rows], [int(Decimal(text) * 100) for text in amounts])
+        self.assertEqual([value for _, value in rows], [float(text) for text in amounts])
+
+    def test_sql_totals_match_exact_sums(self):
+        """Test the dashboard totals over large random datasets equal exact Decimal sums."""
+        from app.dashboard import build_dashboard
+        from app.money import to_cents
+
+        for seed in self.SEEDS:
+            with self.subTest(seed=seed):
+                rng = random.Random(seed)
+                rows = [
+                    {'amount_cents': to_cents(text), 'amount': float(text), 'description': 'Random',
+                     'date': datetime(2024, rng.randint(1, 12), rng.randint(1, 28)),
+                     'user_id': rng.randint(1, 3), 'category_id': rng.randint(1, 5)}
+                    for text in self.random_amounts(rng, self.ROWS)
+                ]
+                db.session.execute(Expenses.__table__.delete())
+                db.session.execute(Expenses.__table__.insert(), rows)
+                db.session.commit()
+
+                expected = {}
+                for row in rows:
+                    if row['user_id'] == 1 and row['date'].month == 6:
+                        key = row['category_id']
+                        expected[key] = expected.get(key, Decimal(0)) + Decimal(row['amount_cents']) / 100
+
+                month = build_dashboard(db.session, 1, datetime(2024, 6, 1), datetime(2024, 7, 1), 5, {})['month']
+                db.session.commit()
+                self.assertEqual({entry['category_id']: Decimal(entry['total']) for entry in month['by_category']},
+                                 expected)
+                self.assertEqual(Decimal(month['total']), sum(expected.values()))
+
+                grand_total = db.session.scalar(db.select(db.func.sum(Expenses.amount_cents)))
+                self.assertEqual(grand_total, sum(row['amount_cents'] for row in rows))
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,5 +1,10 @@
 from datetime import datetime
+import gzip
+import json
+import os
+import tempfile
 import time
+import msgpack
 import unittest
 from flask_jwt_extended import create_access_token
 from app.config import TestingConfig
@@ -370,7 +375,7 @@ class TestExpensesAPI(unittest.TestCase):
         self.assertIn('total', response.get_json())
         self.assertIn('expenses', response.get_json())
         self.assertEqual(response.get_json()['user'], 'testuser')
-        self.assertEqual(response.get_json()['total'], 100.0)  # Expect total to be the sum of expenses
+        self.assertEqual(response.get_json()['total'], '100.00')  # Expect total to be the sum of expenses
         self.assertEqual(len(response.get_json()['expenses']), 1)  # Check the number of expenses
 
     def test_show_expenses_no_user(self):
@@ -569,6 +574,1852 @@ class TestFilterExpenses(unittest.TestCase):
         print("Filtered Expenses for No Match:", expenses)  # Debugging print
         self.assertEqual(len(expenses), 0)  # Expect no expenses
 
+class TestFilterExpensesStreaming(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(TestingConfig)
+        self.app.config['STREAM_YIELD_PER'] = 2
+        self.app.config['STREAM_CHUNK_ROWS'] = 2
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            db.create_all()
+
+            category = Category(name='Food')
+            user = User(user_name='testuser', email='testuser@example.com')
+            db.session.add_all([category, user])
+            db.session.commit()
+
+            # Enough rows to span several fetch batches and written chunks
+            for day in range(1, 6):
+                db.session.add(Expenses(
+                    amount=10 * day,
+                    description=f'Expense {day}',
+                    date=datetime(2024, 10, day),
+                    user_id=user.id,
+                    category_id=category.id
+                ))
+            db.session.commit()
+
+            self.access_token = create_access_token(identity=user.id)
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_json_array_is_streamed(self):
+        response = self.client.get('/filter_expenses', headers={
+            'Authorization': f'Bearer {self.access_token}'
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.mimetype, 'application/json')
+        expenses = response.get_json()
+        self.assertEqual([expense['amount'] for expense in expenses], ['10.00', '20.00', '30.00', '40.00', '50.00'])
+        self.assertEqual(expenses[0]['date'], '2024-10-01')
+
+    def test_ndjson_output(self):
+        response = self.client.get('/filter_expenses', headers={
+            'Authorization': f'Bearer {self.access_token}',
+            'Accept': 'application/x-ndjson'
+        }, query_string={'order': 'desc'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(json.loads(lines[0])['description'], 'Expense 5')
+
+    def test_empty_result_is_valid_json(self):
+        response = self.client.get('/filter_expenses', headers={
+            'Authorization': f'Bearer {self.access_token}'
+        }, query_string={'min_amount': 1000})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), [])
+
+class TestSparseFieldsets(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(TestingConfig)
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            db.create_all()
+
+            category = Category(name='Food')
+            user = User(user_name='testuser', email='testuser@example.com')
+            db.session.add_all([category, user])
+            db.session.commit()
+
+            db.session.add_all([
+                Expenses(amount=12.5, description='Lunch', date=datetime(2024, 10, 1),
+                         user_id=user.id, category_id=category.id),
+                Expenses(amount=30, description='Dinner', date=datetime(2024, 10, 2),
+                         user_id=user.id, category_id=category.id)
+            ])
+            db.session.commit()
+
+            self.headers = {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_filter_expenses_fields(self):
+        response = self.client.get('/filter_expenses', headers=self.headers,
+                                   query_string={'fields': 'id,amount,date'})
+
+        self.assertEqual(response.status_code, 200)
+        expenses = response.get_json()
+        self.assertEqual(set(expenses[0]), {'id', 'amount', 'date'})
+        self.assertEqual(expenses[0]['date'], '2024-10-01')
+
+    def test_columnar_format(self):
+        response = self.client.get('/filter_expenses', headers=self.headers,
+                                   query_string={'format': 'columnar', 'fields': 'id,amount,date'})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(set(data), {'id', 'amount', 'date'})
+        self.assertEqual(data['amount'], ['12.50', '30.00'])
+        self.assertEqual(data['date'], ['2024-10-01', '2024-10-02'])
+        self.assertEqual(len(data['id']), 2)
+
+    def test_invalid_format_is_rejected(self):
+        response = self.client.get('/filter_expenses', headers=self.headers,
+                                   query_string={'format': 'xml'})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get('/filter_expenses', headers=self.headers,
+                                   query_string={'fields': 'id,user'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()['message'], 'Unknown fields: user')
+
+    def test_show_expenses_fields_keep_total(self):
+        response = self.client.get('/expenses', query_string={'user': 'testuser', 'fields': 'description'})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data['total'], '42.50')
+        self.assertEqual(data['expenses'], [{'description': 'Lunch'}, {'description': 'Dinner'}])
+
+    def test_export_csv_fields(self):
+        response = self.client.get('/export/csv', headers=self.headers,
+                                   query_string={'fields': 'category,amount'})
+
+        self.assertEqual(response.status_code, 200)
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertEqual(lines[0], 'Category,Amount')
+        self.assertEqual(lines[1], 'Food,12.50')
+
+class TestMessagePack(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(TestingConfig)
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            db.create_all()
+
+            category = Category(name='Food')
+            user = User(user_name='testuser', email='testuser@example.com')
+            db.session.add_all([category, user])
+            db.session.commit()
+
+            self.category_id = category.id
+            self.headers = {
+                'Authorization': f'Bearer {create_access_token(identity=user.id)}',
+                'Accept': 'application/msgpack'
+            }
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def add_expense(self, amount, description):
+        return self.client.post('/add_expense', headers=self.headers, content_type='application/msgpack',
+                                data=msgpack.packb({
+                                    'user_name': 'testuser',
+                                    'amount': amount,
+                                    'description': description,
+                                    'date': '2024-10-08T00:00:00',
+                                    'Category': self.category_id
+                                }))
+
+    def test_add_expense_msgpack_round_trip(self):
+        response = self.add_expense(25, 'Books')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.mimetype, 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.data), {'message': 'Expense added successfully'})
+
+    def test_mod_expense_msgpack_body(self):
+        self.add_expense(25, 'Books')
+        with self.app.app_context():
+            expense_id = Expenses.query.first().id
+
+        response = self.client.post('/mod_expense', content_type='application/msgpack',
+                                    data=msgpack.packb({'user': 'testuser', 'id': expense_id, 'Amount': 40}))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['message'], 'Expense updated successfully')
+
+    def test_filter_expenses_msgpack_stream(self):
+        self.add_expense(25, 'Books')
+        self.add_expense(75, 'Shoes')
+
+        response = self.client.get('/filter_expenses', headers=self.headers)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/msgpack')
+        unpacker = msgpack.Unpacker()
+        unpacker.feed(response.data)
+        self.assertEqual([row['description'] for row in unpacker], ['Books', 'Shoes'])
+
+    def test_invalid_msgpack_body(self):
+        response = self.client.post('/add_expense', content_type='application/msgpack', data=b'\xc1')
+
+        self.assertEqual(response.status_code, 400)
+
+class TestResponseCompression(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(TestingConfig)
+        self.app.config['STREAM_CHUNK_ROWS'] = 10
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            db.create_all()
+
+            category = Category(name='Food')
+            user = User(user_name='testuser', email='testuser@example.com')
+            db.session.add_all([category, user])
+            db.session.commit()
+
+            db.session.add_all([
+                Expenses(amount=day, description=f'Expense {day}', date=datetime(2024, 10, day),
+                         user_id=user.id, category_id=category.id)
+                for day in range(1, 29)
+            ])
+            db.session.commit()
+
+            self.access_token = create_access_token(identity=user.id)
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def get(self, url, encoding):
+        return self.client.get(url, headers={
+            'Authorization': f'Bearer {self.access_token}',
+            'Accept-Encoding': encoding
+        })
+
+    def test_streamed_json_is_gzipped(self):
+        response = self.get('/filter_expenses', 'gzip')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        expenses = json.loads(gzip.decompress(response.data))
+        self.assertEqual(len(expenses), 28)
+
+    def test_streamed_csv_is_gzipped(self):
+        response = self.get('/export/csv', 'gzip')
+
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        lines = gzip.decompress(response.data).decode('utf-8').splitlines()
+        self.assertEqual(lines[0], 'Description,Date,Amount,Category')
+        self.assertEqual(len(lines), 29)
+
+    def test_small_response_is_not_compressed(self):
+        response = self.get('/profile', 'gzip')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_no_accept_encoding(self):
+        response = self.get('/filter_expenses', 'identity')
+
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(len(response.get_json()), 28)
+
+class TestMetricsEndpoint(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(TestingConfig)
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            db.create_all()
+
+            category = Category(name='Food')
+            user = User(user_name='testuser', email='testuser@example.com')
+            db.session.add_all([category, user])
+            db.session.commit()
+
+            db.session.add(Expenses(amount=10, description='Lunch', date=datetime(2024, 10, 1),
+                                    user_id=user.id, category_id=category.id))
+            db.session.commit()
+
+            self.headers = {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_request_counts_and_histograms(self):
+        self.client.get('/filter_expenses', headers=self.headers).get_data()
+        self.client.get('/filter_expenses', headers=self.headers).get_data()
+        self.client.get('/protected')
+
+        response = self.client.get('/metrics')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain; version=0.0.4'))
+        body = response.get_data(as_text=True)
+        self.assertIn('http_requests_total{endpoint="main.filter_expenses",method="GET",status="200"} 2', body)
+        self.assertIn('http_requests_total{endpoint="main.protected",method="GET",status="401"} 1', body)
+        self.assertIn('http_request_duration_seconds_count{endpoint="main.filter_expenses"} 2', body)
+        self.assertIn('http_request_db_seconds_bucket{endpoint="main.filter_expenses",le="+Inf"} 2', body)
+        # Only the scrape itself is still in flight
+        self.assertIn('http_requests_in_flight 1', body)
+
+    def test_streamed_response_bytes(self):
+        body = self.client.get('/filter_expenses', headers=self.headers).get_data()
+
+        metrics = self.client.get('/metrics').get_data(as_text=True)
+
+        self.assertIn(f'http_response_bytes_total{{endpoint="main.filter_expenses"}} {len(body)}', metrics)
+
+    def test_multiprocess_merge(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.app.config['METRICS_MULTIPROC_DIR'] = directory
+            self.client.get('/protected')
+
+            # Dump left by a worker process that has since exited
+            other = {
+                'in_flight': 3,
+                'requests': [['main.protected', 'GET', 401, 4]],
+                'latency': {}, 'db_time': {}, 'response_bytes': {'main.protected': 100}
+            }
+            with open(os.path.join(directory, 'metrics-999999999.json'), 'w') as f:
+                json.dump(other, f)
+
+            body = self.client.get('/metrics').get_data(as_text=True)
+
+            self.assertIn('http_requests_total{endpoint="main.protected",method="GET",status="401"} 5', body)
+            self.assertIn('http_requests_in_flight 1', body)
+            self.assertTrue(os.path.exists(os.path.join(directory, f'metrics-{os.getpid()}.json')))
+
+    def test_exited_workers_fold_into_one_file(self):
+        metrics = self.app.extensions['metrics']
+        with tempfile.TemporaryDirectory() as directory:
+            self.app.config['METRICS_MULTIPROC_DIR'] = directory
+            worker_file = os.path.join(directory, 'metrics-999999999.json')
+
+            # The same PID exits twice, as when the OS reuses it for a later worker
+            for count in (4, 2):
+                with open(worker_file, 'w') as f:
+                    json.dump({'in_flight': 1, 'requests': [['main.protected', 'GET', 401, count]],
+                               'latency': {}, 'db_time': {}, 'response_bytes': {}}, f)
+                metrics.retire(directory, 999999999)
+                self.assertFalse(os.path.exists(worker_file))
+
+            body = self.client.get('/metrics').get_data(as_text=True)
+            self.assertIn('http_requests_total{endpoint="main.protected",method="GET",status="401"} 6', body)
+            self.assertIn('http_requests_in_flight 1', body)
+
+            metrics.reset(directory)
+            self.assertEqual(os.listdir(directory), [])
+
+class TestSQLStatementAccounting(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(TestingConfig)
+        self.client = self.app.test_client()
+
+        # A deliberately naive view that lazy loads each expense's category
+        def categories_one_by_one():
+            return {'categories': [expense.category.name for expense in Expenses.query.all()]}
+
+        self.app.add_url_rule('/n_plus_one', 'n_plus_one', categories_one_by_one)
+
+        with self.app.app_context():
+            db.create_all()
+
+            user = User(user_name='testuser', email='testuser@example.com')
+            categories = [Category(name=f'Category {i}') for i in range(6)]
+            db.session.add_all([user] + categories)
+            db.session.commit()
+
+            db.session.add_all([
+                Expenses(amount=10, description='Expense', date=datetime(2024, 10, 1),
+                         user_id=user.id, category_id=category.id)
+                for category in categories
+            ])
+            db.session.commit()
+
+            self.headers = {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_statement_headers(self):
+        response = self.client.get('/notifications', headers=self.headers)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['X-SQL-Statements'], '1')
+        self.assertIn('X-SQL-Time-Ms', response.headers)
+        self.assertNotIn('X-SQL-Probable-N-Plus-One', response.headers)
+
+    def test_repeated_statements_are_flagged(self):
+        with self.assertLogs('app.querystats', level='WARNING') as logs:
+            response = self.client.get('/n_plus_one')
+
+        self.assertEqual(response.headers['X-SQL-Statements'], '7')
+        self.assertEqual(response.headers['X-SQL-Probable-N-Plus-One'], '1')
+        self.assertTrue(any('Probable N+1' in line and 'ran 6 times' in line for line in logs.output))
+
+    def test_headers_disabled_in_production(self):
+        self.app.config['SQL_STATS_HEADERS'] = False
+
+        response = self.client.get('/notifications', headers=self.headers)
+
+        self.assertNotIn('X-SQL-Statements', response.headers)
+
+class TestSlowQueryLog(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.log_file = os.path.join(self.directory.name, 'slow.log')
+
+        # EXPLAIN runs on its own connection, which needs a file database rather than :memory:
+        class SlowQueryConfig(TestingConfig):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(self.directory.name, 'test.db')
+            SLOW_QUERY_ENABLED = True
+            SLOW_QUERY_THRESHOLD_MS = 0
+            SLOW_QUERY_LOG_FILE = self.log_file
+
+        self.app = create_app(SlowQueryConfig)
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            db.create_all()
+
+            category = Category(name='Food')
+            user = User(user_name='testuser', email='testuser@example.com')
+            db.session.add_all([category, user])
+            db.session.commit()
+
+            db.session.add(Expenses(amount=10, description='Lunch', date=datetime(2024, 10, 1),
+                                    user_id=user.id, category_id=category.id))
+            db.session.commit()
+
+            self.headers = {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.engine.dispose()
+        self.directory.cleanup()
+
+    def read_records(self):
+        self.app.extensions['slow_query_log'].flush()
+        with open(self.log_file) as f:
+            return [json.loads(line) for line in f]
+
+    def test_slow_statement_is_logged_with_plan(self):
+        self.client.get('/filter_expenses', headers=self.headers, query_string={'min_amount': 5}).get_data()
+
+        records = [record for record in self.read_records() if record['endpoint'] == 'main.filter_expenses']
+        self.assertEqual(len(records), 1)
+        record = records[0]
+        self.assertIn('FROM expenses', record['statement'])
+        self.assertEqual(record['parameters'], ['int', 'int'])
+        self.assertTrue(any('USING INDEX ix_expenses_user_date' in detail for detail in record['plan']))
+        self.assertEqual(record['full_scan'], [])
+
+    def test_full_scan_is_flagged(self):
+        from sqlalchemy import text
+
+        # The app's own queries are all index-backed, so scan from a throwaway view (message is unindexed)
+        def scan_notifications():
+            db.session.execute(text('SELECT count(*) FROM notification WHERE message = :message'),
+                               {'message': 'Large expense'})
+            return ''
+
+        self.app.add_url_rule('/scan', 'scan_notifications', scan_notifications)
+        self.client.get('/scan')
+
+        records = [record for record in self.read_records() if record['endpoint'] == 'scan_notifications']
+        self.assertTrue(any(detail.startswith('SCAN notification') for detail in records[0]['plan']))
+        self.assertEqual(records[0]['full_scan'], ['notification'])
+
+    def test_notifications_use_the_user_index(self):
+        self.client.get('/notifications', headers=self.headers)
+
+        records = [record for record in self.read_records() if record['endpoint'] == 'main.get_notifications']
+        self.assertTrue(any('ix_notification_user_created' in detail for detail in records[0]['plan']))
+        self.assertEqual(records[0]['full_scan'], [])
+
+    def test_statements_below_threshold_are_skipped(self):
+        self.app.config['SLOW_QUERY_THRESHOLD_MS'] = 10000
+
+        self.client.get('/notifications', headers=self.headers)
+
+        self.app.extensions['slow_query_log'].flush()
+        self.assertFalse(any(
+            record['endpoint'] == 'main.get_notifications'
+            for record in (self.read_records() if os.path.exists(self.log_file) else [])
+        ))
+
+    def test_default_file_is_in_the_instance_folder(self):
+        from app.config import CommandConfig
+
+        class DefaultFileConfig(TestingConfig):
+            SLOW_QUERY_ENABLED = True
+            SLOW_QUERY_LOG_FILE = None
+
+        app = create_app(DefaultFileConfig)
+        self.assertEqual(app.extensions['slow_query_log'].path, os.path.join(app.instance_path, 'slow_queries.log'))
+        # Test runs and one-off commands leave no log behind
+        self.assertNotIn('slow_query_log', create_app(TestingConfig).extensions)
+        self.assertNotIn('slow_query_log', create_app(CommandConfig).extensions)
+
+# testing the on-demand request profiler
+class TestRequestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+        class ProfilerConfig(TestingConfig):
+            ADMIN_TOKEN = 'admin-secret'
+            PROFILER_DIR = self.directory.name
+
+        self.app = create_app(ProfilerConfig)
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            db.create_all()
+            category = Category(name='Food')
+            user = User(user_name='testuser', email='testuser@example.com')
+            db.session.add_all([category, user])
+            db.session.commit()
+            db.session.add(Expenses(amount=10, description='Lunch', date=datetime(2024, 10, 1),
+                                    user_id=user.id, category_id=category.id))
+            db.session.commit()
+            self.headers = {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+        self.directory.cleanup()
+
+    def profiles(self, endpoint):
+        folder = os.path.join(self.directory.name, endpoint)
+        return sorted(os.listdir(folder)) if os.path.isdir(folder) else []
+
+    def test_admin_header_writes_pstats_for_endpoint(self):
+        import pstats
+
+        headers = dict(self.headers, **{'X-Profile': '1', 'X-Admin-Token': 'admin-secret'})
+        response = self.client.get('/filter_expenses', headers=headers)
+        response.get_data()
+
+        files = self.profiles('main.filter_expenses')
+        self.assertEqual(len(files), 1)
+        self.assertTrue(files[0].endswith('.pstats'))
+        self.assertEqual(response.headers['X-Profile-File'], os.path.join('main.filter_expenses', files[0]))
+
+        stats = pstats.Stats(os.path.join(self.directory.name, 'main.filter_expenses', files[0]))
+        self.assertTrue(any(name == 'filter_expenses' for _, _, name in stats.stats))
+
+    def test_header_without_admin_token_is_ignored(self):
+        headers = dict(self.headers, **{'X-Profile': '1', 'X-Admin-Token': 'wrong'})
+        response = self.client.get('/filter_expenses', headers=headers)
+        response.get_data()
+
+        self.assertNotIn('X-Profile-File', response.headers)
+        self.assertEqual(self.profiles('main.filter_expenses'), [])
+
+    def test_sample_rate_writes_collapsed_stacks(self):
+        self.app.config['PROFILER_SAMPLE_RATE'] = 1.0
+        self.app.config['PROFILER_MODE'] = 'sampling'
+        self.app.config['PROFILER_SAMPLE_INTERVAL'] = 0.0001
+
+        self.client.get('/filter_expenses', headers=self.headers).get_data()
+
+        files = self.profiles('main.filter_expenses')
+        self.assertEqual(len(files), 1)
+        self.assertTrue(files[0].endswith('.collapsed'))
+        with open(os.path.join(self.directory.name, 'main.filter_expenses', files[0])) as f:
+            for line in f:
+                stack, count = line.rsplit(' ', 1)
+                self.assertGreater(int(count), 0)
+
+# testing the admin memory diagnostics endpoint
+class TestMemoryDiagnostics(unittest.TestCase):
+    def setUp(self):
+        class DiagnosticsConfig(TestingConfig):
+            ADMIN_TOKEN = 'admin-secret'
+
+        self.app = create_app(DiagnosticsConfig)
+        self.client = self.app.test_client()
+        self.admin = {'X-Admin-Token': 'admin-secret'}
+
+        with self.app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        self.client.delete('/admin/memory', headers=self.admin)
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_requires_admin_token(self):
+        self.assertEqual(self.client.get('/admin/memory').status_code, 403)
+        self.assertEqual(self.client.get('/admin/memory', headers={'X-Admin-Token': 'wrong'}).status_code, 403)
+
+    def test_reports_allocation_diff_objects_and_caches(self):
+        first = self.client.get('/admin/memory', headers=self.admin).get_json()
+        self.assertFalse(first['compared_to_previous'])
+        self.assertEqual(first['top_allocations'], [])
+        self.assertIn('jwt_blacklist', first['caches'])
+
+        with self.app.app_context():
+            users = [User(user_name=f'user{i}', email=f'user{i}@example.com') for i in range(50)]
+            leaked = [bytearray(1024) for _ in range(200)]
+
+            second = self.client.get('/admin/memory', headers=self.admin).get_json()
+            self.assertTrue(second['compared_to_previous'])
+            self.assertGreater(second['traced_bytes'], 0)
+            self.assertGreaterEqual(second['objects']['User'], 50)
+            self.assertTrue(any(
+                __file__ in stat['location'][0] and stat['size_diff'] >= 200 * 1024
+                for stat in second['top_allocations']
+            ))
+            del users, leaked
+
+    def test_rejects_unknown_grouping(self):
+        response = self.client.get('/admin/memory', headers=self.admin, query_string={'group_by': 'module'})
+        self.assertEqual(response.status_code, 400)
+
+# testing queued JSON logging
+class TestStructuredLogging(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.log_file = os.path.join(self.directory.name, 'app.log')
+
+        class LoggingConfig(TestingConfig):
+            LOG_LEVEL = 'INFO'
+            LOG_FILE = self.log_file
+            LOG_REQUESTS = True
+
+        self.app = create_app(LoggingConfig)
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            db.create_all()
+            user = User(user_name='testuser', email='testuser@example.com')
+            db.session.add(user)
+            db.session.commit()
+            self.user_id = user.id
+            self.headers = {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+
+    def tearDown(self):
+        self.app.extensions['logging'].stop()
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+        self.directory.cleanup()
+
+    def read_records(self):
+        # Stopping the listener writes out everything still queued
+        self.app.extensions['logging'].stop()
+        with open(self.log_file) as f:
+            return [json.loads(line) for line in f]
+
+    def test_records_carry_request_id_user_and_latency(self):
+        response = self.client.get('/notifications', headers=self.headers)
+        request_id = response.headers['X-Request-ID']
+
+        records = [record for record in self.read_records() if record.get('request_id') == request_id]
+        view_record = next(record for record in records if record['logger'] == 'app.routes')
+        self.assertIn('No notifications found', view_record['message'])
+        self.assertEqual(view_record['level'], 'INFO')
+        self.assertGreaterEqual(view_record['latency_ms'], 0)
+
+        access = next(record for record in records if record['logger'] == 'app.access')
+        self.assertEqual(access['endpoint'], 'main.get_notifications')
+        self.assertEqual(access['status'], 200)
+        self.assertEqual(access['user_id'], self.user_id)
+        self.assertGreaterEqual(access['latency_ms'], view_record['latency_ms'])
+
+    def test_incoming_request_id_is_kept(self):
+        response = self.client.get('/notifications', headers=dict(self.headers, **{'X-Request-ID': 'abc123'}))
+        self.assertEqual(response.headers['X-Request-ID'], 'abc123')
+        self.assertTrue(any(record.get('request_id') == 'abc123' for record in self.read_records()))
+
+    def test_exceptions_are_formatted(self):
+        import logging
+
+        with self.app.test_request_context():
+            try:
+                raise ValueError('broken')
+            except ValueError:
+                logging.getLogger('app.routes').error('Failed', exc_info=True)
+
+        record = next(record for record in self.read_records() if record['message'] == 'Failed')
+        self.assertIn('ValueError: broken', record['exception'])
+
+# testing fork-safe startup and shutdown for the production server
+class TestLifecycle(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+        class ServerConfig(TestingConfig):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(self.directory.name, 'test.db')
+            SCHEDULER_ENABLED = True
+            SCHEDULER_AUTOSTART = False
+
+        self.app = create_app(ServerConfig)
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            db.session.add(User(user_name='testuser', email='testuser@example.com'))
+            db.session.commit()
+
+    def tearDown(self):
+        from app import lifecycle
+
+        lifecycle.shutdown(self.app)
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.engine.dispose()
+        self.directory.cleanup()
+
+    def test_scheduler_runs_only_when_started(self):
+        from app import lifecycle
+
+        scheduler = self.app.extensions['scheduler']
+        self.assertFalse(scheduler.running)
+        lifecycle.start_background(self.app)
+        self.assertTrue(scheduler.running)
+        lifecycle.shutdown(self.app)
+        self.assertFalse(scheduler.running)
+
+    def test_after_fork_resets_pools_and_queues(self):
+        from app import lifecycle
+
+        with self.app.app_context():
+            pool = db.engine.pool
+        log_queue = self.app.extensions['logging'].queue
+
+        lifecycle.after_fork(self.app)
+
+        with self.app.app_context():
+            self.assertIsNot(db.engine.pool, pool)
+            self.assertEqual(User.query.count(), 1)
+        self.assertIsNot(self.app.extensions['logging'].queue, log_queue)
+        self.assertNotIn('scheduler', self.app.extensions)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'requires os.fork')
+    def test_forked_child_uses_its_own_connections(self):
+        from app import lifecycle
+
+        with self.app.app_context():
+            User.query.count()  # Leave a pooled connection behind in the parent
+
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                lifecycle.after_fork(self.app)
+                with self.app.app_context():
+                    status = 0 if User.query.count() == 1 else 1
+            finally:
+                os._exit(status)
+
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+        with self.app.app_context():
+            self.assertEqual(User.query.count(), 1)
+
+# testing full-text search over expense descriptions
+class TestExpenseSearch(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(TestingConfig)
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            db.create_all()
+
+            category = Category(name='Food')
+            user = User(user_name='testuser', email='testuser@example.com')
+            other = User(user_name='otheruser', email='otheruser@example.com')
+            db.session.add_all([category, user, other])
+            db.session.commit()
+
+            for amount, description, day in [
+                (12, 'Lunch at the café', 1),
+                (40, 'Team lunch lunch lunch', 2),
+                (8, 'Coffee beans', 3),
+                (25, 'Lunchbox and groceries', 4),
+            ]:
+                db.session.add(Expenses(amount=amount, description=description, date=datetime(2024, 10, day),
+                                        user_id=user.id, category_id=category.id))
+            db.session.add(Expenses(amount=5, description='Lunch', date=datetime(2024, 10, 1),
+                                    user_id=other.id, category_id=category.id))
+            db.session.commit()
+
+            self.user_name = user.user_name
+            self.headers = {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def search(self, **params):
+        return self.client.get('/expenses/search', headers=self.headers, query_string=params)
+
+    def descriptions(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [expense['description'] for expense in response.get_json()['expenses']]
+
+    def test_prefix_match_is_ranked_and_scoped_to_user(self):
+        found = self.descriptions(self.search(q='lunch'))
+
+        self.assertEqual(found[0], 'Team lunch lunch lunch')
+        self.assertEqual(set(found), {'Team lunch lunch lunch', 'Lunch at the café', 'Lunchbox and groceries'})
+
+    def test_terms_are_combined_and_accents_ignored(self):
+        self.assertEqual(self.descriptions(self.search(q='lun cafe')), ['Lunch at the café'])
+
+    def test_amount_and_date_filters_apply(self):
+        self.assertEqual(self.descriptions(self.search(q='lunch', min_amount=20, end_date='2024-10-03')),
+                         ['Team lunch lunch lunch'])
+
+    def test_index_follows_updates_and_deletes(self):
+        with self.app.app_context():
+            coffee = Expenses.query.filter_by(description='Coffee beans').one()
+            lunch = Expenses.query.filter_by(description='Lunch at the café').one()
+            coffee_id, lunch_id = coffee.id, lunch.id
+
+        self.client.post('/mod_expense', json={'user': self.user_name, 'id': coffee_id, 'Description': 'Tea leaves'})
+        self.client.post('/mod_expense', json={'user': self.user_name, 'id': lunch_id, 'Delete': True})
+
+        self.assertEqual(self.descriptions(self.search(q='coffee')), [])
+        self.assertEqual(self.descriptions(self.search(q='leaves')), ['Tea leaves'])
+        self.assertNotIn('Lunch at the café', self.descriptions(self.search(q='lunch')))
+
+    def test_query_syntax_is_treated_as_text(self):
+        self.assertEqual(self.descriptions(self.search(q='"lunch OR NEAR(coffee')), [])
+        self.assertEqual(self.descriptions(self.search(q='description:coffee')), [])
+        self.assertEqual(self.search(q='  "" ').status_code, 400)
+
+    def test_fallback_matches_wildcards_literally(self):
+        from app.search import match_expenses
+
+        with self.app.app_context():
+            db.session.add_all([Expenses(amount=1, description=description, date=datetime(2024, 10, 5),
+                                         user_id=1, category_id=1) for description in ('a_b', 'axb')])
+            db.session.commit()
+
+            query = match_expenses(db.session.query(Expenses.description), ['a_b'], 'postgresql')
+            self.assertEqual([row.description for row in query], ['a_b'])
+
+    def test_pagination(self):
+        response = self.search(q='lunch', limit=1, offset=1, fields='id')
+        body = response.get_json()
+        self.assertEqual(body['limit'], 1)
+        self.assertEqual(len(body['expenses']), 1)
+        self.assertEqual(list(body['expenses'][0]), ['id'])
+        self.assertEqual(self.search(q='lunch', limit=0).status_code, 400)
+
+# testing sort keys and filters of /filter_expenses
+class TestFilterExpensesSortAndFilters(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(TestingConfig)
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            db.create_all()
+
+            categories = [Category(name='Food'), Category(name='Travel'), Category(name='Rent')]
+            user = User(user_name='testuser', email='testuser@example.com')
+            db.session.add_all(categories + [user])
+            db.session.commit()
+
+            for amount, description, when, category in [
+                (12, 'Lunch', datetime(2024, 9, 30), categories[0]),
+                (12, 'Lunchbox', datetime(2024, 10, 1), categories[0]),
+                (300, 'Train 100%', datetime(2024, 10, 15), categories[1]),
+                (900, 'Rent', datetime(2024, 10, 31, 23, 59), categories[2]),
+                (5, 'Coffee', datetime(2025, 1, 1), categories[0]),
+            ]:
+                db.session.add(Expenses(amount=amount, description=description, date=when,
+                                        user_id=user.id, category_id=category.id))
+            db.session.commit()
+
+            self.category_ids = [category.id for category in categories]
+            self.headers = {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def descriptions(self, **params):
+        response = self.client.get('/filter_expenses', headers=self.headers, query_string=params)
+        self.assertEqual(response.status_code, 200)
+        return [expense['description'] for expense in json.loads(response.get_data())]
+
+    def test_ties_are_broken_by_id_in_sort_direction(self):
+        self.assertEqual(self.descriptions(sort_by='amount', order='desc')[-3:], ['Lunchbox', 'Lunch', 'Coffee'])
+        self.assertEqual(self.descriptions(sort_by='amount')[:3], ['Coffee', 'Lunch', 'Lunchbox'])
+
+    def test_unsupported_sort_key_is_rejected(self):
+        for sort_by in ('category', 'user', 'password_hash'):
+            response = self.client.get('/filter_expenses', headers=self.headers, query_string={'sort_by': sort_by})
+            self.assertEqual(response.status_code, 400)
+        response = self.client.get('/filter_expenses', headers=self.headers, query_string={'order': 'sideways'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_period_granularities(self):
+        self.assertEqual(self.descriptions(period='2024-10'), ['Lunchbox', 'Train 100%', 'Rent'])
+        self.assertEqual(self.descriptions(period='2024-09-30'), ['Lunch'])
+        self.assertEqual(self.descriptions(period='2025'), ['Coffee'])
+        response = self.client.get('/filter_expenses', headers=self.headers, query_string={'period': '10/2024'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_multiple_categories(self):
+        food, travel, rent = self.category_ids
+        self.assertEqual(self.descriptions(category_id=[travel, rent]), ['Train 100%', 'Rent'])
+        self.assertEqual(self.descriptions(category_id=f'{travel},{rent}', sort_by='id', order='desc'),
+                         ['Rent', 'Train 100%'])
+
+    def test_description_prefix(self):
+        self.assertEqual(self.descriptions(description_prefix='lunch', sort_by='description'), ['Lunch', 'Lunchbox'])
+        self.assertEqual(self.descriptions(description_prefix='Train 100%'), ['Train 100%'])
+        self.assertEqual(self.descriptions(description_prefix='%'), [])
+
+class TestCategoryCatalog(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(TestingConfig)
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            db.create_all()
+
+            food = Category(name='Food')
+            travel = Category(name='Travel')
+            user = User(user_name='testuser', email='testuser@example.com')
+            db.session.add_all([food, travel, user])
+            db.session.commit()
+
+            db.session.add_all([
+                Expenses(amount=12, description='Lunch', date=datetime(2024, 10, 1),
+                         user_id=user.id, category_id=food.id),
+                Expenses(amount=90, description='Train', date=datetime(2024, 10, 2),
+                         user_id=user.id, category_id=travel.id),
+            ])
+            db.session.commit()
+
+            self.food_id = food.id
+            self.travel_id = travel.id
+            self.user_id = user.id
+            self.headers = {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def rename(self, category_id, name):
+        with self.app.app_context():
+            db.session.get(Category, category_id).name = name
+            db.session.commit()
+
+    def test_categories_are_listed_with_an_etag(self):
+        response = self.client.get('/categories')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['categories'],
+                         [{'id': self.food_id, 'name': 'Food'}, {'id': self.travel_id, 'name': 'Travel'}])
+        self.assertTrue(response.headers['ETag'].startswith('W/"'))
+
+        revalidated = self.client.get('/categories', headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated.data, b'')
+
+    def test_catalog_is_not_queried_again_until_a_category_changes(self):
+        catalog = self.app.extensions['category_catalog']
+        first = self.client.get('/categories')
+
+        with self.app.app_context():
+            names = catalog.names()
+        with self.app.app_context():
+            self.assertIs(catalog.names(), names)
+
+        self.rename(self.food_id, 'Groceries')
+        second = self.client.get('/categories')
+        self.assertNotEqual(second.headers['ETag'], first.headers['ETag'])
+        self.assertEqual(second.get_json()['categories'][0]['name'], 'Groceries')
+        self.assertEqual(self.client.get('/categories', headers={'If-None-Match': first.headers['ETag']}).status_code, 200)
+
+    def test_created_category_is_picked_up(self):
+        self.client.get('/categories')
+        with self.app.app_context():
+            db.session.add(Category(name='Rent'))
+            db.session.commit()
+
+        names = [category['name'] for category in self.client.get('/categories').get_json()['categories']]
+        self.assertEqual(names, ['Food', 'Travel', 'Rent'])
+
+    def test_etag_depends_only_on_content(self):
+        first = self.client.get('/categories').headers['ETag']
+
+        # A fresh load, as another worker process would do, hands out the same tag
+        self.app.extensions['category_catalog'].invalidate()
+        self.assertEqual(self.client.get('/categories').headers['ETag'], first)
+
+        self.rename(self.food_id, 'Groceries')
+        self.rename(self.food_id, 'Food')
+        self.assertEqual(self.client.get('/categories').headers['ETag'], first)
+
+    def test_csv_export_uses_catalog_names(self):
+        self.rename(self.travel_id, 'Transport')
+        response = self.client.get('/export/csv', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertEqual(lines[0], 'Description,Date,Amount,Category')
+        self.assertEqual(lines[1:], ['Lunch,2024-10-01,12.00,Food', 'Train,2024-10-02,90.00,Transport'])
+
+    def test_add_expense_accepts_category_name(self):
+        response = self.client.post('/add_expense', json={
+            'user_name': 'testuser', 'amount': 4, 'description': 'Bus', 'date': '2024-10-03T08:00:00',
+            'Category': 'travel'
+        })
+        self.assertEqual(response.status_code, 201)
+        with self.app.app_context():
+            expense = Expenses.query.filter_by(description='Bus').one()
+            self.assertEqual(expense.category_id, self.travel_id)
+
+        response = self.client.post('/add_expense', json={
+            'user_name': 'testuser', 'amount': 4, 'description': 'Bus', 'date': '2024-10-03T08:00:00',
+            'Category': 'Unknown'
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()['message'], 'Unknown category')
+
+class TestUserIdCache(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(TestingConfig)
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            db.create_all()
+
+            category = Category(name='Food')
+            user = User(user_name='testuser', email='testuser@example.com')
+            db.session.add_all([category, user])
+            db.session.commit()
+
+            self.category_id = category.id
+            self.headers = {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+
+        self.cache = self.app.extensions['user_ids']
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def add_expense(self, user_name, description='Groceries'):
+        return self.client.post('/add_expense', json={
+            'user_name': user_name, 'amount': 10, 'description': description,
+            'date': '2024-10-08T00:00:00', 'Category': self.category_id
+        })
+
+    def test_unknown_user_is_rejected(self):
+        response = self.add_expense('nobody')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.get_json()['message'], 'User nobody not found')
+        self.assertEqual(len(self.cache), 0)  # Misses are not cached
+
+    def test_repeated_lookups_hit_the_cache(self):
+        self.assertEqual(self.add_expense('testuser').status_code, 201)
+        self.assertEqual(self.add_expense('testuser', 'Snacks').status_code, 201)
+
+        response = self.client.get('/expenses?user=testuser')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.get_json()['expenses']), 2)
+        self.assertEqual(self.cache.misses, 1)
+        self.assertGreaterEqual(self.cache.hits, 2)
+
+    def test_listing_does_not_join_user(self):
+        self.add_expense('testuser')
+
+        self.app.config['SQL_STATS_HEADERS'] = True
+        response = self.client.get('/expenses?user=testuser')
+        self.assertEqual(response.headers['X-SQL-Statements'], '1')
+
+    def test_rename_invalidates_the_old_name(self):
+        self.add_expense('testuser')
+        response = self.client.put('/profile', headers=self.headers,
+                                   json={'user_name': 'renamed', 'email': 'testuser@example.com'})
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.add_expense('testuser').status_code, 404)
+        self.assertEqual(self.add_expense('renamed').status_code, 201)
+        self.assertEqual(self.client.get('/expenses?user=testuser').status_code, 404)
+
+    def test_cache_is_bounded(self):
+        self.app.config['USER_ID_CACHE_SIZE'] = 2
+        with self.app.app_context():
+            db.session.add_all([User(user_name=f'user{i}', email=f'user{i}@example.com') for i in range(3)])
+            db.session.commit()
+
+            for name in ('user0', 'user1', 'user0', 'user2'):
+                self.cache.resolve(name)
+        self.assertEqual(list(self.cache._entries), ['user0', 'user2'])
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(TestingConfig)
+        self.app.config['ADMIN_TOKEN'] = 'admin-secret'
+        self.app.config['SQL_STATS_HEADERS'] = True
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            db.create_all()
+
+            category = Category(name='Food')
+            user = User(user_name='testuser', email='testuser@example.com')
+            other = User(user_name='otheruser', email='otheruser@example.com')
+            db.session.add_all([category, user, other])
+            db.session.commit()
+
+            for owner in (user, other):
+                db.session.add(Expenses(amount=10, description='Lunch', date=datetime(2024, 10, 1),
+                                        user_id=owner.id, category_id=category.id))
+                db.session.add(Notification(user_id=owner.id, message='Large expense', type='alert'))
+            db.session.commit()
+
+            self.user_id = user.id
+            self.other_id = other.id
+            self.category_id = category.id
+            self.headers = {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+
+        self.cache = self.app.extensions['result_cache']
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_repeated_read_is_served_without_sql(self):
+        first = self.client.get('/profile', headers=self.headers)
+        second = self.client.get('/profile', headers=self.headers)
+
+        self.assertEqual(first.headers['X-Cache'], 'miss')
+        self.assertEqual(second.headers['X-Cache'], 'hit')
+        self.assertEqual(second.headers['X-SQL-Statements'], '0')
+        self.assertEqual(second.get_json(), first.get_json())
+
+    def test_commit_invalidates_the_users_entries(self):
+        self.client.get('/profile', headers=self.headers)
+        self.client.put('/profile', headers=self.headers,
+                        json={'user_name': 'renamed', 'email': 'testuser@example.com'})
+
+        response = self.client.get('/profile', headers=self.headers)
+        self.assertEqual(response.headers['X-Cache'], 'miss')
+        self.assertEqual(response.get_json()['user_name'], 'renamed')
+
+    def test_notification_update_invalidates_listing(self):
+        notifications = self.client.get('/notifications', headers=self.headers).get_json()
+        self.client.patch(f"/notifications/{notifications[0]['id']}/read", headers=self.headers)
+
+        response = self.client.get('/notifications', headers=self.headers)
+        self.assertEqual(response.headers['X-Cache'], 'miss')
+        self.assertTrue(response.get_json()[0]['is_read'])
+
+    def test_other_users_changes_keep_the_entry(self):
+        self.client.get('/expenses?user=testuser')
+        with self.app.app_context():
+            db.session.add(Expenses(amount=3, description='Tea', date=datetime(2024, 10, 2),
+                                    user_id=self.other_id, category_id=self.category_id))
+            db.session.commit()
+        self.assertEqual(self.client.get('/expenses?user=testuser').headers['X-Cache'], 'hit')
+
+        with self.app.app_context():
+            db.session.add(Expenses(amount=3, description='Tea', date=datetime(2024, 10, 2),
+                                    user_id=self.user_id, category_id=self.category_id))
+            db.session.commit()
+        response = self.client.get('/expenses?user=testuser')
+        self.assertEqual(response.headers['X-Cache'], 'miss')
+        self.assertEqual(response.get_json()['total'], '13.00')
+
+    def test_key_covers_arguments_and_format(self):
+        self.client.get('/filter_expenses?format=columnar&fields=id,amount', headers=self.headers)
+        reordered = self.client.get('/filter_expenses?fields=id,amount&format=columnar', headers=self.headers)
+        self.assertEqual(reordered.headers['X-Cache'], 'hit')
+
+        packed = self.client.get('/filter_expenses?format=columnar&fields=id,amount',
+                                 headers={**self.headers, 'Accept': 'application/msgpack'})
+        self.assertEqual(packed.headers['X-Cache'], 'miss')
+        self.assertEqual(msgpack.unpackb(packed.data)['amount'], ['10.00'])
+
+    def test_streamed_responses_bypass_the_cache(self):
+        self.client.get('/filter_expenses', headers=self.headers)
+        response = self.client.get('/filter_expenses', headers=self.headers)
+
+        self.assertTrue(response.is_streamed)
+        self.assertNotIn('X-Cache', response.headers)
+        self.assertEqual((self.cache.hits, self.cache.misses, self.cache.stores), (0, 0, 0))
+
+    def test_stats_endpoint(self):
+        self.client.get('/profile', headers=self.headers)
+        self.client.get('/profile', headers=self.headers)
+
+        self.assertEqual(self.client.get('/admin/cache').status_code, 403)
+        stats = self.client.get('/admin/cache', headers={'X-Admin-Token': 'admin-secret'}).get_json()
+        self.assertEqual((stats['backend'], stats['entries'], stats['hits'], stats['misses']), ('memory', 1, 1, 1))
+
+        self.client.delete('/admin/cache', headers={'X-Admin-Token': 'admin-secret'})
+        self.assertEqual(self.client.get('/profile', headers=self.headers).headers['X-Cache'], 'miss')
+
+    def test_memory_backend_evicts_least_recently_used_and_expired(self):
+        from app.resultcache import MemoryBackend
+
+        backend = MemoryBackend(max_entries=2)
+        backend.set('a', 1, 60)
+        backend.set('b', 2, 60)
+        backend.get('a')
+        backend.set('c', 3, 60)
+        self.assertIsNone(backend.get('b'))
+        self.assertEqual((backend.get('a'), backend.get('c')), (1, 3))
+
+        backend.set('d', 4, 0)
+        self.assertIsNone(backend.get('d'))
+        self.assertEqual(backend.evictions, 3)  # 'b', then 'a' to make room for 'd', then the expired 'd'
+
+    def test_sqlite_backends_on_one_path_share_generations(self):
+        from app.config import ProductionConfig
+        from app.resultcache import SQLiteBackend
+
+        # Production runs several workers, so it must not default to the per-process memory backend
+        if not os.environ.get('RESULT_CACHE_BACKEND'):
+            self.assertEqual(ProductionConfig.RESULT_CACHE_BACKEND, 'sqlite')
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cache.db')
+            first, second = SQLiteBackend(path, 100), SQLiteBackend(path, 100)
+            self.assertEqual(second.generations(['expenses:1']), [0])
+
+            first.bump(['expenses:1'])
+            self.assertEqual(second.generations(['expenses:1', 'expenses:2']), [1, 0])
+            second.bump(['expenses:1'])
+            self.assertEqual(first.generations(['expenses:1']), [2])
+
+    def test_sqlite_backend_starts_over_for_another_database(self):
+        from app.resultcache import SQLiteBackend, cache_path
+
+        self.assertEqual(cache_path(self.app), os.path.join(self.app.instance_path, 'result_cache.db'))
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cache.db')
+            backend = SQLiteBackend(path, 100, database='sqlite:///first.db')
+            backend.bump(['expenses:1'])
+            backend.set('key', b'body', 60)
+
+            self.assertEqual(SQLiteBackend(path, 100, database='sqlite:///first.db').generations(['expenses:1']), [1])
+            other = SQLiteBackend(path, 100, database='sqlite:///second.db')
+            self.assertEqual(other.generations(['expenses:1']), [0])
+            self.assertIsNone(other.get('key'))
+
+    def test_sqlite_backend_is_shared_between_processes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            class SharedCacheConfig(TestingConfig):
+                RESULT_CACHE_BACKEND = 'sqlite'
+                RESULT_CACHE_PATH = os.path.join(directory, 'cache.db')
+
+            # Two apps stand in for two workers; each has its own in-memory database
+            workers = [create_app(SharedCacheConfig) for _ in range(2)]
+            for app in workers:
+                with app.app_context():
+                    db.create_all()
+                    db.session.add(User(user_name='testuser', email='testuser@example.com'))
+                    db.session.commit()
+            with workers[0].app_context():
+                headers = {'Authorization': f'Bearer {create_access_token(identity=1)}'}
+
+            clients = [app.test_client() for app in workers]
+            self.assertEqual(clients[0].get('/profile', headers=headers).headers['X-Cache'], 'miss')
+            self.assertEqual(clients[1].get('/profile', headers=headers).headers['X-Cache'], 'hit')
+
+            with workers[1].app_context():
+                db.session.get(User, 1).email = 'changed@example.com'
+                db.session.commit()
+            self.assertEqual(clients[0].get('/profile', headers=headers).headers['X-Cache'], 'miss')
+
+            for app in workers:
+                with app.app_context():
+                    db.session.remove()
+                    db.drop_all()
+
+class TestDashboard(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(TestingConfig)
+        self.app.config['SQL_STATS_HEADERS'] = True
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            db.create_all()
+
+            food = Category(name='Food')
+            travel = Category(name='Travel')
+            user = User(user_name='testuser', email='testuser@example.com')
+            other = User(user_name='otheruser', email='otheruser@example.com')
+            db.session.add_all([food, travel, user, other])
+            db.session.commit()
+
+            for amount, description, day, category in [
+                (12.5, 'Lunch', datetime(2024, 10, 1), food),
+                (7.25, 'Coffee', datetime(2024, 10, 3), food),
+                (90, 'Train', datetime(2024, 10, 2), travel),
+                (40, 'Dinner', datetime(2024, 9, 30), food),
+            ]:
+                db.session.add(Expenses(amount=amount, description=description, date=day,
+                                        user_id=user.id, category_id=category.id))
+            db.session.add(Expenses(amount=500, description='Flight', date=datetime(2024, 10, 5),
+                                    user_id=other.id, category_id=travel.id))
+
+            for minute, is_read in [(1, False), (2, True), (3, False)]:
+                db.session.add(Notification(user_id=user.id, message=f'Notice {minute}', type='alert',
+                                            created_at=datetime(2024, 10, 1, 12, minute), is_read=is_read))
+            db.session.add(Notification(user_id=other.id, message='Other', type='alert'))
+            db.session.commit()
+
+            self.food_id = food.id
+            self.travel_id = travel.id
+            self.headers = {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+            self.missing_headers = {'Authorization': f'Bearer {create_access_token(identity=999)}'}
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def dashboard(self, **params):
+        return self.client.get('/dashboard', headers=self.headers, query_string=params)
+
+    def test_dashboard_contents(self):
+        response = self.dashboard(month='2024-10', limit=2)
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+
+        self.assertEqual(data['profile']['user_name'], 'testuser')
+        self.assertEqual(data['unread_notifications'], 2)
+        self.assertEqual(data['month'], {
+            'period': '2024-10',
+            'total': '109.75',
+            'by_category': [
+                {'category_id': self.food_id, 'category': 'Food', 'total': '19.75', 'count': 2},
+                {'category_id': self.travel_id, 'category': 'Travel', 'total': '90.00', 'count': 1},
+            ],
+        })
+        self.assertEqual([expense['description'] for expense in data['recent_expenses']], ['Coffee', 'Train'])
+        self.assertEqual(data['recent_expenses'][0]['category'], 'Food')
+        self.assertEqual([notification['message'] for notification in data['recent_notifications']],
+                         ['Notice 3', 'Notice 2'])
+
+    def test_queries_run_in_one_read_transaction(self):
+        self.client.get('/categories')  # Load the category catalog first
+        response = self.dashboard(month='2024-10')
+
+        # BEGIN plus profile with the unread count, monthly totals, recent expenses and recent notifications
+        self.assertEqual(response.headers['X-SQL-Statements'], '5')
+        self.assertNotIn('X-SQL-Probable-N-Plus-One', response.headers)
+
+    def test_month_without_expenses(self):
+        data = self.dashboard(month='2023-01').get_json()
+        self.assertEqual(data['month'], {'period': '2023-01', 'total': '0.00', 'by_category': []})
+
+    def test_defaults_to_current_month(self):
+        data = self.dashboard().get_json()
+        self.assertEqual(data['month']['period'], datetime.utcnow().strftime('%Y-%m'))
+        self.assertEqual(len(data['recent_expenses']), 4)
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.dashboard(month='2024-13').status_code, 400)
+        self.assertEqual(self.dashboard(month='2024').status_code, 400)
+        self.assertEqual(self.dashboard(limit=0).status_code, 400)
+
+    def test_missing_user(self):
+        response = self.client.get('/dashboard', headers=self.missing_headers)
+        self.assertEqual(response.status_code, 404)
+
+    def test_cached_until_an_expense_changes(self):
+        self.dashboard(month='2024-10')
+        self.assertEqual(self.dashboard(month='2024-10').headers['X-Cache'], 'hit')
+
+        self.client.post('/add_expense', json={
+            'user_name': 'testuser', 'amount': 1, 'description': 'Gum', 'date': '2024-10-04T00:00:00',
+            'Category': self.food_id
+        })
+        response = self.dashboard(month='2024-10')
+        self.assertEqual(response.headers['X-Cache'], 'miss')
+        self.assertEqual(response.get_json()['month']['total'], '110.75')
+
+    def test_default_month_is_part_of_the_cache_key(self):
+        from unittest import mock
+        from app import routes
+
+        def at(moment):
+            class FrozenDatetime(datetime):
+                @classmethod
+                def utcnow(cls):
+                    return moment
+            return mock.patch.object(routes, 'datetime', FrozenDatetime)
+
+        with at(datetime(2024, 10, 31, 23, 59)):
+            self.dashboard()
+            self.assertEqual(self.dashboard().headers['X-Cache'], 'hit')
+        # The same query string after the month rolls over must not reuse October's response
+        with at(datetime(2024, 11, 1)):
+            response = self.dashboard()
+        self.assertEqual(response.headers['X-Cache'], 'miss')
+        self.assertEqual(response.get_json()['month']['period'], '2024-11')
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(TestingConfig)
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            db.create_all()
+
+            category = Category(name='Food')
+            user = User(user_name='testuser', email='testuser@example.com')
+            db.session.add_all([category, user])
+            db.session.commit()
+
+            expense = Expenses(amount=10, description='Lunch', date=datetime(2024, 10, 1),
+                               user_id=user.id, category_id=category.id)
+            db.session.add(expense)
+            db.session.commit()
+
+            self.category_id = category.id
+            self.expense_id = expense.id
+            self.headers = {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def add(self, description, amount=5):
+        return {'method': 'POST', 'path': '/add_expense', 'body': {
+            'user_name': 'testuser', 'amount': amount, 'description': description,
+            'date': '2024-10-02T00:00:00', 'Category': self.category_id
+        }}
+
+    def batch(self, requests, **options):
+        return self.client.post('/batch', headers=self.headers, json={'requests': requests, **options})
+
+    def descriptions(self):
+        with self.app.app_context():
+            return sorted(description for description, in db.session.query(Expenses.description))
+
+    def test_items_run_in_order_with_their_own_status(self):
+        response = self.batch([
+            self.add('Coffee'),
+            {'method': 'POST', 'path': '/add_expense', 'body': {'user_name': 'testuser'}},
+            {'method': 'POST', 'path': '/mod_expense', 'body': {'user': 'testuser', 'id': self.expense_id,
+                                                                'Description': 'Brunch'}},
+            {'path': '/expenses', 'query': {'user': 'testuser', 'fields': 'description'}},
+        ])
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertTrue(data['committed'])
+        self.assertEqual([item['status'] for item in data['responses']], [201, 400, 200, 200])
+        self.assertEqual(data['responses'][1]['body']['message'], 'Missing required fields')
+        self.assertEqual(sorted(expense['description'] for expense in data['responses'][3]['body']['expenses']),
+                         ['Brunch', 'Coffee'])
+        self.assertEqual(self.descriptions(), ['Brunch', 'Coffee'])
+
+    def test_atomic_batch_commits_once(self):
+        from sqlalchemy import event
+
+        commits = []
+        with self.app.app_context():
+            event.listen(db.engine, 'commit', lambda connection: commits.append(connection))
+
+        response = self.batch([self.add(f'Item {number}') for number in range(20)], atomic=True)
+        self.assertTrue(response.get_json()['committed'])
+        self.assertEqual(len(commits), 1)
+        self.assertEqual(len(self.descriptions()), 21)
+
+    def test_atomic_batch_rolls_back_on_failure(self):
+        response = self.batch([
+            self.add('Coffee'),
+            {'method': 'POST', 'path': '/add_expense', 'body': {'user_name': 'nobody', 'amount': 1,
+                                                                'description': 'x', 'date': '2024-10-02T00:00:00',
+                                                                'Category': self.category_id}},
+            self.add('Tea'),
+        ], atomic=True)
+
+        data = response.get_json()
+        self.assertFalse(data['committed'])
+        self.assertEqual([item['status'] for item in data['responses']], [201, 404, 424])
+        self.assertEqual(self.descriptions(), ['Lunch'])
+
+    def test_jwt_is_verified_once(self):
+        from unittest import mock
+        import flask_jwt_extended.view_decorators as view_decorators
+
+        with mock.patch.object(view_decorators, 'verify_jwt_in_request',
+                               wraps=view_decorators.verify_jwt_in_request) as verify:
+            response = self.batch([{'path': '/profile'}, {'path': '/notifications'}, {'path': '/dashboard'}])
+
+        self.assertEqual([item['status'] for item in response.get_json()['responses']], [200, 200, 200])
+        self.assertEqual(response.get_json()['responses'][0]['body']['user_name'], 'testuser')
+        self.assertEqual(verify.call_count, 1)
+
+    def test_batch_requires_a_token(self):
+        response = self.client.post('/batch', json={'requests': [{'path': '/profile'}]})
+        self.assertEqual(response.status_code, 401)
+
+    def test_invalid_items(self):
+        self.assertEqual(self.batch([]).status_code, 400)
+        self.assertEqual(self.batch([{'method': 'GET'}]).status_code, 400)
+
+        self.app.config['BATCH_MAX_REQUESTS'] = 2
+        self.assertEqual(self.batch([{'path': '/profile'}] * 3).status_code, 400)
+
+    def test_unknown_and_nested_requests(self):
+        response = self.batch([{'path': '/missing'}, {'method': 'POST', 'path': '/batch', 'body': {}},
+                               {'method': 'DELETE', 'path': '/profile'}])
+        self.assertEqual([item['status'] for item in response.get_json()['responses']], [404, 400, 405])
+
+    def test_atomic_commit_invalidates_cached_reads(self):
+        self.client.get('/profile', headers=self.headers)
+        self.batch([{'method': 'PUT', 'path': '/profile',
+                     'body': {'user_name': 'renamed', 'email': 'testuser@example.com'}}], atomic=True)
+
+        response = self.client.get('/profile', headers=self.headers)
+        self.assertEqual(response.headers['X-Cache'], 'miss')
+        self.assertEqual(response.get_json()['user_name'], 'renamed')
+
+class TestChangeFeed(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(TestingConfig)
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            db.create_all()
+
+            category = Category(name='Food')
+            user = User(user_name='testuser', email='testuser@example.com')
+            other = User(user_name='otheruser', email='otheruser@example.com')
+            db.session.add_all([category, user, other])
+            db.session.commit()
+
+            self.category_id = category.id
+            self.other_id = other.id
+            self.headers = {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def add(self, description, amount=5, user_name='testuser'):
+        response = self.client.post('/add_expense', json={
+            'user_name': user_name, 'amount': amount, 'description': description,
+            'date': '2024-10-02T00:00:00', 'Category': self.category_id
+        })
+        self.assertEqual(response.status_code, 201)
+        with self.app.app_context():
+            return db.session.query(Expenses.id).filter_by(description=description).scalar()
+
+    def changes(self, **params):
+        response = self.client.get('/changes', headers=self.headers, query_string=params)
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()
+
+    def summary(self, feed):
+        return [(change['type'], change['op'], change['id']) for change in feed['changes']]
+
+    def test_inserts_updates_and_deletes_after_cursor(self):
+        lunch = self.add('Lunch')
+        coffee = self.add('Coffee')
+        first = self.changes()
+        self.assertEqual(self.summary(first), [('expense', 'upsert', lunch), ('expense', 'upsert', coffee)])
+        self.assertEqual(first['changes'][0]['data']['description'], 'Lunch')
+        self.assertFalse(first['has_more'])
+
+        self.client.post('/mod_expense', json={'user': 'testuser', 'id': lunch, 'Description': 'Brunch'})
+        self.client.post('/mod_expense', json={'user': 'testuser', 'id': coffee, 'Delete': True})
+        second = self.changes(since=first['cursor'])
+        self.assertEqual(self.summary(second), [('expense', 'upsert', lunch), ('expense', 'delete', coffee)])
+        self.assertEqual(second['changes'][0]['data']['description'], 'Brunch')
+
+        self.assertEqual(self.changes(since=second['cursor']), {'changes': [], 'cursor': second['cursor'],
+                                                                'has_more': False})
+
+    def test_notifications_and_their_deletion(self):
+        with self.app.app_context():
+            user_id = User.query.filter_by(user_name='testuser').one().id
+            notification = Notification(user_id=user_id, message='Large expense', type='alert')
+            db.session.add(notification)
+            db.session.commit()
+            notification_id = notification.id
+
+        cursor = self.changes()['cursor']
+        self.client.patch(f'/notifications/{notification_id}/read', headers=self.headers)
+        read = self.changes(since=cursor)
+        self.assertEqual(self.summary(read), [('notification', 'upsert', notification_id)])
+        self.assertTrue(read['changes'][0]['data']['is_read'])
+
+        self.client.delete(f'/notifications/{notification_id}', headers=self.headers)
+        self.assertEqual(self.summary(self.changes(since=read['cursor'])),
+                         [('notification', 'delete', notification_id)])
+
+    def test_paging_follows_the_cursor(self):
+        ids = [self.add(f'Item {number}') for number in range(5)]
+
+        seen = []
+        cursor = 0
+        while True:
+            page = self.changes(since=cursor, limit=2)
+            seen += [change['id'] for change in page['changes']]
+            cursor = page['cursor']
+            if not page['has_more']:
+                break
+        self.assertEqual(seen, ids)
+
+    def test_other_users_changes_are_excluded(self):
+        self.add('Theirs', user_name='otheruser')
+        self.assertEqual(self.changes()['changes'], [])
+
+    def test_unchanged_rows_keep_their_number(self):
+        lunch = self.add('Lunch')
+        cursor = self.changes()['cursor']
+        self.client.post('/mod_expense', json={'user': 'testuser', 'id': lunch})  # No fields to change
+        self.assertEqual(self.changes(since=cursor)['changes'], [])
+
+    def test_raw_sql_writes_are_numbered(self):
+        from sqlalchemy import text
+
+        lunch = self.add('Lunch')
+        cursor = self.changes()['cursor']
+        # Writes that never pass through the session's flush, as an older release or a script would make them
+        with self.app.app_context():
+            db.session.execute(text(
+                "INSERT INTO expenses (amount, amount_cents, description, date, user_id, category_id) "
+                "VALUES (2, 200, 'Tea', '2024-10-03 00:00:00.000000', 1, :category)"), {'category': self.category_id})
+            db.session.execute(text("UPDATE expenses SET description = 'Late lunch' WHERE id = :id"), {'id': lunch})
+            db.session.commit()
+            tea = db.session.query(Expenses.id).filter_by(description='Tea').scalar()
+
+        feed = self.changes(since=cursor)
+        self.assertEqual(self.summary(feed), [('expense', 'upsert', tea), ('expense', 'upsert', lunch)])
+        self.assertEqual(feed['changes'][1]['data']['description'], 'Late lunch')
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get('/changes?since=-1', headers=self.headers).status_code, 400)
+        self.assertEqual(self.client.get('/changes?limit=0', headers=self.headers).status_code, 400)
+
+class TestBulkExpenses(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(TestingConfig)
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            db.create_all()
+
+            food = Category(name='Food')
+            travel = Category(name='Travel')
+            user = User(user_name='testuser', email='testuser@example.com')
+            other = User(user_name='otheruser', email='otheruser@example.com')
+            db.session.add_all([food, travel, user, other])
+            db.session.commit()
+
+            self.food_id, self.travel_id = food.id, travel.id
+            expenses = [
+                Expenses(amount=5, description='Lunch', date=datetime(2024, 10, 2), user_id=user.id, category_id=food.id),
+                Expenses(amount=7, description='Dinner', date=datetime(2024, 10, 20), user_id=user.id, category_id=food.id),
+                Expenses(amount=90, description='Train', date=datetime(2024, 11, 3), user_id=user.id, category_id=food.id),
+                Expenses(amount=4, description='Lunch', date=datetime(2024, 10, 2), user_id=other.id, category_id=food.id),
+            ]
+            db.session.add_all(expenses)
+            db.session.commit()
+
+            self.ids = [expense.id for expense in expenses[:3]]
+            self.other_expense_id = expenses[3].id
+            self.headers = {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def bulk(self, body, **filters):
+        return self.client.post('/expenses/bulk', json=body, query_string=filters, headers=self.headers)
+
+    def categories(self):
+        with self.app.app_context():
+            return dict(db.session.query(Expenses.id, Expenses.category_id).all())
+
+    def test_recategorize_by_filter(self):
+        response = self.bulk({'action': 'recategorize', 'Category': 'travel'}, period='2024-10')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {'action': 'recategorize', 'affected': 2})
+
+        categories = self.categories()
+        self.assertEqual([categories[expense_id] for expense_id in self.ids], [self.travel_id, self.travel_id, self.food_id])
+        self.assertEqual(categories[self.other_expense_id], self.food_id)
+
+    def test_shift_dates_keeps_range_filters_working(self):
+        response = self.bulk({'action': 'shift_dates', 'days': 30}, category_id=self.food_id, max_amount=10)
+        self.assertEqual(response.get_json()['affected'], 2)
+
+        response = self.client.get('/filter_expenses', headers=self.headers,
+                                   query_string={'format': 'columnar', 'fields': 'id,date', 'start_date': '2024-11-01'})
+        self.assertEqual(response.get_json(), {'id': [self.ids[0], self.ids[2], self.ids[1]],
+                                               'date': ['2024-11-01', '2024-11-03', '2024-11-19']})
+        with self.app.app_context():
+            self.assertEqual(db.session.get(Expenses, self.other_expense_id).date, datetime(2024, 10, 2))
+
+    def test_delete_by_ids_only_reaches_own_rows(self):
+        response = self.bulk({'action': 'delete', 'ids': [self.ids[0], self.ids[1], self.other_expense_id]})
+        self.assertEqual(response.get_json(), {'action': 'delete', 'affected': 2})
+
+        self.assertEqual(set(self.categories()), {self.ids[2], self.other_expense_id})
+        search = self.client.get('/expenses/search?q=lunch', headers=self.headers)
+        self.assertEqual(search.get_json()['expenses'], [])
+
+    def test_ids_and_filters_combine(self):
+        response = self.bulk({'action': 'delete', 'ids': self.ids[1:]}, period='2024-10')
+        self.assertEqual(response.get_json()['affected'], 1)
+        self.assertNotIn(self.ids[1], self.categories())
+
+    def test_change_feed_and_result_cache_follow(self):
+        cursor = self.client.get('/changes', headers=self.headers).get_json()['cursor']
+        listing = '/filter_expenses?format=columnar&fields=id,category_id'
+        self.assertEqual(self.client.get(listing, headers=self.headers).headers['X-Cache'], 'miss')
+        self.assertEqual(self.client.get(listing, headers=self.headers).headers['X-Cache'], 'hit')
+
+        self.bulk({'action': 'recategorize', 'Category': self.travel_id}, period='2024-10')
+        self.bulk({'action': 'delete', 'ids': [self.ids[2]]})
+
+        response = self.client.get(listing, headers=self.headers)
+        self.assertEqual(response.headers['X-Cache'], 'miss')
+        self.assertEqual(response.get_json()['category_id'], [self.travel_id, self.travel_id])
+
+        feed = self.client.get('/changes', headers=self.headers, query_string={'since': cursor}).get_json()
+        self.assertEqual([(change['op'], change['id']) for change in feed['changes']],
+                         [('upsert', self.ids[0]), ('upsert', self.ids[1]), ('delete', self.ids[2])])
+        self.assertEqual(feed['changes'][0]['data']['category_id'], self.travel_id)
+
+    def test_numbers_only_the_matching_rows(self):
+        from sqlalchemy import text
+
+        # A far larger id between the two matches must not widen the block of change numbers
+        with self.app.app_context():
+            db.session.get(Expenses, self.ids[1]).id = 1000000
+            db.session.commit()
+            before = db.session.execute(text('SELECT value FROM change_counter')).scalar()
+
+        self.bulk({'action': 'recategorize', 'Category': self.travel_id, 'ids': [self.ids[0], self.ids[2]]})
+        self.bulk({'action': 'delete', 'ids': [self.ids[0], 1000000]})
+
+        with self.app.app_context():
+            self.assertEqual(db.session.execute(text('SELECT value FROM change_counter')).scalar(), before + 4)
+            self.assertEqual(db.session.get(Expenses, self.ids[2]).change_seq, before + 2)
+            tombstones = db.session.execute(text('SELECT entity_id, change_seq FROM tombstone ORDER BY entity_id')).all()
+        self.assertEqual([tuple(row) for row in tombstones], [(self.ids[0], before + 3), (1000000, before + 4)])
+
+    def test_nothing_matches(self):
+        response = self.bulk({'action': 'delete'}, period='2020')
+        self.assertEqual(response.get_json()['affected'], 0)
+
+    def test_invalid_requests(self):
+        cases = [
+            ({'action': 'rename'}, {'period': '2024'}),
+            ({'action': 'delete'}, {}),
+            ({'action': 'delete', 'ids': ['1']}, {}),
+            ({'action': 'delete'}, {'period': 'October'}),
+            ({'action': 'recategorize', 'Category': 'Rent'}, {'period': '2024'}),
+            ({'action': 'recategorize', 'Category': 999}, {'period': '2024'}),
+            ({'action': 'shift_dates', 'days': 0}, {'period': '2024'}),
+            ({'action': 'shift_dates', 'days': '3'}, {'period': '2024'}),
+        ]
+        for body, filters in cases:
+            with self.subTest(body=body, filters=filters):
+                self.assertEqual(self.bulk(body, **filters).status_code, 400)
+
+        response = self.client.post('/expenses/bulk', json={'action': 'delete', 'ids': self.ids})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(len(self.categories()), 4)
+
+class TestDecimalAmounts(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(TestingConfig)
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            db.create_all()
+            category = Category(name='Food')
+            user = User(user_name='testuser', email='testuser@example.com')
+            db.session.add_all([category, user])
+            db.session.commit()
+            self.category_id = category.id
+            self.headers = {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def add(self, amount):
+        return self.client.post('/add_expense', json={
+            'user_name': 'testuser', 'amount': amount, 'description': 'Item',
+            'date': '2024-10-02T00:00:00', 'Category': self.category_id
+        })
+
+    def test_totals_are_exact(self):
+        for amount in ('0.10', '0.20', 19.99):
+            self.assertEqual(self.add(amount).status_code, 201)
+
+        data = self.client.get('/expenses?user=testuser&fields=amount').get_json()
+        self.assertEqual([expense['amount'] for expense in data['expenses']], ['0.10', '0.20', '19.99'])
+        self.assertEqual(data['total'], '20.29')
+
+    def test_amount_filters_compare_cents(self):
+        self.add('19.99')
+        self.add('20.00')
+        response = self.client.get('/filter_expenses?format=columnar&fields=amount&max_amount=19.99',
+                                   headers=self.headers)
+        self.assertEqual(response.get_json(), {'amount': ['19.99']})
+        response = self.client.get('/filter_expenses?min_amount=abc', headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_amounts_are_rejected(self):
+        for amount in ('1.001', 'ten', '-5'):
+            with self.subTest(amount=amount):
+                self.assertEqual(self.add(amount).status_code, 400)
+
 # testing for viewing profile
 class TestUserProfile(unittest.TestCase):
     def setUp(self):
@@ -1120,6 +2971,31 @@ class TestExportExpensesCSV(unittest.TestCase):
         self.assertIn('Groceries', csv_data)
         self.assertIn('Subscription', csv_data)
 
+    def test_query_error_returns_json(self):
+        """Test a failing query is reported before the CSV starts."""
+        from unittest import mock
+        from sqlalchemy.orm import Query
+
+        with mock.patch.object(Query, '__iter__', side_effect=RuntimeError('database is locked')):
+            response = self.client.get('/export/csv', headers={'Authorization': f'Bearer {self.access_token}'})
+
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.get_json(), {'error': 'An unexpected error occurred'})
+
+    def test_error_while_streaming_is_logged(self):
+        """Test an error after the first rows ends the file and is logged."""
+        from unittest import mock
+        from app import routes
+
+        with mock.patch.object(routes, 'format_cents', side_effect=['50.25', ValueError('bad amount')]), \
+                self.assertLogs('app.routes', 'ERROR') as logs:
+            response = self.client.get('/export/csv', headers={'Authorization': f'Bearer {self.access_token}'})
+            lines = response.get_data(as_text=True).splitlines()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(lines), 2)  # The header and the row before the failure
+        self.assertIn('CSV export for user', logs.output[0])
+
 class TestExportExpensesPDF(unittest.TestCase):
     def setUp(self):
         self.app = create_app()
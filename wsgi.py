@@ -0,0 +1,5 @@
+"""Production entry point: ``gunicorn wsgi:app`` (settings are read from gunicorn.conf.py)."""
+from app import create_app
+from app.config import ProductionConfig
+
+app = create_app(ProductionConfig)